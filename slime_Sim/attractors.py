@@ -0,0 +1,158 @@
+# attractors.py
+"""
+Attractor maps: food sources and other external input the agents sense on
+top of their trails.
+
+The attractor map is one value in [0, 1] per pixel, the sum (clipped) of
+    ATTRACTOR_IMAGE      an image of any size, white attracts (resampled
+                         to the sim grid like the obstacle images)
+    ATTRACTOR_POINTS     food sources [(x, y, radius, strength), ...],
+                         Gaussian blobs of that radius (pixels; radius
+                         and strength may be left out: 8 and 1)
+    ATTRACTOR_FUNCTION   "module.function" called as f(x, y, step, cfg) with
+                         the pixel centre coordinates, returning values in
+                         [0, 1]; re-evaluated every ATTRACTOR_INTERVAL steps
+                         (0: once), so the map can change over time
+Every sensor adds ATTRACTOR_WEIGHT (one value, or one per species) times
+the map at its position to what it reads from the trail map. The map is
+stored as 8 bit per pixel; when it changes only the rows that changed are
+sent to the GPU.
+"""
+
+import importlib
+
+import numpy as np
+
+import config
+from obstacles import image_strips
+
+_UPLOAD_BAND = 64  # rows per band when looking for changed rectangles
+
+
+def attractor_weights(cfg, species):
+    """float32 ATTRACTOR_WEIGHT of each of `species` species."""
+    weight = cfg.ATTRACTOR_WEIGHT
+    if np.ndim(weight) == 0:
+        return np.full(species, weight, dtype=np.float32)
+    if len(weight) < species:
+        raise ValueError(f"ATTRACTOR_WEIGHT needs a value per species ({species}), got {len(weight)}")
+    return np.asarray(weight[:species], dtype=np.float32)
+
+
+def attractor_function(cfg=config):
+    """The ATTRACTOR_FUNCTION callable, or None."""
+    name = cfg.ATTRACTOR_FUNCTION
+    if not name:
+        return None
+    module, _, function = name.rpartition(".")
+    if not module:
+        raise ValueError(f"ATTRACTOR_FUNCTION must be 'module.function', got {name!r}")
+    return getattr(importlib.import_module(module), function)
+
+
+def has_attractor_map(cfg=config):
+    """Whether any ATTRACTOR_* source is set."""
+    return bool(cfg.ATTRACTOR_IMAGE or cfg.ATTRACTOR_POINTS or cfg.ATTRACTOR_FUNCTION)
+
+
+def uses_attractor(cfg=config):
+    """Whether there is an attractor map that some species senses."""
+    return has_attractor_map(cfg) and bool(np.any(np.asarray(cfg.ATTRACTOR_WEIGHT, dtype=np.float32) != 0))
+
+
+def point_sources(points, region):
+    """Sum of the Gaussian blobs of ATTRACTOR_POINTS over the world rectangle `region`."""
+    x0, y0, x1, y1 = region
+    out = np.zeros((y1 - y0, x1 - x0), dtype=np.float32)
+    for point in points:
+        px, py, radius, strength = tuple(point) + (8.0, 1.0)[len(point) - 2:]
+        reach = int(np.ceil(3 * radius))
+        bx0, by0 = max(int(px) - reach, x0), max(int(py) - reach, y0)
+        bx1, by1 = min(int(px) + reach + 1, x1), min(int(py) + reach + 1, y1)
+        if bx0 >= bx1 or by0 >= by1:
+            continue
+        dx = np.arange(bx0, bx1, dtype=np.float32) + np.float32(0.5) - np.float32(px)
+        dy = np.arange(by0, by1, dtype=np.float32) + np.float32(0.5) - np.float32(py)
+        d2 = dy[:, None] ** 2 + dx[None, :] ** 2
+        out[by0 - y0:by1 - y0, bx0 - x0:bx1 - x0] += np.float32(strength) * np.exp(-d2 / np.float32(2 * radius ** 2))
+    return out
+
+
+def changed_rects(old, new, band=_UPLOAD_BAND):
+    """(x0, y0, x1, y1) rectangles covering every pixel that differs, one per band of rows at most."""
+    rects = []
+    for y0 in range(0, old.shape[0], band):
+        y1 = min(y0 + band, old.shape[0])
+        cols = np.flatnonzero((old[y0:y1] != new[y0:y1]).any(axis=0))
+        if len(cols):
+            rects.append((int(cols[0]), y0, int(cols[-1]) + 1, y1))
+    return rects
+
+
+class AttractorField:
+    """
+    The attractor map of the world rectangle `region` (default: the whole
+    map) as uint8 `values`, 255 = 1. update(step) re-evaluates
+    ATTRACTOR_FUNCTION when it is due and returns the rectangles that
+    changed, in `values` coordinates.
+    """
+
+    def __init__(self, cfg=config, region=None):
+        self.cfg = cfg
+        width, height = int(cfg.SIM_WIDTH), int(cfg.SIM_HEIGHT)
+        self.region = (0, 0, width, height) if region is None else tuple(region)
+        self.function = attractor_function(cfg)
+        self.interval = int(cfg.ATTRACTOR_INTERVAL)
+        self.static = self._static_sources(width, height)
+        self.key = None
+        self.values = None
+        self.update(0)
+
+    def _static_sources(self, width, height):
+        x0, y0, x1, y1 = self.region
+        out = np.zeros((y1 - y0, x1 - x0), dtype=np.float32)
+        if self.cfg.ATTRACTOR_IMAGE:
+            # only the strips that overlap the region are kept
+            ix0, ix1 = max(x0, 0), min(x1, width)
+            for s0, s1, grey in image_strips(self.cfg.ATTRACTOR_IMAGE, width, height):
+                r0, r1 = max(s0, y0), min(s1, y1)
+                if r0 < r1 and ix0 < ix1:
+                    out[r0 - y0:r1 - y0, ix0 - x0:ix1 - x0] = grey[r0 - s0:r1 - s0, ix0:ix1] / np.float32(255)
+        if self.cfg.ATTRACTOR_POINTS:
+            out += point_sources(self.cfg.ATTRACTOR_POINTS, self.region)
+        return out
+
+    def evaluate(self, step):
+        """The map at `step` as float32 in [0, 1]."""
+        values = self.static
+        if self.function is not None:
+            x0, y0, x1, y1 = self.region
+            x = np.arange(x0, x1, dtype=np.float32) + np.float32(0.5)
+            y = np.arange(y0, y1, dtype=np.float32) + np.float32(0.5)
+            values = values + np.asarray(self.function(x[None, :], y[:, None], step, self.cfg), dtype=np.float32)
+        return np.clip(values, 0, 1)
+
+    def update(self, step):
+        """Bring `values` to `step`; the changed rectangles (all of it the first time)."""
+        key = step - step % self.interval if self.function is not None and self.interval > 0 else 0
+        if key == self.key:
+            return []
+        values = np.round(self.evaluate(key) * 255).astype(np.uint8)
+        if self.values is None:
+            rects = [(0, 0, values.shape[1], values.shape[0])]
+        else:
+            rects = changed_rects(self.values, values)
+        self.key, self.values = key, values
+        return rects
+
+    def at(self, xi, yi):
+        """The map at trail map indices (xi, yi), as float32 in [0, 1] (like an R8 imageLoad)."""
+        return self.values[yi, xi].astype(np.float32) / np.float32(255)
+
+
+def orbiting_food(x, y, step, cfg):
+    """Example ATTRACTOR_FUNCTION ("attractors.orbiting_food"): a food source circling the map centre."""
+    cx, cy = cfg.SIM_WIDTH / 2, cfg.SIM_HEIGHT / 2
+    r = 0.3 * min(cfg.SIM_WIDTH, cfg.SIM_HEIGHT)
+    px, py = cx + r * np.cos(step * 0.01), cy + r * np.sin(step * 0.01)
+    return np.exp(-((x - px) ** 2 + (y - py) ** 2) / (2 * 20.0 ** 2))
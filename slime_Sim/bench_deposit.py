@@ -0,0 +1,72 @@
+# bench_deposit.py
+"""
+Frame time of the DIRECT (racy imageLoad/imageStore) deposit versus the
+ATOMIC (fixed-point atomicAdd + resolve pass) deposit, on the current GPU.
+
+Also reports how much of the deposited trail each mode actually keeps after
+a single agent pass on an empty map, which is where DIRECT loses deposits.
+
+Usage:
+    python bench_deposit.py [--preset 1] [--frames 300]
+"""
+
+import argparse
+import time
+import numpy as np
+import glfw
+from OpenGL.GL import glFinish
+
+import config
+from cpu_engine import species_table
+from slime_sim import GpuSlimeSim, create_window
+from spawn import spawn_agents, total_agent_count
+
+
+def expected_deposit(cfg, agents):
+    table = species_table(cfg)
+    scale = float(cfg.AGENT_DEPOSIT_SCALE) / float(total_agent_count(cfg))
+    return float(np.sum(table['deposit_amount'][agents['species']], dtype=np.float64) * scale)
+
+
+def bench_mode(cfg, agents, mode, frames, warmup):
+    cfg.DEPOSIT_MODE = mode
+    sim = GpuSlimeSim(cfg, agents=agents)
+
+    # deposit kept: one agent pass on a cleared map
+    sim.update_agents()
+    kept = float(sim.read_trail().sum(dtype=np.float64)) / expected_deposit(cfg, agents)
+
+    for _ in range(warmup):
+        sim.step()
+    glFinish()
+    start = time.perf_counter()
+    for _ in range(frames):
+        sim.step()
+    glFinish()
+    ms = (time.perf_counter() - start) * 1000.0 / frames
+    sim.release()
+    return ms, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preset", type=int, default=config.CURRENT_PRESET)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=30)
+    args = parser.parse_args()
+
+    cfg = config.load_preset(args.preset)
+    window = create_window(64, 64, visible=False)
+    agents = spawn_agents(cfg, seed=0)
+
+    print(f"Preset {args.preset}: {total_agent_count(cfg):,} agents, {cfg.SIM_WIDTH}x{cfg.SIM_HEIGHT}")
+    for mode in ("DIRECT", "ATOMIC"):
+        ms, kept = bench_mode(cfg, agents, mode, args.frames, args.warmup)
+        print(f"  {mode:<6}  {ms:7.3f} ms/frame   deposit kept {kept * 100:6.2f}%")
+
+    glfw.destroy_window(window)
+    glfw.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# benchmark.py
+"""
+Reproducible benchmark of the presets in config.ALL_PRESETS.
+
+Each preset runs headlessly for a fixed number of steps with a fixed spawn
+seed; steps/sec, per-pass timings, agent count and resolution are written to
+a JSON report (stable key order, so reports diff cleanly between commits).
+
+Runs on CPU-only Linux boxes with the NumPy engine (default), the
+multiprocess NumPy engine (--engine parallel [--workers N]), or through GL
+with --engine gpu; for software GL use Mesa's llvmpipe:
+    LIBGL_ALWAYS_SOFTWARE=1 python benchmark.py --engine gpu
+
+Usage:
+    python benchmark.py [--presets 1 3 5] [--steps 100] [--scale 0.25] [--out bench.json]
+    python benchmark.py --compare old.json --out new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import traceback
+import numpy as np
+
+import config
+from cpu_engine import CpuSlimeEngine
+from profiler import CpuPassProfiler
+from spawn import total_agent_count
+
+
+def scaled_preset(number, scale):
+    """
+    Preset `number` with its sim grid scaled by `scale` and the agent count by
+    scale^2, so agent density and per-agent deposit stay the same.
+    """
+    cfg = config.load_preset(number)
+    if scale == 1.0:
+        return cfg
+    area = scale * scale
+    cfg.SIM_WIDTH = max(1, int(round(cfg.SIM_WIDTH * scale)))
+    cfg.SIM_HEIGHT = max(1, int(round(cfg.SIM_HEIGHT * scale)))
+    cfg.NUM_AGENTS = max(1, int(round(cfg.NUM_AGENTS * area)))
+    cfg.AGENT_DEPOSIT_SCALE = cfg.AGENT_DEPOSIT_SCALE * area
+    if cfg.MULTI_SPECIES:
+        cfg.SPECIES_AGENT_COUNTS = [max(1, int(round(c * area))) for c in cfg.SPECIES_AGENT_COUNTS]
+    return cfg
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_cpu(cfg, steps, warmup, seed):
+    engine = CpuSlimeEngine(cfg, seed=seed).run(warmup)
+    engine.profiler = CpuPassProfiler(window=steps)
+    start = time.perf_counter()
+    for _ in range(steps):
+        engine.step()
+        engine.profiler.end_frame()
+    elapsed = time.perf_counter() - start
+    return elapsed, engine.profiler, engine.trail
+
+
+def bench_parallel(cfg, steps, warmup, seed, workers=None):
+    from parallel_engine import ParallelSlimeEngine
+
+    with ParallelSlimeEngine(cfg, seed=seed, workers=workers) as engine:
+        engine.run(warmup)
+        engine.profiler = CpuPassProfiler(window=steps)
+        start = time.perf_counter()
+        for _ in range(steps):
+            engine.step()
+            engine.profiler.end_frame()
+        elapsed = time.perf_counter() - start
+    return elapsed, engine.profiler, engine.trail
+
+
+def bench_gpu(cfg, steps, warmup, seed):
+    from OpenGL.GL import glFinish
+    from slime_sim import GpuPassProfiler, GpuSlimeSim
+    from spawn import spawn_agents
+
+    sim = GpuSlimeSim(cfg, agents=spawn_agents(cfg, seed)).run(warmup)
+    glFinish()
+    sim.profiler = GpuPassProfiler(window=steps)
+    start = time.perf_counter()
+    for _ in range(steps):
+        sim.step()
+        sim.profiler.end_frame()
+    glFinish()
+    elapsed = time.perf_counter() - start
+    sim.profiler.end_frame()  # everything is available after glFinish
+    trail = sim.read_trail()
+    sim.profiler.release()
+    sim.release()
+    return elapsed, sim.profiler, trail
+
+
+def bench_preset(number, args):
+    cfg = scaled_preset(number, args.scale)
+    if args.engine == "parallel":
+        elapsed, profiler, trail = bench_parallel(cfg, args.steps, args.warmup, args.seed, args.workers)
+    else:
+        run = bench_gpu if args.engine == "gpu" else bench_cpu
+        elapsed, profiler, trail = run(cfg, args.steps, args.warmup, args.seed)
+    passes = {name: {k: round(v, 4) for k, v in stats.items() if k != "count"}
+              for name, stats in profiler.summary().items()}
+    return dict(
+        agents=total_agent_count(cfg),
+        resolution=[cfg.SIM_WIDTH, cfg.SIM_HEIGHT],
+        steps=args.steps,
+        seconds=round(elapsed, 4),
+        steps_per_sec=round(args.steps / elapsed, 3),
+        passes_ms=passes,
+        trail_sum=float(np.sum(trail, dtype=np.float64)),  # changes when the simulation output changes
+    )
+
+
+def compare(old, new):
+    print(f"{'preset':>6}  {'old steps/s':>12}  {'new steps/s':>12}  {'change':>8}")
+    for key, result in new["presets"].items():
+        before = old["presets"].get(key, {})
+        if "steps_per_sec" not in result or "steps_per_sec" not in before:
+            continue
+        change = (result["steps_per_sec"] / before["steps_per_sec"] - 1.0) * 100.0
+        print(f"{key:>6}  {before['steps_per_sec']:12.2f}  {result['steps_per_sec']:12.2f}  {change:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the slime presets headlessly.")
+    parser.add_argument("--presets", type=int, nargs="+", default=sorted(config.ALL_PRESETS))
+    parser.add_argument("--engine", choices=("cpu", "parallel", "gpu"), default="cpu")
+    parser.add_argument("--workers", type=int, help="processes for --engine parallel (default: CPU_WORKERS)")
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--scale", type=float, default=1.0, help="scale sim size (and agents by scale^2)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="benchmark.json")
+    parser.add_argument("--compare", metavar="OLD_JSON", help="print steps/sec changes against an older report")
+    args = parser.parse_args()
+
+    window = None
+    renderer = None
+    if args.engine == "gpu":
+        import glfw
+        from OpenGL.GL import GL_RENDERER, glGetString
+        from slime_sim import create_window
+        window = create_window(64, 64, visible=False)
+        renderer = glGetString(GL_RENDERER).decode()
+
+    report = dict(
+        commit=git_commit(),
+        engine=args.engine,
+        renderer=renderer,
+        python=platform.python_version(),
+        numpy=np.__version__,
+        machine=platform.machine(),
+        settings=dict(steps=args.steps, warmup=args.warmup, scale=args.scale, seed=args.seed, workers=args.workers),
+        presets={},
+    )
+    for number in args.presets:
+        try:
+            result = bench_preset(number, args)
+            print(f"preset {number:>2}: {result['steps_per_sec']:9.2f} steps/s  "
+                  f"{result['agents']:>9,} agents  {result['resolution'][0]}x{result['resolution'][1]}")
+        except Exception as e:
+            traceback.print_exc()
+            result = dict(error=f"{type(e).__name__}: {e}")
+            print(f"preset {number:>2}: failed ({result['error']})", file=sys.stderr)
+        report["presets"][str(number)] = result
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Report written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+    if window is not None:
+        glfw.destroy_window(window)
+        glfw.terminate()
+
+
+if __name__ == "__main__":
+    main()
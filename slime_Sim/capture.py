@@ -0,0 +1,152 @@
+# capture.py
+"""
+Frame output for offline renders, captures and screenshots: a bounded
+background writer that flips and encodes frames to PNG or pipes them into
+ffmpeg, so encoding overlaps with simulation, plus a NumPy twin of the render
+shader for the CPU engine.
+"""
+
+import colorsys
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import numpy as np
+from PIL import Image
+
+
+def species_palette(cfg, layers):
+    """
+    `layers`x4 float32 RGBA colors used by the "RGB" color mode: SPECIES_COLORS
+    if set, else red, green, blue (the old channel colors) and then evenly
+    spread hues for any further species.
+    """
+    if cfg.SPECIES_COLORS is not None:
+        colors = [tuple(c)[:3] for c in cfg.SPECIES_COLORS]
+        if len(colors) < layers:
+            raise ValueError(f"SPECIES_COLORS has {len(colors)} colors for {layers} species")
+    else:
+        colors = [(1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0)]
+        colors += [colorsys.hsv_to_rgb((0.15 + i * 0.618034) % 1.0, 0.8, 1.0) for i in range(max(0, layers - 3))]
+    palette = np.ones((layers, 4), dtype=np.float32)
+    palette[:, :3] = colors[:layers]
+    return palette
+
+
+def colorize(trail, cfg):
+    """
+    HxWxS trail map -> HxWx4 uint8 RGBA, same maths as FRAGMENT_SHADER_SOURCE.
+    Rows stay in trail order (row 0 = bottom of the screen, like the GL texture).
+    """
+    trail = trail.astype(np.float32, copy=False)
+    mul = np.float32(cfg.COLOR_MULTIPLIER)
+    bg = np.asarray(cfg.BACKGROUND_COLOR, dtype=np.float32)
+
+    if cfg.COLOR_MODE == "SUM":
+        val = np.minimum(trail.sum(axis=2) * np.float32(0.25) * mul, 1.0)[..., None]
+        rgba = bg + (np.float32(1.0) - bg) * val
+    elif cfg.COLOR_MODE == "RGB":
+        rgba = np.ones(trail.shape[:2] + (4,), dtype=np.float32)
+        rgba[..., :3] = np.clip(trail @ species_palette(cfg, trail.shape[2])[:, :3] * mul, 0.0, 1.0)
+    else:
+        val = np.minimum(trail.sum(axis=2) * np.float32(0.25) * mul, 1.0)
+        rgba = np.stack([np.zeros_like(val), val, val * 0.5, np.ones_like(val)], axis=2)
+    return (rgba * 255.0 + 0.5).astype(np.uint8)
+
+
+class FrameWriter:
+    """
+    Writes RGBA frames from a worker thread. put() blocks once `max_queue`
+    frames are waiting, so a slow encoder throttles the simulation instead of
+    eating all memory.
+
+    out_dir      -> frame_000000.png, frame_000001.png, ...
+    ffmpeg_path  -> raw RGBA piped into `ffmpeg` which encodes that file
+    neither      -> only frames put() with an explicit path (screenshots)
+    flip=True    -> frames come in bottom-up (glReadPixels / trail order)
+    size=(w, h)  -> resize (nearest, like the GL texture filter) before writing
+    """
+
+    def __init__(self, out_dir=None, ffmpeg_path=None, fps=60, max_queue=8, flip=True, size=None):
+        if out_dir is not None and ffmpeg_path is not None:
+            raise ValueError("FrameWriter takes out_dir or ffmpeg_path, not both")
+        if ffmpeg_path is not None and shutil.which("ffmpeg") is None:
+            raise RuntimeError("ffmpeg was not found on PATH")
+        if out_dir is not None:
+            os.makedirs(out_dir, exist_ok=True)
+
+        self.out_dir = out_dir
+        self.ffmpeg_path = ffmpeg_path
+        self.fps = fps
+        self.flip = flip
+        self.size = size
+        self.frames_written = 0
+        self.error = None
+
+        self._proc = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._start = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="FrameWriter", daemon=True)
+        self._thread.start()
+
+    def put(self, frame, path=None):
+        """
+        Queue one HxWx4 uint8 frame (the writer keeps the array, don't reuse it).
+        `path` saves this frame to that PNG file instead of the next sequence slot.
+        """
+        if self.error is not None:
+            raise RuntimeError("frame writer failed") from self.error
+        if path is None and self.out_dir is None and self.ffmpeg_path is None:
+            raise ValueError("this FrameWriter has no output, pass an explicit path")
+        self._queue.put((frame, path))
+
+    def close(self):
+        """Flush the queue, finish the video if any, return frames written per second."""
+        self._queue.put(None)
+        self._thread.join()
+        if self._proc is not None:
+            self._proc.stdin.close()
+            self._proc.wait()
+        if self.error is not None:
+            raise RuntimeError("frame writer failed") from self.error
+        elapsed = time.perf_counter() - self._start
+        return self.frames_written / elapsed if elapsed > 0 else 0.0
+
+    def _open_ffmpeg(self, w, h):
+        cmd = ["ffmpeg", "-y", "-loglevel", "error",
+               "-f", "rawvideo", "-pix_fmt", "rgba", "-s", f"{w}x{h}", "-r", str(self.fps), "-i", "-",
+               "-pix_fmt", "yuv420p", self.ffmpeg_path]
+        return subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def _write(self, frame, path):
+        if self.flip:
+            frame = frame[::-1]
+        if self.size is not None and (frame.shape[1], frame.shape[0]) != tuple(self.size):
+            frame = np.asarray(Image.fromarray(frame, 'RGBA').resize(self.size, Image.NEAREST))
+
+        if path is not None:
+            Image.fromarray(np.ascontiguousarray(frame), 'RGBA').save(path)
+            print(f"Screenshot saved to {path}")
+            return
+        if self.ffmpeg_path is not None:
+            if self._proc is None:
+                self._proc = self._open_ffmpeg(frame.shape[1], frame.shape[0])
+            self._proc.stdin.write(np.ascontiguousarray(frame).tobytes())
+        else:
+            path = os.path.join(self.out_dir, f"frame_{self.frames_written:06d}.png")
+            Image.fromarray(np.ascontiguousarray(frame), 'RGBA').save(path, compress_level=1)
+        self.frames_written += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self.error is not None:
+                continue  # keep draining so put() never blocks forever
+            try:
+                self._write(*item)
+            except Exception as e:
+                self.error = e
@@ -0,0 +1,84 @@
+# checkpoint.py
+"""
+Save and resume the complete simulation state.
+
+A checkpoint is a directory:
+    trail.npy   HxWxS trail map, in the engine's storage dtype
+    agents.npy  the live agents, AGENT_DTYPE
+    meta.json   format version, preset, step, emitter carry-over and every setting
+Plain .npy files, so they load memory-mapped and go into an engine as one
+bulk copy (CPU) or upload (GL), whichever engine wrote them. Both engines
+have save_checkpoint(path) / load_checkpoint(path) built on these helpers.
+"""
+
+import json
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+import config
+from hot_reload import snapshot
+from spawn import AGENT_DTYPE
+
+CHECKPOINT_VERSION = 1
+
+# upper-case names in config.py that are tables, not settings
+_NOT_SETTINGS = ("ALL_PRESETS", "CHOSEN", "OPTIONAL_DEFAULTS")
+
+
+def save_checkpoint(path, cfg, trail, agents, step, carry=()):
+    """Write `trail`, `agents` and the metadata to directory `path` (created if needed)."""
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "trail.npy"), np.ascontiguousarray(trail))
+    np.save(os.path.join(path, "agents.npy"), np.ascontiguousarray(agents, dtype=AGENT_DTYPE))
+    meta = dict(
+        version=CHECKPOINT_VERSION,
+        preset=getattr(cfg, "PRESET", None),
+        step=int(step),
+        emitter_carry=[float(c) for c in carry],
+        trail_shape=list(trail.shape),
+        agents=len(agents),
+        settings={k: v for k, v in snapshot(cfg).items() if k not in _NOT_SETTINGS},
+    )
+    # meta.json last, and atomically: a checkpoint with metadata is complete
+    tmp = os.path.join(path, "meta.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f, indent=1, default=lambda v: v.tolist())  # NumPy values in settings
+    os.replace(tmp, os.path.join(path, "meta.json"))
+
+
+def read_meta(path):
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"{path}: checkpoint version {meta.get('version')}, expected {CHECKPOINT_VERSION}")
+    return meta
+
+
+def load_checkpoint(path, mmap=True):
+    """
+    The state in checkpoint directory `path` as a namespace with trail, agents,
+    step, carry and meta. With `mmap` the arrays are read-only memory maps,
+    nothing is read until they are copied into an engine.
+    """
+    meta = read_meta(path)
+    mode = "r" if mmap else None
+    agents = np.load(os.path.join(path, "agents.npy"), mmap_mode=mode)
+    if agents.dtype != AGENT_DTYPE:
+        raise ValueError(f"{path}: agents are {agents.dtype}, expected {AGENT_DTYPE}")
+    return SimpleNamespace(trail=np.load(os.path.join(path, "trail.npy"), mmap_mode=mode), agents=agents,
+                           step=meta["step"], carry=meta["emitter_carry"], meta=meta)
+
+
+def checkpoint_config(path):
+    """The settings a checkpoint was written with, as a config namespace."""
+    meta = read_meta(path)
+    return SimpleNamespace(**{**config.OPTIONAL_DEFAULTS, **meta["settings"]})
+
+
+def check_shape(state, shape):
+    """Raise unless the checkpoint's trail map fits an engine with trail `shape` (H, W, S)."""
+    if tuple(state.trail.shape) != tuple(shape):
+        raise ValueError(f"Checkpoint trail map is {state.trail.shape}, this simulation needs {tuple(shape)}; "
+                         f"resume with the settings it was saved with (checkpoint_config)")
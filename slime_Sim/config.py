@@ -449,9 +449,184 @@ ALL_PRESETS = {
 
 }
 
+# Optional settings: presets may override any of these, otherwise the default is used.
+OPTIONAL_DEFAULTS = dict(
+    # Agent spawning (see spawn.py):
+    #   "UNIFORM"         - anywhere on the map, random heading (the original behaviour)
+    #   "DISC"            - inside a centred disc of SPAWN_RADIUS, random heading
+    #   "RING"            - on the edge of that disc, random heading
+    #   "INWARD_CIRCLE"   - inside the disc, every agent facing the centre
+    #   "SPECIES_REGIONS" - each species in its own rectangle, SPECIES_SPAWN_REGIONS
+    #                       as (x0, y0, x1, y1) fractions of the map, default = vertical bands
+    SPAWN_MODE            = "UNIFORM",
+    SPAWN_RADIUS          = 0.4,   # fraction of min(SIM_WIDTH, SIM_HEIGHT)
+    SPAWN_SEED            = None,  # int => identical agents on every run
+    SPECIES_SPAWN_REGIONS = None,
+
+    # True  => evaporation is applied inside the last blur pass (one less full
+    #          read+write of the trail map per frame, same result up to rounding)
+    # False => separate evaporation pass followed by the blur passes (old ordering)
+    FUSE_DIFFUSE_DECAY    = True,
+
+    # "DIRECT" => imageLoad/imageStore deposit, fast but concurrent deposits to
+    #             one pixel can get lost (dense presets look dimmer than they should)
+    # "ATOMIC" => fixed-point atomicAdd into a deposit buffer, resolved into the
+    #             trail map by an extra pass; nothing is lost, deterministic sums
+    DEPOSIT_MODE              = "DIRECT",
+    DEPOSIT_FIXED_POINT_SCALE = 65536.0,  # integer units per 1.0 of deposit in ATOMIC mode
+
+    # Trail map storage: one single-channel layer per species (a texture array
+    # on the GPU), so memory grows with the species count and there is no cap.
+    # "AUTO" => "R32F", or "R16F" when TRAIL_HALF_FLOAT (half the bandwidth).
+    # The old "RGBA32F"/"RGBA16F" names still work and mean R32F/R16F.
+    TRAIL_FORMAT          = "AUTO",
+    TRAIL_HALF_FLOAT      = False,
+
+    # SPECIES_INTERACTION: NxN weights, row = the species sensing, column = the
+    # trail it smells; > 0 attracts, < 0 repels. None => each species only
+    # follows its own trail. SPECIES_COLORS: (r, g, b) per species for the
+    # "RGB" color mode, None => red, green, blue, then spread hues.
+    SPECIES_INTERACTION   = None,
+    SPECIES_COLORS        = None,
+
+    # Continuous capture: toggle with CAPTURE_KEY, frames go to CAPTURE_DIR as PNGs.
+    # Readback is asynchronous (ring of READBACK_BUFFERS pixel buffers), encoding
+    # happens on a worker thread, so capturing does not stall the simulation.
+    CAPTURE_KEY           = ord('R'),
+    CAPTURE_DIR           = "capture",
+    READBACK_BUFFERS      = 3,
+
+    # Simulation vs presentation: TARGET_FPS only limits how often a frame is
+    # presented, every presented frame advances SIM_STEPS_PER_FRAME steps.
+    # Holding FAST_FORWARD_KEY runs FAST_FORWARD_STEPS per frame, unthrottled,
+    # to grow patterns to steady state quickly.
+    SIM_STEPS_PER_FRAME   = 1,
+    FAST_FORWARD_KEY      = ord(' '),
+    FAST_FORWARD_STEPS    = 200,
+
+    # Per-pass timing (GL timer queries, read back a few frames late so nothing
+    # stalls). Rolling percentiles over PROFILE_WINDOW samples, printed (and put
+    # in the window title) every PROFILE_PRINT_INTERVAL seconds, dumped to
+    # PROFILE_OUTPUT (.csv or .json) on exit.
+    PROFILE               = False,
+    PROFILE_WINDOW        = 300,
+    PROFILE_PRINT_INTERVAL= 2.0,
+    PROFILE_OUTPUT        = None,
+
+    # Every AGENT_SORT_INTERVAL steps, reorder the agent buffer by the Z-order
+    # of the AGENT_SORT_TILE-pixel tile each agent is in, so agents next to
+    # each other in memory also sense/deposit next to each other. 0 = off.
+    # CPU engines only; the GL sim ignores it (a host-side sort costs more
+    # than it saves).
+    AGENT_SORT_INTERVAL   = 0,
+    AGENT_SORT_TILE       = 16,
+
+    # Dynamic population (see population.py). Agents live in a buffer of
+    # MAX_AGENTS slots (None => the preset's agent count, no room to grow).
+    # EMITTERS: list of dict(x=, y=, radius=, rate=, species=), position and
+    #   radius as fractions of the map (like SPAWN_RADIUS), rate = agents per
+    #   step (fractions accumulate), species optional (default 0).
+    # Every step each agent dies with chance DEATH_RATE, or STARVATION_RATE
+    # when all three of its sensors read below STARVATION_THRESHOLD.
+    # With none of these set the population is static and costs nothing extra.
+    MAX_AGENTS            = None,
+    EMITTERS              = None,
+    DEATH_RATE            = 0.0,
+    STARVATION_THRESHOLD  = 0.0,
+    STARVATION_RATE       = 0.0,
+
+    # Watch config.py while the window is open: saving it applies the new
+    # settings live (uniform-only changes instantly, sizes and agent counts
+    # rebuild just the buffers involved). Checked every HOT_RELOAD_INTERVAL s.
+    HOT_RELOAD            = True,
+    HOT_RELOAD_INTERVAL   = 0.5,
+
+    # Global seed of the agents' random numbers (wiggle, death), see rng.py:
+    # same RNG_SEED + same spawned agents => the same run, step for step, on
+    # every engine. USE_RANDOM_SEEDS picks each agent's random stream id at
+    # spawn from SPAWN_SEED; False uses the spawn index instead.
+    RNG_SEED              = 0,
+
+    # Press CHECKPOINT_KEY in the window to save the whole state (trail map,
+    # agents, step) to CHECKPOINT_DIR/step<N>/, resume with --resume DIR.
+    CHECKPOINT_KEY        = ord('K'),
+    CHECKPOINT_DIR        = "checkpoints",
+
+    # HEADING_STEPS > 0 quantizes headings to that many directions for the
+    # sensor and move offsets, which then come from a per-species lookup table
+    # instead of 8 cos/sin per agent per step (e.g. 1024, ~0.35 deg per bin).
+    # The angle itself stays continuous, so small wiggles still add up.
+    HEADING_STEPS         = 0,
+
+    # How a sensor reads the trail map. "NEAREST" takes the pixel under it,
+    # "LINEAR" filters the 4 around it (through the GPU's texture sampler).
+    # SENSOR_SIZE > 1 averages a SENSOR_SIZE x SENSOR_SIZE grid of such reads.
+    # SENSOR_MIP > 0 reads a 2^SENSOR_MIP times smaller mip level of the trail,
+    # each texel the mean of 2^SENSOR_MIP x 2^SENSOR_MIP pixels: wide-area
+    # sensing for the price of one read.
+    SENSOR_FILTER         = "NEAREST",
+    SENSOR_SIZE           = 1,
+    SENSOR_MIP            = 0,
+
+    # How agents deal with obstacles. OBSTACLE_BOUNCE "REVERSE" turns them
+    # around on contact, "REFLECT" mirrors the heading off the wall.
+    # OBSTACLE_AVOID_DISTANCE > 0 (pixels) makes agents heading for a wall
+    # nearer than that turn away before they touch it. Both use the obstacle
+    # signed distance field (obstacles.py), built once per image and cached
+    # in OBSTACLE_CACHE_DIR (None: rebuild on every start).
+    # OBSTACLE_IMAGE may also be a list of up to 8 layer images. Any image
+    # size works, it is resampled to SIM_WIDTH x SIM_HEIGHT; pixels darker than
+    # OBSTACLE_THRESHOLD (0..1) block. OBSTACLE_SPECIES_LAYERS lists, per
+    # species, the layers that block it, e.g. [[0], [0, 1]]; None: all of them.
+    # Huge masks must be .npy (memory mapped, read in strips): PNG etc. are
+    # decoded whole, so they are refused past 64M pixels.
+    OBSTACLE_THRESHOLD    = 0.1,
+    OBSTACLE_SPECIES_LAYERS = None,
+
+    OBSTACLE_BOUNCE       = "REVERSE",
+    OBSTACLE_AVOID_DISTANCE = 0.0,
+    OBSTACLE_CACHE_DIR    = "obstacle_cache",
+
+    # Food sources: an attractor map in [0, 1] that agents sense on top of
+    # the trails (attractors.py). It sums ATTRACTOR_IMAGE (any size, white
+    # attracts), ATTRACTOR_POINTS [(x, y, radius, strength), ...] and
+    # ATTRACTOR_FUNCTION, a "module.function" f(x, y, step, cfg) re-evaluated
+    # every ATTRACTOR_INTERVAL steps (0: once), e.g. "attractors.orbiting_food".
+    # Sensors add ATTRACTOR_WEIGHT (one value or one per species, negative
+    # repels) times the map; 0 turns it off.
+    ATTRACTOR_IMAGE       = None,
+    ATTRACTOR_POINTS      = None,
+    ATTRACTOR_FUNCTION    = None,
+    ATTRACTOR_INTERVAL    = 0,
+    ATTRACTOR_WEIGHT      = 0.0,
+
+    # (columns, rows) of tiles for tiled_engine.py, the CPU engine that runs
+    # every tile in its own process (for worlds bigger than one trail map).
+    TILES                 = (2, 2),
+
+    # Worker processes of parallel_engine.py, the shared-memory CPU engine
+    # (None => one per core). Its output does not depend on this number.
+    CPU_WORKERS           = None,
+)
+
+
+def load_preset(number):
+    """
+    Return preset `number` from ALL_PRESETS as an attribute namespace, so code
+    that normally reads `config.X` can run any preset without editing
+    CURRENT_PRESET (e.g. batch renders on the CPU engine).
+
+    Unlike the module-level values below, the preset's own WINDOW/SIM sizes are kept.
+    """
+    from types import SimpleNamespace
+
+    if number not in ALL_PRESETS:
+        raise KeyError(f"Unknown preset {number!r}, choose from {sorted(ALL_PRESETS)}")
+    return SimpleNamespace(PRESET=number, **{**OPTIONAL_DEFAULTS, **ALL_PRESETS[number]})
+
 
 # Now we'll extract the chosen preset from ALL_PRESETS using CURRENT_PRESET
-CHOSEN = ALL_PRESETS.get(CURRENT_PRESET, ALL_PRESETS[1])  # fallback to #1 if invalid
+CHOSEN = {**OPTIONAL_DEFAULTS, **ALL_PRESETS.get(CURRENT_PRESET, ALL_PRESETS[1])}  # fallback to #1 if invalid
 
 # Then we define all the config variables from that dictionary for easy usage,
 # you can also set them to a specific value if needed, but then remove 'CHOSEN'
@@ -489,6 +664,71 @@ TARGET_FPS         = CHOSEN["TARGET_FPS"]
 SCREENSHOT_KEY     = CHOSEN["SCREENSHOT_KEY"]
 SCREENSHOT_FILE    = CHOSEN["SCREENSHOT_FILE"]
 
+SPAWN_MODE         = CHOSEN["SPAWN_MODE"]
+SPAWN_RADIUS       = CHOSEN["SPAWN_RADIUS"]
+SPAWN_SEED         = CHOSEN["SPAWN_SEED"]
+SPECIES_SPAWN_REGIONS = CHOSEN["SPECIES_SPAWN_REGIONS"]
+
+FUSE_DIFFUSE_DECAY = CHOSEN["FUSE_DIFFUSE_DECAY"]
+
+DEPOSIT_MODE              = CHOSEN["DEPOSIT_MODE"]
+DEPOSIT_FIXED_POINT_SCALE = CHOSEN["DEPOSIT_FIXED_POINT_SCALE"]
+
+TRAIL_FORMAT       = CHOSEN["TRAIL_FORMAT"]
+TRAIL_HALF_FLOAT   = CHOSEN["TRAIL_HALF_FLOAT"]
+SPECIES_INTERACTION = CHOSEN["SPECIES_INTERACTION"]
+SPECIES_COLORS     = CHOSEN["SPECIES_COLORS"]
+
+CAPTURE_KEY        = CHOSEN["CAPTURE_KEY"]
+CAPTURE_DIR        = CHOSEN["CAPTURE_DIR"]
+READBACK_BUFFERS   = CHOSEN["READBACK_BUFFERS"]
+
+SIM_STEPS_PER_FRAME = CHOSEN["SIM_STEPS_PER_FRAME"]
+FAST_FORWARD_KEY   = CHOSEN["FAST_FORWARD_KEY"]
+FAST_FORWARD_STEPS = CHOSEN["FAST_FORWARD_STEPS"]
+
+PROFILE            = CHOSEN["PROFILE"]
+PROFILE_WINDOW     = CHOSEN["PROFILE_WINDOW"]
+PROFILE_PRINT_INTERVAL = CHOSEN["PROFILE_PRINT_INTERVAL"]
+PROFILE_OUTPUT     = CHOSEN["PROFILE_OUTPUT"]
+
+AGENT_SORT_INTERVAL = CHOSEN["AGENT_SORT_INTERVAL"]
+AGENT_SORT_TILE    = CHOSEN["AGENT_SORT_TILE"]
+
+MAX_AGENTS         = CHOSEN["MAX_AGENTS"]
+EMITTERS           = CHOSEN["EMITTERS"]
+DEATH_RATE         = CHOSEN["DEATH_RATE"]
+STARVATION_THRESHOLD = CHOSEN["STARVATION_THRESHOLD"]
+STARVATION_RATE    = CHOSEN["STARVATION_RATE"]
+
+HOT_RELOAD         = CHOSEN["HOT_RELOAD"]
+HOT_RELOAD_INTERVAL = CHOSEN["HOT_RELOAD_INTERVAL"]
+
+RNG_SEED           = CHOSEN["RNG_SEED"]
+
+CHECKPOINT_KEY     = CHOSEN["CHECKPOINT_KEY"]
+CHECKPOINT_DIR     = CHOSEN["CHECKPOINT_DIR"]
+
+HEADING_STEPS      = CHOSEN["HEADING_STEPS"]
+SENSOR_FILTER      = CHOSEN["SENSOR_FILTER"]
+SENSOR_SIZE        = CHOSEN["SENSOR_SIZE"]
+SENSOR_MIP         = CHOSEN["SENSOR_MIP"]
+
+OBSTACLE_THRESHOLD = CHOSEN["OBSTACLE_THRESHOLD"]
+OBSTACLE_SPECIES_LAYERS = CHOSEN["OBSTACLE_SPECIES_LAYERS"]
+OBSTACLE_BOUNCE    = CHOSEN["OBSTACLE_BOUNCE"]
+OBSTACLE_AVOID_DISTANCE = CHOSEN["OBSTACLE_AVOID_DISTANCE"]
+OBSTACLE_CACHE_DIR = CHOSEN["OBSTACLE_CACHE_DIR"]
+
+ATTRACTOR_IMAGE    = CHOSEN["ATTRACTOR_IMAGE"]
+ATTRACTOR_POINTS   = CHOSEN["ATTRACTOR_POINTS"]
+ATTRACTOR_FUNCTION = CHOSEN["ATTRACTOR_FUNCTION"]
+ATTRACTOR_INTERVAL = CHOSEN["ATTRACTOR_INTERVAL"]
+ATTRACTOR_WEIGHT   = CHOSEN["ATTRACTOR_WEIGHT"]
+
+TILES              = CHOSEN["TILES"]
+CPU_WORKERS        = CHOSEN["CPU_WORKERS"]
+
 # For multi-species arrays (only used if MULTI_SPECIES=True)
 # We'll define placeholders if the keys exist:
 if MULTI_SPECIES:
@@ -0,0 +1,575 @@
+# cpu_engine.py
+"""
+Headless CPU reference engine for the slime simulation (pure NumPy, no GL).
+
+Implements the same passes as COMPUTE_SHADER_SOURCE in slime_sim.py:
+  passType 0   -> update_agents()  (sense, turn, wiggle, die, move, deposit)
+  passType 1   -> evaporate()
+  passType 2   -> blur()
+  passType 4-6 -> update_population()
+over a structured agent array and an HxWxS trail map (one layer per species,
+see trail_format). Every pass works
+on whole arrays at once, there are no per-agent Python loops.
+
+Differences with the GPU path are intentional: all agents sense the trail as
+it was before the step, and deposits to the same pixel are accumulated instead
+of racing, so a run is fully deterministic for a given seed. Random draws come
+from the same counter-based hash as the shader's (rng.py).
+"""
+
+import contextlib
+import math
+import numpy as np
+
+import config
+from agent_sort import sort_agents
+from attractors import AttractorField, attractor_weights, uses_attractor
+from obstacles import obstacle_field, obstacle_mask, obstacle_response, species_obstacle_layers, uses_obstacle_field
+from population import EmitterSchedule, agent_capacity, emit_agents, emitter_key, is_dynamic
+from rng import agent_draws, step_key
+from spawn import spawn_agents, total_agent_count
+
+PI = np.float32(3.14159)  # the shader's turn-around constant
+
+# Trail format name -> storage dtype of each species layer. slime_sim.py maps
+# the same names to GL formats.
+TRAIL_FORMATS = {
+    "R32F": np.float32,
+    "R16F": np.float16,
+}
+# The old packed formats: same precision, one layer per species instead of 4 channels
+TRAIL_FORMAT_ALIASES = {"RGBA32F": "R32F", "RGBA16F": "R16F"}
+
+
+# Same layout as the `Species` struct in the compute shader (std430, 28 bytes).
+SPECIES_DTYPE = np.dtype([('speed', 'f4'), ('turn_speed', 'f4'), ('sensor_angle', 'f4'),
+                          ('sensor_distance', 'f4'), ('deposit_amount', 'f4'), ('obstacle_layers', 'u4'),
+                          ('attractor_weight', 'f4')])
+
+
+def species_table(cfg=config):
+    """
+    One SPECIES_DTYPE row per species (sensor angles in radians, the obstacle
+    layers that block it as a bitmask, its ATTRACTOR_WEIGHT), indexed by
+    Agent.species; slime_sim uploads exactly this array as the species SSBO.
+    """
+    if cfg.MULTI_SPECIES:
+        n = cfg.NUM_SPECIES
+        columns = (cfg.SPECIES_SPEEDS[:n], cfg.SPECIES_TURN_SPEEDS[:n],
+                   [math.radians(a) for a in cfg.SPECIES_SENSOR_ANGLES[:n]],
+                   cfg.SPECIES_SENSOR_DIST[:n], cfg.SPECIES_DEPOSIT_AMOUNTS[:n])
+    else:
+        columns = ([cfg.AGENT_SPEED], [cfg.TURN_SPEED], [math.radians(cfg.SENSOR_ANGLE_DEG)],
+                   [cfg.SENSOR_DISTANCE], [cfg.DEPOSIT_AMOUNT])
+    if len({len(c) for c in columns}) != 1:
+        raise ValueError("SPECIES_* lists must all have at least NUM_SPECIES entries")
+    n = len(columns[0])
+    columns += (species_obstacle_layers(cfg, n), attractor_weights(cfg, n))
+    table = np.empty(n, dtype=SPECIES_DTYPE)
+    for name, column in zip(SPECIES_DTYPE.names, columns):
+        table[name] = column
+    return table
+
+
+def heading_table(cfg=config):
+    """
+    HEADING_STEPS > 0: float32 (species, HEADING_STEPS, 4, 2) lookup table of the
+    (dx, dy) offsets of the left, forward and right sensors and of one move
+    step, for every heading bin (at the bin centre). None: exact cos/sin.
+    """
+    steps = int(cfg.HEADING_STEPS)
+    if steps <= 0:
+        return None
+    table = species_table(cfg)
+    zero = np.zeros(len(table))
+    turn = np.stack([-table['sensor_angle'], zero, table['sensor_angle'], zero], axis=1).astype(np.float64)
+    dist = np.stack([table['sensor_distance']] * 3 + [table['speed']], axis=1).astype(np.float64)
+    heading = (np.arange(steps) + 0.5) * (2 * math.pi / steps)
+    angle = heading[None, :, None] + turn[:, None, :]
+    return np.stack([np.cos(angle) * dist[:, None, :], np.sin(angle) * dist[:, None, :]], axis=-1).astype(np.float32)
+
+
+def heading_index(angle, steps):
+    """Heading bin of each angle, same as headingIndex() in the shader."""
+    k = np.floor(angle * np.float32(steps / (2 * math.pi))).astype(np.int64)
+    return k % steps
+
+
+def trail_format(cfg=config):
+    """Resolve cfg.TRAIL_FORMAT ("AUTO" or a TRAIL_FORMATS name) for this preset."""
+    fmt = cfg.TRAIL_FORMAT.upper()
+    if fmt == "AUTO":
+        fmt = "R16F" if cfg.TRAIL_HALF_FLOAT else "R32F"
+    fmt = TRAIL_FORMAT_ALIASES.get(fmt, fmt)
+    if fmt not in TRAIL_FORMATS:
+        raise ValueError(f"Unknown TRAIL_FORMAT {cfg.TRAIL_FORMAT!r}, choose AUTO or one of {list(TRAIL_FORMATS)}")
+    return fmt
+
+
+def trail_layers(cfg=config):
+    """Layers of the trail map, one per species."""
+    return cfg.NUM_SPECIES if cfg.MULTI_SPECIES else 1
+
+
+def interaction_matrix(cfg=config):
+    """
+    SPECIES_INTERACTION as an SxS float32 array (row = the sensing species,
+    column = the trail layer it weighs), or None for the default where every
+    species only follows its own trail.
+    """
+    if cfg.SPECIES_INTERACTION is None:
+        return None
+    n = trail_layers(cfg)
+    matrix = np.asarray(cfg.SPECIES_INTERACTION, dtype=np.float32)
+    if matrix.shape != (n, n):
+        raise ValueError(f"SPECIES_INTERACTION must be {n}x{n} for this preset, got {matrix.shape}")
+    return matrix
+
+
+SENSOR_FILTERS = ("NEAREST", "LINEAR")
+
+
+def sensor_settings(cfg=config):
+    """(filter, size, mip) of the sensors: SENSOR_FILTER, SENSOR_SIZE and SENSOR_MIP, checked."""
+    fltr = cfg.SENSOR_FILTER.upper()
+    if fltr not in SENSOR_FILTERS:
+        raise ValueError(f"Unknown SENSOR_FILTER {cfg.SENSOR_FILTER!r}, choose one of {list(SENSOR_FILTERS)}")
+    size, mip = int(cfg.SENSOR_SIZE), int(cfg.SENSOR_MIP)
+    if size < 1:
+        raise ValueError(f"SENSOR_SIZE must be at least 1, got {size}")
+    levels = int(math.log2(max(int(cfg.SIM_WIDTH), int(cfg.SIM_HEIGHT))))
+    if not 0 <= mip <= levels:
+        raise ValueError(f"SENSOR_MIP must be between 0 and {levels} for a {cfg.SIM_WIDTH}x{cfg.SIM_HEIGHT} map")
+    return fltr, size, mip
+
+
+def mip_size(width, height, level):
+    """(width, height) of mip `level`, halved and rounded down like GL, at least 1."""
+    return max(width >> level, 1), max(height >> level, 1)
+
+
+def trail_mip(trail, level):
+    """
+    Mip `level` of an HxWxS trail map: every level the 2x2 mean of the one
+    below, in the trail's dtype (glGenerateMipmap's box filter; an odd last
+    row or column is dropped).
+    """
+    for _ in range(level):
+        h, w = (max(n // 2, 1) for n in trail.shape[:2])
+        src = trail[:2 * h, :2 * w].astype(np.float32)
+        if src.shape[0] == 1:
+            src = np.concatenate([src, src], axis=0)
+        if src.shape[1] == 1:
+            src = np.concatenate([src, src], axis=1)
+        mean = (src[0::2, 0::2] + src[0::2, 1::2] + src[1::2, 0::2] + src[1::2, 1::2]) * np.float32(0.25)
+        trail = mean.astype(trail.dtype)
+    return trail
+
+
+def box_blur_axis(src, radius, axis, decay=1.0, valid=None):
+    """
+    1D box mean of `radius` along `axis`, counting only in-bounds pixels
+    (one separable pass of blur pass 2), scaled by `decay`. O(r) per pixel.
+    `valid` = (lo, hi) is the index range inside the map when `src` is a
+    piece of it with padding; pixels outside that range are zeroed.
+    """
+    n = src.shape[axis]
+    lo, hi = (0, n) if valid is None else valid
+    padded = np.pad(src, [(radius, radius) if a == axis else (0, 0) for a in range(src.ndim)])
+    out = np.zeros_like(src)
+    window = [slice(None)] * src.ndim
+    for i in range(2 * radius + 1):
+        window[axis] = slice(i, i + n)
+        out += padded[tuple(window)]
+    idx = np.arange(n)
+    inside = (idx >= lo) & (idx < hi)
+    count = np.where(inside, np.minimum(idx - lo, radius) + np.minimum(hi - 1 - idx, radius) + 1, 1).astype(np.float32)
+    shape = [1] * src.ndim
+    shape[axis] = n
+    out *= np.where(inside, np.float32(decay) / count, np.float32(0)).astype(src.dtype).reshape(shape)
+    return out
+
+
+def box_blur(trail, radius, decay=1.0, valid=None):
+    """
+    Mean over the (2r+1)^2 in-bounds neighbourhood, horizontal pass then vertical pass,
+    exactly like the shader's blurSrc/blurDst ping-pong. `decay` is applied
+    in the vertical pass (fused evaporation). `valid` = ((y0, y1), (x0, x1)),
+    see box_blur_axis.
+    """
+    if radius <= 0:
+        return trail * trail.dtype.type(decay) if decay != 1.0 else trail
+    rows, cols = (None, None) if valid is None else valid
+    return box_blur_axis(box_blur_axis(trail, radius, 1, valid=cols), radius, 0, decay, valid=rows)
+
+
+class CpuSlimeEngine:
+    """
+    Slime simulation state plus the three compute passes, on the CPU.
+
+    `cfg` is anything with the config.py attribute names: the config module
+    itself, or config.load_preset(n) to run a preset without editing CURRENT_PRESET.
+
+    `region` = (x0, y0, x1, y1) limits the trail and obstacle maps to that
+    rectangle of the world (it may reach past the edges, see tiled_engine);
+    agents keep world coordinates and must only sense and deposit inside it.
+    """
+
+    def __init__(self, cfg=config, seed=None, agents=None, region=None):
+        self.cfg = cfg
+        self.width = int(cfg.SIM_WIDTH)
+        self.height = int(cfg.SIM_HEIGHT)
+        self.region = (0, 0, self.width, self.height) if region is None else tuple(int(v) for v in region)
+        x0, y0, x1, y1 = self.region
+        self.species = species_table(cfg)
+        self.num_species = len(self.species)
+        self.headings = heading_table(cfg)
+
+        self.agents = spawn_agents(cfg, seed) if agents is None else agents
+        self.dynamic = is_dynamic(cfg)
+        self.capacity = max(agent_capacity(cfg), len(self.agents))
+        self.schedule = EmitterSchedule(cfg)
+        self.trail_format = trail_format(cfg)
+        self.layers = trail_layers(cfg)
+        self.trail = np.zeros((y1 - y0, x1 - x0, self.layers), dtype=TRAIL_FORMATS[self.trail_format])
+        self.interaction = interaction_matrix(cfg)
+        self.sensor_filter, self.sensor_size, self.sensor_mip = sensor_settings(cfg)
+        # like the shader: imageLoad for plain point reads, the texture sampler otherwise
+        self.sensor_sampled = self.sensor_filter == "LINEAR" or self.sensor_mip > 0
+        # index range of the trail rows/columns that lie inside the world
+        self.valid = ((max(-y0, 0), min(self.height, y1) - y0), (max(-x0, 0), min(self.width, x1) - x0))
+
+        self.obstacles = obstacle_mask(cfg, self.region) if cfg.USE_OBSTACLES else None
+        self.obstacle_bounce, self.obstacle_avoid = obstacle_response(cfg)
+        self.obstacle_field = obstacle_field(cfg, self.region) if uses_obstacle_field(cfg) else None
+        self.attractor = AttractorField(cfg, self.region) if uses_attractor(cfg) else None
+        self.deposit_scale = np.float32(float(cfg.AGENT_DEPOSIT_SCALE) / float(max(total_agent_count(cfg), 1)))
+        # ATOMIC mode mirrors the shader's fixed-point accumulator bit for bit
+        self.atomic_deposit = cfg.DEPOSIT_MODE.upper() == "ATOMIC"
+        self.fixed_scale = np.float32(cfg.DEPOSIT_FIXED_POINT_SCALE)
+        self.deposits = np.zeros(self.trail.shape, dtype=np.uint32) if self.atomic_deposit else None
+        self.step_count = 0
+        self.profiler = None  # optional profiler.PassProfiler
+
+    def _section(self, name):
+        return self.profiler.section(name) if self.profiler is not None else contextlib.nullcontext()
+
+    def sensor_map(self):
+        """The trail map the sensors read this step: the trail itself, or its SENSOR_MIP level."""
+        return trail_mip(self.trail, self.sensor_mip) if self.sensor_mip else self.trail
+
+    def _sample(self, x, y, species, field=None):
+        """
+        What each agent senses at (x, y): its own species' layer, or the
+        SPECIES_INTERACTION weighted sum of all layers, averaged over the
+        SENSOR_SIZE^2 kernel, plus its ATTRACTOR_WEIGHT times the attractor
+        map; 0 outside the map. `field` is sensor_map().
+        """
+        value = self._sample_trail(x, y, species, field)
+        if self.attractor is None:
+            return value
+        inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+        xi, yi = self._index(x, y, inside)
+        pull = self.species['attractor_weight'][species] * self.attractor.at(xi, yi)
+        return value + np.where(inside, pull, np.float32(0))
+
+    def _sample_trail(self, x, y, species, field=None):
+        inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+        if self.sensor_size == 1 and not self.sensor_sampled:
+            return np.where(inside, self._point(x, y, species), np.float32(0))
+
+        field = self.trail if field is None else field
+        # kernel reads one texel of the sensed level apart, like sampleTrail()
+        w, h = self._level_size(field)
+        texel_x = np.float32(self.width / w)
+        texel_y = np.float32(self.height / h)
+        half = np.float32(0.5 * (self.sensor_size - 1))
+        total = np.zeros(len(x), dtype=np.float32)
+        for j in range(self.sensor_size):
+            for i in range(self.sensor_size):
+                px = x + (np.float32(i) - half) * texel_x
+                py = y + (np.float32(j) - half) * texel_y
+                if self.sensor_sampled:
+                    total += self._filtered(field, px, py, species)
+                else:
+                    ok = (px >= 0) & (px < self.width) & (py >= 0) & (py < self.height)
+                    total += np.where(ok, self._point(px, py, species), np.float32(0))
+        return np.where(inside, total / np.float32(self.sensor_size ** 2), np.float32(0))
+
+    def _level_size(self, field):
+        """World (width, height) in texels of `field`; level 0 may be just a region (tiles), the mips are whole."""
+        return (self.width, self.height) if field is self.trail else (field.shape[1], field.shape[0])
+
+    def _weigh(self, texels, species):
+        """The sensed value of gathered trail texels (N x S): own layer or interaction sum."""
+        if self.interaction is None:
+            return texels[np.arange(len(species)), species].astype(np.float32)
+        return np.einsum('ij,ij->i', texels.astype(np.float32), self.interaction[species])
+
+    def _point(self, x, y, species):
+        """imageLoad at the truncated position (x, y), which must be inside the map where it counts."""
+        inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+        xi, yi = self._index(x, y, inside)
+        if self.interaction is None:
+            return self.trail[yi, xi, species]
+        return self._weigh(self.trail[yi, xi], species)
+
+    def _filtered(self, field, x, y, species):
+        """
+        textureLod of `field` (the trail or one of its mips) at world position
+        (x, y): NEAREST or LINEAR, texels past the edge read as 0 (the sampler's
+        zero border).
+        """
+        w, h = self._level_size(field)
+        # texel space of the level; the texel centre is at +0.5
+        u = x * np.float32(w / self.width)
+        v = y * np.float32(h / self.height)
+        x0, y0 = self.region[:2] if field is self.trail else (0, 0)
+
+        def texel(ix, iy):
+            ok = (ix >= 0) & (ix < w) & (iy >= 0) & (iy < h)
+            values = field[np.where(ok, iy - y0, 0), np.where(ok, ix - x0, 0)]
+            return np.where(ok, self._weigh(values, species), np.float32(0))
+
+        if self.sensor_filter == "NEAREST":
+            return texel(np.floor(u).astype(np.int64), np.floor(v).astype(np.int64))
+        u -= np.float32(0.5)
+        v -= np.float32(0.5)
+        iu, iv = np.floor(u), np.floor(v)
+        fu, fv = (u - iu).astype(np.float32), (v - iv).astype(np.float32)
+        iu, iv = iu.astype(np.int64), iv.astype(np.int64)
+        top = texel(iu, iv) * (1 - fu) + texel(iu + 1, iv) * fu
+        bottom = texel(iu, iv + 1) * (1 - fu) + texel(iu + 1, iv + 1) * fu
+        return top * (1 - fv) + bottom * fv
+
+    def _index(self, x, y, inside):
+        """Trail map indices of world positions (x, y), 0 where not `inside`."""
+        x0, y0 = self.region[:2]
+        if x0 or y0:
+            # truncate before moving the origin, x - x0 can round up to the next pixel
+            return (np.where(inside, x.astype(np.int32) - x0, 0), np.where(inside, y.astype(np.int32) - y0, 0))
+        return np.where(inside, x, 0).astype(np.int32), np.where(inside, y, 0).astype(np.int32)
+
+    def _blocked(self, x, y, layers):
+        """Whether (x, y) is off the map or on one of the obstacle `layers` (bitmask per agent)."""
+        inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+        xi, yi = self._index(x, y, inside)
+        return ~inside | ((self.obstacles.layers_at(yi, xi) & layers) != 0)
+
+    def _field_at(self, x, y):
+        """Obstacle field texels (N x 4) at world positions (x, y), clamped to the map."""
+        x0, y0 = self.region[:2]
+        xi = np.clip(x.astype(np.int32), 0, self.width - 1) - x0
+        yi = np.clip(y.astype(np.int32), 0, self.height - 1) - y0
+        return self.obstacle_field[yi, xi]
+
+    def _flat_index(self, x, y, s):
+        """Index into trail.reshape(-1) of layer `s` at world positions (x, y)."""
+        x0, y0 = self.region[:2]
+        return ((y.astype(np.int64) - y0) * self.trail.shape[1] + (x.astype(np.int64) - x0)) * self.layers + s
+
+    def deposit(self, x, y, s, amount):
+        """Add `amount` to layer `s` of the trail at (x, y), overlapping deposits all count."""
+        flat = self._flat_index(x, y, s)
+        if self.atomic_deposit:
+            np.add.at(self.deposits.reshape(-1), flat, (amount * self.fixed_scale + np.float32(0.5)).astype(np.uint32))
+            self.trail += (self.deposits.astype(np.float32) / self.fixed_scale).astype(self.trail.dtype)
+            self.deposits.fill(0)
+        else:
+            np.add.at(self.trail.reshape(-1), flat, amount.astype(self.trail.dtype))
+
+    def update_agents(self):
+        """Pass 0: sense, turn, random wiggle, move and deposit for all agents."""
+        sp = self.agents['species']
+        live = (sp >= 0) & (sp < self.num_species)
+        a = self.agents[live]
+        s = a['species']
+        x, y, angle = a['x'], a['y'], a['angle']
+
+        sp_row = self.species[s]
+        spd = sp_row['speed']
+        t_spd = sp_row['turn_speed']
+        s_ang = sp_row['sensor_angle']
+        s_dist = sp_row['sensor_distance']
+        dep = sp_row['deposit_amount'] * self.deposit_scale
+
+        # sense
+        if self.attractor is not None:
+            self.attractor.update(self.step_count)
+        field = self.sensor_map() if self.sensor_sampled else None
+        if self.headings is None:
+            left_a = angle - s_ang
+            right_a = angle + s_ang
+            lv = self._sample(x + np.cos(left_a) * s_dist, y + np.sin(left_a) * s_dist, s, field)
+            rv = self._sample(x + np.cos(right_a) * s_dist, y + np.sin(right_a) * s_dist, s, field)
+            fv = self._sample(x + np.cos(angle) * s_dist, y + np.sin(angle) * s_dist, s, field)
+        else:
+            # quantized heading: left/forward/right offsets from the lookup table
+            off = self.headings[s, heading_index(angle, len(self.headings[0]))]
+            lv = self._sample(x + off[:, 0, 0], y + off[:, 0, 1], s, field)
+            fv = self._sample(x + off[:, 1, 0], y + off[:, 1, 1], s, field)
+            rv = self._sample(x + off[:, 2, 0], y + off[:, 2, 1], s, field)
+
+        keep = (fv > lv) & (fv > rv)
+        angle = np.where(keep, angle, np.where(lv > rv, angle - t_spd, angle + t_spd))
+
+        # random wiggle, and the death roll when the population is dynamic (rng.py)
+        mortal = self.cfg.DEATH_RATE > 0 or self.cfg.STARVATION_RATE > 0
+        draws = agent_draws(a['seed'], step_key(self.cfg, self.step_count), 2 if mortal else 1)
+        angle = angle + (draws[0] - np.float32(0.5)) * np.float32(self.cfg.RANDOM_TURN_FACTOR)
+
+        # the dead stay put
+        dead = np.zeros(len(a), dtype=bool)
+        if mortal:
+            starving = np.maximum(np.maximum(lv, rv), fv) < np.float32(self.cfg.STARVATION_THRESHOLD)
+            dead = draws[1] < np.where(starving, np.float32(self.cfg.STARVATION_RATE), np.float32(self.cfg.DEATH_RATE))
+
+        # steer away from walls nearer than OBSTACLE_AVOID_DISTANCE, harder the nearer
+        if self.obstacle_field is not None and self.obstacle_avoid > 0:
+            f = self._field_at(x, y)
+            dir_x, dir_y = np.cos(angle), np.sin(angle)
+            near = (f[:, 0] < np.float32(self.obstacle_avoid)) & (dir_x * f[:, 1] + dir_y * f[:, 2] < 0)
+            side = np.sign(dir_x * f[:, 2] - dir_y * f[:, 1])
+            push = np.clip(np.float32(1) - f[:, 0] / np.float32(self.obstacle_avoid), 0, 1)
+            angle = np.where(near, angle + side * t_spd * push, angle)
+
+        # move
+        if self.headings is None:
+            nx = x + np.cos(angle) * spd
+            ny = y + np.sin(angle) * spd
+        else:
+            move = self.headings[s, heading_index(angle, len(self.headings[0])), 3]
+            nx = x + move[:, 0]
+            ny = y + move[:, 1]
+        if self.obstacles is not None:
+            blocked = self._blocked(nx, ny, sp_row['obstacle_layers'])
+            if self.obstacle_bounce == "REFLECT":
+                angle = np.where(blocked, self._reflect(angle, nx, ny), angle)
+            else:
+                angle = np.where(blocked, angle + PI, angle)
+            nx = np.where(blocked, x, nx)
+            ny = np.where(blocked, y, ny)
+        else:
+            out = (nx < 0) | (nx >= self.width) | (ny < 0) | (ny >= self.height)
+            # only what the shader clamps: (w - 1, w) stays where it is
+            nx = np.where(nx < 0, np.float32(0), nx)
+            nx = np.where(nx >= self.width, np.float32(self.width - 1), nx)
+            ny = np.where(ny < 0, np.float32(0), ny)
+            ny = np.where(ny >= self.height, np.float32(self.height - 1), ny)
+            angle = np.where(out, angle + PI, angle)
+
+        nx = np.where(dead, x, nx)
+        ny = np.where(dead, y, ny)
+
+        # deposit, the dead don't
+        alive = ~dead if dead.any() else slice(None)
+        self.deposit(nx[alive], ny[alive], s[alive], dep[alive])
+
+        a['x'], a['y'], a['angle'] = nx, ny, angle
+        a['species'] = np.where(dead, -1, s)
+        self.agents[live] = a
+
+    def _reflect(self, angle, x, y):
+        """Headings mirrored off the wall at (x, y); straight back where the normal doesn't face them."""
+        f = self._field_at(x, y)
+        dir_x, dir_y = np.cos(angle), np.sin(angle)
+        d = dir_x * f[:, 1] + dir_y * f[:, 2]
+        out = np.arctan2(dir_y - 2 * d * f[:, 2], dir_x - 2 * d * f[:, 1])
+        return np.where(d < 0, out, angle + PI)
+
+    def update_population(self):
+        """Passes 4-6: drop the dead, append the emitters' new agents up to the capacity."""
+        survivors = self.agents[self.agents['species'] >= 0]
+        parts = [survivors]
+        room = self.capacity - len(survivors)
+        for i, (emitter, n) in enumerate(zip(self.schedule.emitters, self.schedule.counts())):
+            n = min(n, room)
+            if n > 0:
+                parts.append(emit_agents(self.cfg, emitter, emitter_key(self.cfg, self.step_count, i), n))
+                room -= n
+        self.agents = np.concatenate(parts)
+
+    def evaporate(self):
+        """Pass 1: multiply the whole trail map by EVAPORATION_FACTOR."""
+        self.trail *= self.trail.dtype.type(self.cfg.EVAPORATION_FACTOR)
+
+    def blur(self, decay=1.0):
+        """Pass 2: one box blur of radius BLUR_RADIUS, optionally fused with evaporation."""
+        self.trail = box_blur(self.trail, self.cfg.BLUR_RADIUS, decay, self.valid)
+
+    def diffuse(self):
+        """Evaporation and BLUR_PASSES blurs, fused or not as configured."""
+        passes = self.cfg.BLUR_PASSES
+        if self.cfg.FUSE_DIFFUSE_DECAY and self.cfg.BLUR_RADIUS > 0 and passes > 0:
+            with self._section("blur"):
+                for i in range(passes):
+                    self.blur(self.cfg.EVAPORATION_FACTOR if i == passes - 1 else 1.0)
+        else:
+            with self._section("evaporate"):
+                self.evaporate()
+            with self._section("blur"):
+                for _ in range(passes):
+                    self.blur()
+
+    def step(self):
+        """One frame's worth of simulation, in the same order as the main loop."""
+        with self._section("agents"):
+            self.update_agents()
+        if self.dynamic:
+            with self._section("population"):
+                self.update_population()
+        self.diffuse()
+        self.step_count += 1
+
+        interval = self.cfg.AGENT_SORT_INTERVAL
+        if interval > 0 and self.step_count % interval == 0:
+            with self._section("sort"):
+                self.agents = sort_agents(self.agents, self.cfg.AGENT_SORT_TILE)
+
+    def run(self, steps):
+        for _ in range(steps):
+            self.step()
+        return self
+
+    def save_checkpoint(self, path):
+        """Write the complete state to directory `path`, see checkpoint.py."""
+        from checkpoint import save_checkpoint
+        save_checkpoint(path, self.cfg, self.trail, self.agents, self.step_count, self.schedule.carry)
+
+    def load_checkpoint(self, path):
+        """Continue from the state saved in `path` (by either engine)."""
+        from checkpoint import check_shape, load_checkpoint
+        state = load_checkpoint(path)
+        check_shape(state, self.trail.shape)
+        self.trail[...] = state.trail
+        self.capacity = max(self.capacity, len(state.agents))
+        self.agents = np.array(state.agents)
+        self.step_count = state.step
+        if len(state.carry) == len(self.schedule.carry):
+            self.schedule.carry = list(state.carry)
+        return self
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a slime preset headlessly on the CPU.")
+    parser.add_argument("--preset", type=int, default=config.CURRENT_PRESET)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="trail.npy", help="where to save the final trail map (.npy)")
+    parser.add_argument("--resume", metavar="DIR", help="start from this checkpoint, with its settings")
+    parser.add_argument("--checkpoint", metavar="DIR", help="save a checkpoint here at the end")
+    args = parser.parse_args()
+
+    if args.resume:
+        from checkpoint import checkpoint_config
+        engine = CpuSlimeEngine(checkpoint_config(args.resume), seed=args.seed).load_checkpoint(args.resume)
+    else:
+        engine = CpuSlimeEngine(config.load_preset(args.preset), seed=args.seed)
+    engine.run(args.steps)
+    np.save(args.out, engine.trail)
+    if args.checkpoint:
+        engine.save_checkpoint(args.checkpoint)
+    print(f"Preset {getattr(engine.cfg, 'PRESET', args.preset)}: {args.steps} steps (now at step {engine.step_count}), "
+          f"trail map saved to {args.out}")
@@ -0,0 +1,130 @@
+# hot_reload.py
+"""
+Live config reloading for the windowed simulation.
+
+ConfigWatcher polls config.py (and optionally a JSON/TOML file of overrides)
+and hands back a fresh config whenever one of them is saved. Settings are
+sorted by what they cost to change: most are just uniforms, the ones listed
+in REALLOCATE need some GL objects rebuilt (GpuSlimeSim.reconfigure), the
+GL context and shaders stay.
+"""
+
+import importlib
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import config
+from attractors import attractor_function
+from capture import species_palette
+from cpu_engine import interaction_matrix, sensor_settings, species_table, trail_format, trail_layers
+from obstacles import obstacle_images, obstacle_response
+from population import emitters
+
+# GL object group -> settings that need it rebuilt; anything else is a uniform
+# or read every frame. "window" is handled by the main loop.
+REALLOCATE = dict(
+    trail=("SIM_WIDTH", "SIM_HEIGHT", "TRAIL_FORMAT", "TRAIL_HALF_FLOAT", "MULTI_SPECIES", "NUM_SPECIES",
+           "DEPOSIT_MODE", "SENSOR_MIP"),
+    obstacles=("SIM_WIDTH", "SIM_HEIGHT", "USE_OBSTACLES", "OBSTACLE_IMAGE", "OBSTACLE_THRESHOLD", "OBSTACLE_BOUNCE",
+               "OBSTACLE_AVOID_DISTANCE"),
+    agents=("SIM_WIDTH", "SIM_HEIGHT", "MULTI_SPECIES", "NUM_SPECIES", "NUM_AGENTS", "SPECIES_AGENT_COUNTS",
+            "SPAWN_MODE", "SPAWN_RADIUS", "SPAWN_SEED", "SPECIES_SPAWN_REGIONS", "USE_RANDOM_SEEDS", "MAX_AGENTS"),
+    attractor=("SIM_WIDTH", "SIM_HEIGHT", "ATTRACTOR_IMAGE", "ATTRACTOR_POINTS", "ATTRACTOR_FUNCTION",
+               "ATTRACTOR_INTERVAL"),
+    window=("WINDOW_WIDTH", "WINDOW_HEIGHT", "READBACK_BUFFERS"),
+)
+
+
+def snapshot(cfg):
+    """Every setting of `cfg` (its upper-case attributes) as a plain dict."""
+    return {name: getattr(cfg, name) for name in dir(cfg) if name.isupper()}
+
+
+def changed_settings(old, new):
+    """Names of the settings whose value differs between two configs."""
+    old, new = snapshot(old), snapshot(new)
+    return {name for name in old.keys() | new.keys() if old.get(name) != new.get(name)}
+
+
+def reallocations(changed):
+    """REALLOCATE groups touched by the `changed` setting names."""
+    return {group for group, names in REALLOCATE.items() if changed.intersection(names)}
+
+
+def check(cfg):
+    """Raise if `cfg` could not be applied, before any GL object is released."""
+    trail_format(cfg)
+    interaction_matrix(cfg)
+    sensor_settings(cfg)
+    obstacle_response(cfg)
+    species_palette(cfg, trail_layers(cfg))
+    emitters(cfg)
+    species_table(cfg)
+    attractor_function(cfg)
+    if cfg.USE_OBSTACLES:
+        for path in obstacle_images(cfg):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"OBSTACLE_IMAGE {path!r} does not exist")
+    if cfg.ATTRACTOR_IMAGE and not os.path.exists(cfg.ATTRACTOR_IMAGE):
+        raise FileNotFoundError(f"ATTRACTOR_IMAGE {cfg.ATTRACTOR_IMAGE!r} does not exist")
+
+
+def load_overrides(path):
+    """{SETTING: value} from a .json or .toml file."""
+    if path.lower().endswith(".toml"):
+        import tomllib
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    with open(path) as f:
+        return json.load(f)
+
+
+class ConfigWatcher:
+    """
+    Polls the modification times of config.py and `overrides_path` every
+    `interval` seconds. `preset` = None follows CURRENT_PRESET, a number
+    always reloads that preset. `overrides` (e.g. from the command line) are
+    applied last, after the overrides file. Configs are handed out as
+    namespaces, so a reload never changes the settings of a running
+    simulation under its feet.
+    """
+
+    def __init__(self, preset=None, overrides_path=None, overrides=None, interval=0.5):
+        self.preset = preset
+        self.overrides_path = overrides_path
+        self.overrides = dict(overrides or {})
+        self.interval = interval
+        self.paths = [config.__file__] + ([overrides_path] if overrides_path else [])
+        self.mtimes = self._mtimes()
+        self._last_poll = time.perf_counter()
+
+    def _mtimes(self):
+        return [os.stat(p).st_mtime_ns if os.path.exists(p) else None for p in self.paths]
+
+    def load(self):
+        importlib.reload(config)
+        cfg = SimpleNamespace(**snapshot(config)) if self.preset is None else config.load_preset(self.preset)
+        overrides = load_overrides(self.overrides_path) if self.overrides_path else {}
+        for name, value in {**overrides, **self.overrides}.items():
+            setattr(cfg, name, value)
+        return cfg
+
+    def poll(self):
+        """A freshly loaded config if a watched file was saved since the last poll, else None."""
+        now = time.perf_counter()
+        if now - self._last_poll < self.interval:
+            return None
+        self._last_poll = now
+        mtimes = self._mtimes()
+        if mtimes == self.mtimes:
+            return None
+        self.mtimes = mtimes
+        try:
+            cfg = self.load()
+            check(cfg)
+        except Exception as e:  # half-saved file, typo, bad value: keep running the old config
+            print(f"Config reload failed, keeping the current settings: {type(e).__name__}: {e}")
+            return None
+        return cfg
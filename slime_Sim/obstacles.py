@@ -0,0 +1,354 @@
+# obstacles.py
+"""
+Obstacle maps for both engines.
+
+OBSTACLE_IMAGE is one image or a list of up to 8 layer images (any size;
+PNG etc., or a .npy array for very large masks). Each layer is resampled to
+the SIM_WIDTH x SIM_HEIGHT grid and thresholded at OBSTACLE_THRESHOLD
+(darker pixels block), a strip of rows at a time, then bit-packed: one bit
+per pixel per layer. OBSTACLE_SPECIES_LAYERS picks the layers that block
+each species. The packed grid is cached in OBSTACLE_CACHE_DIR under a hash
+of the images and settings, so large masks are read from disk only once.
+
+For steering away from walls and bouncing off them, the union of the
+layers is turned into an obstacle field once: an HxWx4 float32 array of
+    signed distance   pixels to the nearest wall edge, negative inside walls
+    normal x, y       unit gradient of the distance, pointing away from walls
+    0                 padding, so the GL texture is plain RGBA32F
+The map border counts as a wall. The field is cached the same way.
+"""
+
+import contextlib
+import hashlib
+import math
+import os
+import tempfile
+from types import SimpleNamespace
+
+import numpy as np
+from PIL import Image
+
+import config
+
+OBSTACLE_FIELD_VERSION = 3
+OBSTACLE_BOUNCES = ("REVERSE", "REFLECT")
+OBSTACLE_MAX_LAYERS = 8  # bits of a texel of the GL R8UI obstacle texture
+
+_STRIP_PIXELS = 1 << 22  # source pixels read and resampled at a time
+_DECODE_PIXELS = 1 << 26  # largest non-.npy image; PIL can only decode one whole
+
+_FAR = 1e12  # "no site" in the distance transform, far beyond any squared distance on a map
+
+
+def obstacle_images(cfg=config):
+    """OBSTACLE_IMAGE as a list of layer image paths."""
+    images = cfg.OBSTACLE_IMAGE
+    images = [images] if isinstance(images, (str, os.PathLike)) else list(images)
+    if not 0 < len(images) <= OBSTACLE_MAX_LAYERS:
+        raise ValueError(f"OBSTACLE_IMAGE must be 1 to {OBSTACLE_MAX_LAYERS} images, got {len(images)}")
+    return images
+
+
+def species_obstacle_layers(cfg, species):
+    """
+    uint32 bitmask of the obstacle layers that block each of `species` species
+    (bit l = layer l): OBSTACLE_SPECIES_LAYERS, or every layer when None.
+    """
+    layers = cfg.OBSTACLE_SPECIES_LAYERS
+    if layers is None:
+        return np.full(species, (1 << OBSTACLE_MAX_LAYERS) - 1, dtype=np.uint32)
+    if len(layers) < species:
+        raise ValueError(f"OBSTACLE_SPECIES_LAYERS needs an entry per species ({species}), got {len(layers)}")
+    masks = np.zeros(species, dtype=np.uint32)
+    for i, entry in enumerate(layers[:species]):
+        for layer in entry:
+            if not 0 <= layer < OBSTACLE_MAX_LAYERS:
+                raise ValueError(f"OBSTACLE_SPECIES_LAYERS: no obstacle layer {layer}")
+            masks[i] |= np.uint32(1 << layer)
+    return masks
+
+
+@contextlib.contextmanager
+def _open_rows(path):
+    """
+    (width, height, read) of an obstacle image, read(y0, y1) giving greyscale
+    uint8 rows. A .npy (greyscale, RGB(A) or bool True = blocked) is memory
+    mapped, so only the rows asked for are read. Other images are decoded
+    whole in their own mode (PIL has no row reader) and converted strip by
+    strip; past _DECODE_PIXELS they are refused in favour of .npy.
+    """
+    if path.lower().endswith(".npy"):
+        arr = np.load(path, mmap_mode='r')
+
+        def read(y0, y1):
+            rows = np.asarray(arr[y0:y1])
+            if rows.dtype == bool:
+                return np.where(rows, 0, 255).astype(np.uint8)
+            if rows.ndim == 3:  # the luma weights of PIL's convert('L')
+                rows = rows[..., 0] * 0.299 + rows[..., 1] * 0.587 + rows[..., 2] * 0.114
+            return np.clip(rows, 0, 255).astype(np.uint8)
+
+        yield arr.shape[1], arr.shape[0], read
+        return
+
+    limit = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None  # huge masks are deliberate, not decompression bombs
+    try:
+        img = Image.open(path)
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+    with img:
+        if img.width * img.height > _DECODE_PIXELS:
+            raise ValueError(f"{path!r} is {img.width}x{img.height}; images over {_DECODE_PIXELS} pixels must be "
+                             f"a .npy array (greyscale uint8 or bool, True = blocked), which is read in strips")
+        yield img.width, img.height, lambda y0, y1: np.asarray(img.crop((0, y0, img.width, y1)).convert('L'))
+
+
+def image_strips(path, width, height):
+    """
+    Yield (y0, y1, rows): greyscale uint8 rows y0:y1 of the image at `path`
+    resampled to `width` x `height` (box filter, when the size differs), a
+    strip at a time, so the result is never held whole (nor a .npy source,
+    see _open_rows).
+    """
+    with _open_rows(path) as (src_w, src_h, read):
+        scale = src_h / height
+        strip = max(1, int(_STRIP_PIXELS / (max(src_w, width) * max(scale, 1))))
+        for y0 in range(0, height, strip):
+            y1 = min(y0 + strip, height)
+            if (src_w, src_h) == (width, height):
+                yield y0, y1, read(y0, y1)
+                continue
+            # the source rows under this strip, plus a row either side for the filter
+            top, bottom = y0 * scale, y1 * scale
+            s0, s1 = max(int(top) - 1, 0), min(math.ceil(bottom) + 1, src_h)
+            rows = Image.fromarray(read(s0, s1))
+            yield y0, y1, np.asarray(rows.resize((width, y1 - y0), Image.Resampling.BOX,
+                                                 box=(0, top - s0, src_w, bottom - s0)))
+
+
+def layer_bits(path, width, height, threshold):
+    """Blocked pixels of one obstacle image on the `width` x `height` grid, np.packbits'ed along x."""
+    packed = np.empty((height, (width + 7) // 8), dtype=np.uint8)
+    for y0, y1, grey in image_strips(path, width, height):
+        packed[y0:y1] = np.packbits(grey < threshold * 255, axis=1)
+    return packed
+
+
+class PackedMask:
+    """
+    Obstacle layers of a rectangle, bit-packed along x: `planes` is
+    (layers, height, ceil(width / 8)) uint8, one bit per pixel per layer.
+    """
+
+    def __init__(self, planes, width):
+        self.planes = planes
+        self.width = width
+
+    @property
+    def shape(self):
+        return self.planes.shape[1], self.width
+
+    def layers_at(self, yi, xi):
+        """Bitmask of the layers blocked at each pixel (yi, xi), bit l = layer l."""
+        shift = (7 - (xi & 7)).astype(np.uint8)
+        bits = (self.planes[:, yi, xi >> 3] >> shift) & np.uint8(1)
+        weights = np.left_shift(np.uint32(1), np.arange(len(self.planes), dtype=np.uint32))
+        return (bits.astype(np.uint32) * weights[:, None]).sum(axis=0, dtype=np.uint32)
+
+    def rows(self, y0, y1):
+        """Rows y0:y1 as uint8 layer bitmasks per pixel (the GL texture's texels)."""
+        out = np.zeros((y1 - y0, self.width), dtype=np.uint8)
+        for layer, plane in enumerate(self.planes):
+            out |= np.unpackbits(plane[y0:y1], axis=1, count=self.width) << np.uint8(layer)
+        return out
+
+    def union(self):
+        """Boolean HxW mask, True where any layer blocks."""
+        return self.rows(0, self.shape[0]) != 0
+
+
+def _digest(cfg):
+    """Hash of the obstacle images and the settings that shape what is built from them."""
+    digest = hashlib.sha1()
+    for path in obstacle_images(cfg):
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    digest.update(repr((int(cfg.SIM_WIDTH), int(cfg.SIM_HEIGHT), float(cfg.OBSTACLE_THRESHOLD),
+                        OBSTACLE_FIELD_VERSION)).encode())
+    return digest.hexdigest()
+
+
+def _cached(cfg, kind, build, mmap=False):
+    """`build()`'s array, stored in OBSTACLE_CACHE_DIR as <kind>_<hash>.npy."""
+    if not cfg.OBSTACLE_CACHE_DIR:
+        return build()
+    path = os.path.join(cfg.OBSTACLE_CACHE_DIR, f"{kind}_{_digest(cfg)}.npy")
+    if not os.path.exists(path):
+        os.makedirs(cfg.OBSTACLE_CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp.npy"  # several processes may build it at once
+        np.save(tmp, build())
+        os.replace(tmp, path)
+    return np.load(path, mmap_mode='r' if mmap else None)
+
+
+def packed_obstacles(cfg=config):
+    """(layers, SIM_HEIGHT, ceil(SIM_WIDTH / 8)) packed obstacle layers, memory mapped from the cache."""
+    width, height = int(cfg.SIM_WIDTH), int(cfg.SIM_HEIGHT)
+    return _cached(cfg, "mask", lambda: np.stack([layer_bits(path, width, height, cfg.OBSTACLE_THRESHOLD)
+                                                  for path in obstacle_images(cfg)]), mmap=True)
+
+
+def obstacle_mask(cfg, region):
+    """
+    PackedMask of the world rectangle `region` = (x0, y0, x1, y1), which may
+    reach past the map; like imageLoad, texels outside the map are blocked.
+    """
+    x0, y0, x1, y1 = region
+    width, height = int(cfg.SIM_WIDTH), int(cfg.SIM_HEIGHT)
+    packed = packed_obstacles(cfg)
+    if (x0, y0, x1, y1) == (0, 0, width, height):
+        return PackedMask(packed, width)
+    bits = np.ones((len(packed), y1 - y0, x1 - x0), dtype=bool)
+    ix0, iy0 = max(x0, 0), max(y0, 0)
+    ix1, iy1 = min(x1, width), min(y1, height)
+    if ix0 < ix1 and iy0 < iy1:
+        for layer, plane in enumerate(packed):
+            rows = np.unpackbits(plane[iy0:iy1], axis=1, count=width)
+            bits[layer, iy0 - y0:iy1 - y0, ix0 - x0:ix1 - x0] = rows[:, ix0:ix1]
+    return PackedMask(np.packbits(bits, axis=2), x1 - x0)
+
+
+def obstacle_response(cfg=config):
+    """(bounce, avoid distance) of the agents: OBSTACLE_BOUNCE and OBSTACLE_AVOID_DISTANCE, checked."""
+    bounce = cfg.OBSTACLE_BOUNCE.upper()
+    if bounce not in OBSTACLE_BOUNCES:
+        raise ValueError(f"Unknown OBSTACLE_BOUNCE {cfg.OBSTACLE_BOUNCE!r}, choose one of {list(OBSTACLE_BOUNCES)}")
+    return bounce, max(float(cfg.OBSTACLE_AVOID_DISTANCE), 0.0)
+
+
+def uses_obstacle_field(cfg=config):
+    """Whether the agents need the obstacle field (reflection or steering), not just the mask."""
+    bounce, avoid = obstacle_response(cfg)
+    return bool(cfg.USE_OBSTACLES) and (bounce == "REFLECT" or avoid > 0)
+
+
+def _distance_1d(f):
+    """
+    Squared 1D distance transform of every row of `f` (Felzenszwalb &
+    Huttenlocher's lower envelope of parabolas), a band of rows at a time so
+    the scratch arrays stay small however big the map is.
+    """
+    out = np.empty(f.shape, dtype=np.float64)
+    band = max(1, _STRIP_PIXELS // max(f.shape[1], 1))
+    for r0 in range(0, f.shape[0], band):
+        out[r0:r0 + band] = _envelope(np.asarray(f[r0:r0 + band], dtype=np.float64))
+    return out
+
+
+def _envelope(f):
+    """_distance_1d() of the rows of `f`, all at once."""
+    n_rows, n = f.shape
+    rows = np.arange(n_rows)
+    v = np.zeros((n_rows, n), dtype=np.int64)  # parabola apexes of the envelope
+    z = np.full((n_rows, n + 1), np.inf)        # boundaries between them
+    z[:, 0] = -np.inf
+    k = np.zeros(n_rows, dtype=np.int64)
+    for q in range(1, n):
+        fq = f[:, q] + q * q
+        while True:
+            vk = v[rows, k]
+            s = (fq - (f[rows, vk] + vk * vk)) / (2 * (q - vk))
+            hidden = s <= z[rows, k]
+            if not hidden.any():
+                break
+            k[hidden] -= 1
+        k += 1
+        v[rows, k] = q
+        z[rows, k] = s
+        z[rows, k + 1] = np.inf
+
+    out = np.empty_like(f)
+    k[:] = 0
+    for q in range(n):
+        while True:
+            ahead = z[rows, k + 1] < q
+            if not ahead.any():
+                break
+            k[ahead] += 1
+        vk = v[rows, k]
+        out[:, q] = (q - vk) ** 2 + f[rows, vk]
+    return out
+
+
+def distance_transform(sites):
+    """Exact Euclidean distance (float32) of every pixel to the nearest True pixel of `sites` (HxW bool)."""
+    f = np.where(sites, 0.0, _FAR)
+    return np.sqrt(_distance_1d(_distance_1d(f).T).T).astype(np.float32)
+
+
+def distance_field(mask):
+    """
+    Obstacle field (see the module docstring) of an HxW blocked `mask`.
+    Distances are measured to the edge between blocked and free pixels, half a
+    pixel from either pixel centre.
+    """
+    padded = np.pad(mask, 1, constant_values=True)  # the border is a wall
+    outside = distance_transform(padded) - np.float32(0.5)
+    inside = distance_transform(~padded) - np.float32(0.5)
+    sdf = np.where(padded, -inside, outside)
+    del outside, inside
+    gy, gx = np.gradient(sdf)
+    norm = np.hypot(gx, gy)
+    norm[norm == 0] = 1  # flat spots get a zero normal
+    field = np.zeros(mask.shape + (4,), dtype=np.float32)
+    field[..., 0] = sdf[1:-1, 1:-1]
+    field[..., 1] = (gx / norm)[1:-1, 1:-1]
+    field[..., 2] = (gy / norm)[1:-1, 1:-1]
+    return field
+
+
+def world_field(cfg=config):
+    """Obstacle field of the whole map, memory mapped from the cache when these images were seen before."""
+    width, height = int(cfg.SIM_WIDTH), int(cfg.SIM_HEIGHT)
+    return _cached(cfg, "field", lambda: distance_field(obstacle_mask(cfg, (0, 0, width, height)).union()),
+                   mmap=True)
+
+
+def share_obstacles(cfg):
+    """
+    For engines with worker processes: build the packed mask and the obstacle
+    field once, in this process, so every worker only memory-maps its part.
+    Returns (worker config, scratch directory): without OBSTACLE_CACHE_DIR
+    the data goes to a temporary directory, set in a copy of `cfg` and
+    returned for the caller to remove (None otherwise).
+    """
+    if not cfg.USE_OBSTACLES:
+        return cfg, None
+    scratch = None
+    if not cfg.OBSTACLE_CACHE_DIR:
+        scratch = tempfile.mkdtemp(prefix="slime_obstacles_")
+        cfg = SimpleNamespace(**{**vars(cfg), "OBSTACLE_CACHE_DIR": scratch})
+    packed_obstacles(cfg)
+    if uses_obstacle_field(cfg):
+        world_field(cfg)
+    return cfg, scratch
+
+
+def obstacle_field(cfg, region):
+    """
+    Obstacle field of the world rectangle `region` = (x0, y0, x1, y1), read
+    from the memory mapped cache (only the region is loaded). Texels past the
+    map repeat the edge, lookups clamp positions to the map.
+    """
+    x0, y0, x1, y1 = region
+    width, height = int(cfg.SIM_WIDTH), int(cfg.SIM_HEIGHT)
+    field = world_field(cfg)
+    if (x0, y0, x1, y1) == (0, 0, width, height):
+        return field
+    ix0, iy0 = min(max(x0, 0), width - 1), min(max(y0, 0), height - 1)
+    ix1, iy1 = max(min(x1, width), ix0 + 1), max(min(y1, height), iy0 + 1)
+    part = field[iy0:iy1, ix0:ix1]
+    pad = ((iy0 - y0, y1 - iy1), (ix0 - x0, x1 - ix1), (0, 0))
+    return np.pad(part, [(max(a, 0), max(b, 0)) for a, b in pad], mode='edge')
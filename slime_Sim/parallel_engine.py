@@ -0,0 +1,272 @@
+# parallel_engine.py
+"""
+Multiprocess CPU engine: CpuSlimeEngine's passes spread over a pool of
+worker processes that share the trail map and agents through
+multiprocessing.shared_memory (nothing big is pickled per step).
+
+Per step:
+  mip        with SENSOR_MIP, every worker builds the rows of the sensed mip
+             level over its band of the trail
+  agents     every worker updates a contiguous chunk of the agent array
+             against the trail as it was before the step, and writes its
+             deposits, grouped by row band, to a shared scratch list
+  deposits   every worker adds the deposits of one row band, taking the
+             chunks in order, so each pixel gets exactly the sequence of
+             additions the single-process engine does
+  diffuse    evaporation and both blur directions run per row band; the
+             vertical pass reads BLUR_RADIUS rows of the neighbouring bands
+             from the horizontal pass result
+The output is identical to CpuSlimeEngine's for the same seed, in either
+DEPOSIT_MODE, whatever the number of workers.
+"""
+
+import multiprocessing
+import os
+import shutil
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+
+import numpy as np
+
+import config
+from cpu_engine import CpuSlimeEngine, box_blur_axis, trail_mip
+from hot_reload import snapshot
+from obstacles import share_obstacles
+from spawn import AGENT_DTYPE
+
+_worker = None  # the _Worker of this pool process
+
+
+def _shared(name, shape, dtype, owner=False):
+    """Array over shared memory `name`, created when `owner`, else attached."""
+    size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+    if owner:
+        shm = shared_memory.SharedMemory(create=True, size=size)
+    else:
+        shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def band_edges(height, bands):
+    """Row boundaries of `bands` horizontal bands."""
+    return np.linspace(0, height, min(bands, height) + 1).round().astype(int)
+
+
+class _Worker(CpuSlimeEngine):
+    """Pass code of one pool process, working on views of the shared arrays."""
+
+    def __init__(self, cfg, layout, bands):
+        super().__init__(cfg, agents=np.empty(0, dtype=AGENT_DTYPE))
+        self.shm = {}
+        self.views = {}
+        for key, (name, shape, dtype) in layout.items():
+            self.shm[key], self.views[key] = _shared(name, shape, dtype)
+        self.trail = self.views["trail"]
+        self.deposits = None
+        self.bands = bands
+        self.captured = None
+        if self.sensor_mip:
+            self.mip_bands = band_edges(self.views["mip"].shape[0], len(bands) - 1)
+
+    def sensor_map(self):
+        return self.views["mip"] if self.sensor_mip else self.trail
+
+    def deposit(self, x, y, s, amount):
+        self.captured = self._flat_index(x, y, s), amount
+
+    def update_chunk(self, lo, hi, step):
+        """Move agents[lo:hi] in place, store their deposits sorted by band; deposits per band."""
+        self.agents = self.views["agents"][lo:hi]
+        self.step_count = step  # keys the random draws
+        self.update_agents()
+        flat, amount = self.captured
+        row = flat // (self.width * self.layers)
+        band = np.searchsorted(self.bands, row, side='right') - 1
+        order = np.argsort(band, kind='stable')
+        n = len(flat)
+        self.views["dep_flat"][lo:lo + n] = flat[order]
+        self.views["dep_amount"][lo:lo + n] = amount[order]
+        return np.bincount(band, minlength=len(self.bands) - 1)
+
+    def merge_band(self, b, slices):
+        """Add the deposits of band `b` (dep_* slices, in agent order) to the trail."""
+        y0, y1 = self.bands[b], self.bands[b + 1]
+        if not slices:
+            return
+        flat = np.concatenate([self.views["dep_flat"][s0:s1] for s0, s1 in slices])
+        amount = np.concatenate([self.views["dep_amount"][s0:s1] for s0, s1 in slices])
+        flat -= y0 * self.width * self.layers
+        band = self.trail[y0:y1].reshape(-1)
+        if self.atomic_deposit:
+            deposits = np.zeros(band.shape, dtype=np.uint32)
+            np.add.at(deposits, flat, (amount * self.fixed_scale + np.float32(0.5)).astype(np.uint32))
+            band += (deposits.astype(np.float32) / self.fixed_scale).astype(band.dtype)
+        else:
+            np.add.at(band, flat, amount.astype(band.dtype))
+
+    def mip_band(self, b):
+        """Rows of band `b` of the shared mip level, from the trail rows under them."""
+        if self.height >> self.sensor_mip == 0:
+            # the map is thinner than the level: one band does it, the way trail_mip() pads
+            if b == 0:
+                self.views["mip"][...] = trail_mip(self.trail, self.sensor_mip)
+            return
+        if b >= len(self.mip_bands) - 1:
+            return
+        y0, y1 = self.mip_bands[b], self.mip_bands[b + 1]
+        self.views["mip"][y0:y1] = trail_mip(self.trail[y0 << self.sensor_mip:y1 << self.sensor_mip], self.sensor_mip)
+
+    def scale_band(self, b, factor):
+        y0, y1 = self.bands[b], self.bands[b + 1]
+        self.trail[y0:y1] *= self.trail.dtype.type(factor)
+
+    def blur_band(self, b, axis, decay):
+        """One direction of the box blur for the rows of band `b` (trail -> scratch -> trail)."""
+        y0, y1 = self.bands[b], self.bands[b + 1]
+        r = self.cfg.BLUR_RADIUS
+        scratch = self.views["scratch"]
+        if axis == 1:
+            scratch[y0:y1] = box_blur_axis(self.trail[y0:y1], r, 1)
+        else:
+            lo, hi = max(y0 - r, 0), min(y1 + r, self.height)
+            out = box_blur_axis(scratch[lo:hi], r, 0, decay, valid=(-lo, self.height - lo))
+            self.trail[y0:y1] = out[y0 - lo:y1 - lo]
+
+
+def _init_worker(cfg, layout, bands):
+    global _worker
+    _worker = _Worker(cfg, layout, bands)
+
+
+def _call(method, *args):
+    return getattr(_worker, method)(*args)
+
+
+class ParallelSlimeEngine(CpuSlimeEngine):
+    """
+    CpuSlimeEngine with its passes run by `workers` processes (default
+    CPU_WORKERS, None => one per core). `trail` and `agents` are views of
+    shared memory. Call close() (or use it as a context manager) to stop the
+    pool and free the shared memory.
+    """
+
+    def __init__(self, cfg=config, seed=None, agents=None, workers=None):
+        cfg = SimpleNamespace(**snapshot(cfg))  # the config module itself can't be pickled
+        # every worker memory-maps the obstacle data, built once here
+        worker_cfg, self.scratch = share_obstacles(cfg)
+        super().__init__(worker_cfg, seed, agents)
+        self.cfg = cfg
+        self.deposits = None  # ATOMIC deposits are accumulated per band by the workers
+        self.workers = int(workers or cfg.CPU_WORKERS or os.cpu_count() or 1)
+        self.bands = band_edges(self.height, self.workers)
+        self.chunks = 4 * self.workers  # a few per worker, chunks finish at different times
+
+        shapes = dict(trail=(self.trail.shape, self.trail.dtype), scratch=(self.trail.shape, self.trail.dtype),
+                      agents=((self.capacity,), AGENT_DTYPE), dep_flat=((self.capacity,), np.int64),
+                      dep_amount=((self.capacity,), np.float32))
+        if self.sensor_mip:
+            # the sensed mip level, built once per step by the bands rather than by every chunk
+            shapes["mip"] = (trail_mip(self.trail, self.sensor_mip).shape, self.trail.dtype)
+        self.shm = {}
+        views = {}
+        for key, (shape, dtype) in shapes.items():
+            self.shm[key], views[key] = _shared(None, shape, dtype, owner=True)
+        layout = {key: (self.shm[key].name, shape, dtype) for key, (shape, dtype) in shapes.items()}
+        views["trail"][:] = self.trail
+        self.trail = views["trail"]
+        self._agent_buffer = views["agents"]
+        self._mip = views.get("mip")
+        self.agents = self._agents  # copy into shared memory
+
+        self.pool = multiprocessing.get_context().Pool(self.workers, _init_worker, (worker_cfg, layout, self.bands))
+
+    @property
+    def agents(self):
+        return self._agents
+
+    @agents.setter
+    def agents(self, agents):
+        # anything assigned (population update, sort) moves into shared memory
+        buffer = getattr(self, "_agent_buffer", None)
+        if buffer is None:
+            self._agents = agents
+            return
+        n = len(agents)
+        if n > len(buffer):
+            raise ValueError(f"{n} agents do not fit in the shared buffer of {len(buffer)}")
+        if not np.may_share_memory(agents, buffer):
+            buffer[:n] = agents
+        self._agents = buffer[:n]
+
+    def _each_band(self, method, *args):
+        self.pool.starmap(_call, [(method, b, *args) for b in range(len(self.bands) - 1)])
+
+    def update_agents(self):
+        n = len(self.agents)
+        edges = np.linspace(0, n, min(self.chunks, max(n, 1)) + 1).round().astype(int)
+        chunks = list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+        if self._mip is not None:
+            self._each_band("mip_band")
+        counts = self.pool.starmap(_call, [("update_chunk", lo, hi, self.step_count) for lo, hi in chunks])
+
+        # band b of chunk c sits at lo_c + sum(counts_c[:b]) in the dep_* lists
+        tasks = []
+        for b in range(len(self.bands) - 1):
+            slices = []
+            for (lo, _), per_band in zip(chunks, counts):
+                start = lo + int(per_band[:b].sum())
+                if per_band[b]:
+                    slices.append((start, start + int(per_band[b])))
+            tasks.append(("merge_band", b, slices))
+        self.pool.starmap(_call, tasks)
+
+    def evaporate(self):
+        self._each_band("scale_band", self.cfg.EVAPORATION_FACTOR)
+
+    def blur(self, decay=1.0):
+        if self.cfg.BLUR_RADIUS <= 0:
+            if decay != 1.0:
+                self._each_band("scale_band", decay)
+            return
+        self._each_band("blur_band", 1, 1.0)
+        self._each_band("blur_band", 0, decay)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        # keep private copies, the shared buffers go away
+        self._agent_buffer = None
+        self.agents = self._agents.copy()
+        self.trail = self.trail.copy()
+        for shm in self.shm.values():
+            shm.close()
+            shm.unlink()
+        self.shm = {}
+        if self.scratch is not None:
+            shutil.rmtree(self.scratch, ignore_errors=True)
+            self.scratch = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a slime preset headlessly on all CPU cores.")
+    parser.add_argument("--preset", type=int, default=config.CURRENT_PRESET)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, help="default: CPU_WORKERS")
+    parser.add_argument("--out", default="trail.npy", help="where to save the final trail map (.npy)")
+    args = parser.parse_args()
+
+    with ParallelSlimeEngine(config.load_preset(args.preset), seed=args.seed, workers=args.workers) as engine:
+        engine.run(args.steps)
+        np.save(args.out, engine.trail)
+    print(f"Preset {args.preset}: {args.steps} steps on {engine.workers} workers, trail map saved to {args.out}")
@@ -0,0 +1,88 @@
+# population.py
+"""
+Dynamic agent population: emitters that add agents every step, and the
+spawn maths shared by both engines.
+
+Dead agents have species -1. The GPU engine compacts the live agents into a
+second buffer every step and sizes the next agent dispatch from the live
+count (indirect dispatch), the CPU engine just drops them from its array.
+Emitted agents come from a counter-based hash (rng.pcg_hash, mirrored in
+the compute shader), so both engines spawn the same agents for the same step.
+"""
+
+import math
+import numpy as np
+
+import config
+from rng import hash_to_unit, pcg_hash
+from spawn import AGENT_DTYPE, total_agent_count
+
+TWO_PI = np.float32(math.pi * 2)
+
+
+def is_dynamic(cfg=config):
+    return bool(cfg.EMITTERS) or cfg.DEATH_RATE > 0 or cfg.STARVATION_RATE > 0
+
+
+def agent_capacity(cfg=config):
+    """Slots in the agent buffer: MAX_AGENTS, never less than the initial population."""
+    initial = total_agent_count(cfg)
+    return initial if cfg.MAX_AGENTS is None else max(int(cfg.MAX_AGENTS), initial)
+
+
+def emitters(cfg=config):
+    """cfg.EMITTERS with defaults filled in and positions/radius in pixels."""
+    num_species = cfg.NUM_SPECIES if cfg.MULTI_SPECIES else 1
+    size = min(cfg.SIM_WIDTH, cfg.SIM_HEIGHT)
+    out = []
+    for e in cfg.EMITTERS or ():
+        species = int(e.get("species", 0))
+        if not 0 <= species < num_species:
+            raise ValueError(f"Emitter species {species} out of range, this preset has {num_species}")
+        out.append(dict(x=float(e["x"]) * cfg.SIM_WIDTH, y=float(e["y"]) * cfg.SIM_HEIGHT,
+                        radius=float(e.get("radius", 0.0)) * size, rate=float(e["rate"]), species=species))
+    return out
+
+
+def emitter_key(cfg, step, index):
+    """Per (step, emitter) hash key, the shader gets it as the spawnKey uniform."""
+    seed = 0 if cfg.SPAWN_SEED is None else cfg.SPAWN_SEED
+    with np.errstate(over='ignore'):  # wrapped like rng.step_key, any int seed works
+        key = pcg_hash(pcg_hash(np.uint32(seed & 0xFFFFFFFF)) + np.uint32(step & 0xFFFFFFFF))
+        return int(pcg_hash(key + np.uint32(index & 0xFFFFFFFF)))
+
+
+def emit_agents(cfg, emitter, key, count):
+    """`count` new agents, uniform in the emitter's disc with random headings."""
+    h = pcg_hash(np.uint32(key) + np.arange(count, dtype=np.uint32))
+    u = []
+    for _ in range(3):
+        u.append(hash_to_unit(h))
+        h = pcg_hash(h)
+    r = np.float32(emitter["radius"]) * np.sqrt(u[0])
+    theta = u[1] * TWO_PI
+
+    agents = np.empty(count, dtype=AGENT_DTYPE)
+    agents['x'] = np.clip(np.float32(emitter["x"]) + r * np.cos(theta), 0, cfg.SIM_WIDTH - 1)
+    agents['y'] = np.clip(np.float32(emitter["y"]) + r * np.sin(theta), 0, cfg.SIM_HEIGHT - 1)
+    agents['angle'] = u[2] * TWO_PI
+    agents['seed'] = h  # random stream id (see rng.py)
+    agents['species'] = emitter["species"]
+    return agents
+
+
+class EmitterSchedule:
+    """How many agents each emitter adds per step, carrying fractional rates over."""
+
+    def __init__(self, cfg=config):
+        self.emitters = emitters(cfg)
+        self.carry = [0.0] * len(self.emitters)
+
+    def counts(self):
+        out = []
+        for i, e in enumerate(self.emitters):
+            self.carry[i] += e["rate"]
+            n = int(self.carry[i])
+            self.carry[i] -= n
+            out.append(n)
+        return out
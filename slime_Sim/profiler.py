@@ -0,0 +1,144 @@
+# profiler.py
+"""
+Per-pass frame profiling: rolling percentiles of how long each pass takes
+(agent update, evaporation, blur, render, ...), a periodic one-line summary,
+and CSV/JSON dumps.
+
+PassProfiler is measurement-agnostic; CpuPassProfiler times sections with
+perf_counter (CPU engine), slime_sim.GpuPassProfiler uses GL timer queries.
+"""
+
+import abc
+import collections
+import contextlib
+import csv
+import json
+import time
+import numpy as np
+
+
+class PassStats:
+    """Rolling window of one pass's timings in milliseconds."""
+
+    def __init__(self, window):
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+
+    def add(self, ms):
+        self.samples.append(ms)
+        self.count += 1
+
+    def summary(self):
+        arr = np.fromiter(self.samples, dtype=np.float64)
+        if arr.size == 0:
+            return dict(count=self.count, mean_ms=0.0, p50_ms=0.0, p90_ms=0.0, p99_ms=0.0, max_ms=0.0)
+        p50, p90, p99 = np.percentile(arr, [50, 90, 99])
+        return dict(count=self.count, mean_ms=float(arr.mean()), p50_ms=float(p50),
+                    p90_ms=float(p90), p99_ms=float(p99), max_ms=float(arr.max()))
+
+
+class PassProfiler(abc.ABC):
+    """
+    Collects per-pass timings frame by frame.
+
+    Wrap each pass in `with profiler.section("blur"):` and call end_frame()
+    once per presented frame. Stats are per section call, so a pass that runs
+    several times per frame (substeps) gets one sample per run. Abstract:
+    subclasses implement _begin/_end and may deliver timings late (GPU
+    queries) through record(); a frame's "total" is added once every section
+    of that frame has been recorded.
+    """
+
+    def __init__(self, window=300, print_interval=0.0):
+        self.window = window
+        self.print_interval = print_interval
+        self.stats = {}  # pass name -> PassStats, in first-seen order
+        self.frame = 0
+        self._open = collections.Counter()       # frame -> sections not recorded yet
+        self._totals = collections.defaultdict(float)
+        self._last_print = time.perf_counter()
+
+    @contextlib.contextmanager
+    def section(self, name):
+        self._open[self.frame] += 1
+        token = self._begin(name)
+        try:
+            yield
+        finally:
+            self._end(name, token)
+
+    def record(self, name, ms, frame):
+        if name not in self.stats:
+            self.stats[name] = PassStats(self.window)
+        self.stats[name].add(ms)
+        self._totals[frame] += ms
+        self._open[frame] -= 1
+        if self._open[frame] == 0 and frame < self.frame:
+            self._finish_frame(frame)
+
+    def _finish_frame(self, frame):
+        del self._open[frame]
+        if "total" not in self.stats:
+            self.stats["total"] = PassStats(self.window)
+        self.stats["total"].add(self._totals.pop(frame))
+
+    def end_frame(self):
+        """
+        Close the current frame. Returns a one-line p50 summary every
+        `print_interval` seconds (None otherwise), for printing or a title bar.
+        """
+        self._poll()
+        closed = self.frame
+        self.frame += 1
+        if self._open.get(closed) == 0:
+            self._finish_frame(closed)
+
+        if self.print_interval > 0:
+            now = time.perf_counter()
+            if now - self._last_print >= self.print_interval:
+                self._last_print = now
+                return self.summary_line()
+        return None
+
+    def summary_line(self):
+        parts = [f"{name} {stats.summary()['p50_ms']:.2f}" for name, stats in self.stats.items()]
+        return "p50 ms: " + " | ".join(parts)
+
+    def summary(self):
+        return {name: stats.summary() for name, stats in self.stats.items()}
+
+    def dump(self, path):
+        """Write the rolling summary to `path`, CSV or JSON depending on the extension."""
+        rows = self.summary()
+        if path.lower().endswith(".json"):
+            with open(path, "w") as f:
+                json.dump(rows, f, indent=2)
+        else:
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                fields = ["count", "mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms"]
+                writer.writerow(["pass"] + fields)
+                for name, row in rows.items():
+                    writer.writerow([name] + [row[k] for k in fields])
+
+    # measurement hooks
+    @abc.abstractmethod
+    def _begin(self, name):
+        """Start timing section `name`; returns the token handed to _end()."""
+
+    @abc.abstractmethod
+    def _end(self, name, token):
+        """Stop timing the section started with `token`, record() now or from _poll()."""
+
+    def _poll(self):
+        """Deliver late timings through record(); immediate profilers have nothing to do."""
+
+
+class CpuPassProfiler(PassProfiler):
+    """Wall-clock timing of each section, for the CPU engines."""
+
+    def _begin(self, name):
+        return time.perf_counter()
+
+    def _end(self, name, token):
+        self.record(name, (time.perf_counter() - token) * 1000.0, self.frame)
@@ -0,0 +1,47 @@
+# rng.py
+"""
+Counter-based random numbers, the same in the compute shader and in NumPy.
+
+No random state is carried from step to step. Every draw is a hash of the
+agent's stream id (Agent.seed, a uint32 set at spawn), the step number and
+the preset's RNG_SEED:
+    key   = step_key(cfg, step)   pcg(pcg(RNG_SEED) + step), a uniform in the shader
+    h0    = pcg(seed ^ key)       -> heading wiggle
+    h1    = pcg(h0)               -> death roll
+Every engine gives the same numbers for the same agent and step, whatever
+order the agents are stored in, and no two agents share a sequence.
+"""
+
+import numpy as np
+
+import config
+
+
+def pcg_hash(v):
+    """PCG output permutation of uint32 `v` (array or scalar), same as pcgHash() in the shader."""
+    v = np.asarray(v, dtype=np.uint32)
+    with np.errstate(over='ignore'):
+        state = v * np.uint32(747796405) + np.uint32(2891336453)
+        word = ((state >> ((state >> np.uint32(28)) + np.uint32(4))) ^ state) * np.uint32(277803737)
+    return (word >> np.uint32(22)) ^ word
+
+
+def hash_to_unit(h):
+    """uint32 hash -> float32 in [0, 1), top 24 bits."""
+    return (h >> np.uint32(8)).astype(np.float32) * np.float32(1.0 / 16777216.0)
+
+
+def step_key(cfg=config, step=0):
+    """Key of all draws in `step`, the shader gets it as the stepKey uniform."""
+    with np.errstate(over='ignore'):
+        return int(pcg_hash(pcg_hash(np.uint32(cfg.RNG_SEED & 0xFFFFFFFF)) + np.uint32(step & 0xFFFFFFFF)))
+
+
+def agent_draws(seed, key, count):
+    """`count` float32 arrays in [0, 1): the successive draws of agents with stream ids `seed`."""
+    h = pcg_hash(seed ^ np.uint32(key))
+    draws = [hash_to_unit(h)]
+    for _ in range(count - 1):
+        h = pcg_hash(h)
+        draws.append(hash_to_unit(h))
+    return draws
@@ -5,16 +5,30 @@ Fixed so that 1 agent doesn't look huge, by lowering deposit & scaling it by age
 """
 
 import sys
-import math
-import random
+import time
+import ctypes
+import collections
+import contextlib
+import os
+import warnings
 import numpy as np
 
 import glfw
 from OpenGL.GL import *
 from OpenGL.GL.shaders import compileProgram, compileShader
-from PIL import Image
 
 import config
+from attractors import AttractorField, has_attractor_map, uses_attractor
+from capture import FrameWriter, colorize, species_palette
+from checkpoint import check_shape, load_checkpoint, read_meta, save_checkpoint
+from cpu_engine import (TRAIL_FORMATS, CpuSlimeEngine, heading_table, interaction_matrix, mip_size, sensor_settings,
+                        species_table, trail_format, trail_layers)
+from hot_reload import ConfigWatcher, changed_settings, reallocations
+from obstacles import obstacle_mask, obstacle_response, uses_obstacle_field, world_field
+from population import EmitterSchedule, agent_capacity, emitter_key, is_dynamic
+from profiler import CpuPassProfiler, PassProfiler
+from rng import step_key
+from spawn import AGENT_DTYPE, spawn_agents, total_agent_count
 
 COMPUTE_SHADER_SOURCE = r"""
 #version 430
@@ -25,7 +39,7 @@ struct Agent {
     float x;
     float y;
     float angle;
-    float seed;
+    uint  seed;     // random stream id, see rng.py
     int   species;
 };
 
@@ -33,73 +47,213 @@ layout(std430, binding=0) buffer AgentsSSBO {
     Agent agents[];
 };
 
-layout(rgba32f, binding=0) uniform image2D trailMap;
-layout(r8, binding=1)   uniform readonly image2D obstaclesTex;
+// Fixed-point deposit accumulator (DEPOSIT_MODE "ATOMIC"), trailLayers uints per pixel
+layout(std430, binding=1) buffer DepositSSBO {
+    uint deposits[];
+};
+
+// Population counters: liveCount bounds the agent pass, nextCount is the append
+// cursor of compaction/spawning, groups[] are the glDispatchComputeIndirect
+// arguments sized from liveCount (byte offset 8).
+layout(std430, binding=2) buffer PopulationSSBO {
+    uint liveCount;
+    uint nextCount;
+    uint groups[3];
+};
+
+// Compaction/spawn destination, swapped with AgentsSSBO by Python afterwards
+layout(std430, binding=3) buffer AgentsOutSSBO {
+    Agent agentsOut[];
+};
+
+// SPECIES_INTERACTION, trailLayers x trailLayers, row = sensing species
+layout(std430, binding=5) readonly buffer InteractionSSBO {
+    float interaction[];
+};
+
+// Trail map: one single-channel layer per species
+layout(TRAIL_FORMAT, binding=0) uniform image2DArray trailMap;
+// obstacles.py layers: bit l set => obstacle layer l blocks this texel
+layout(r8ui, binding=1) uniform readonly uimage2D obstaclesTex;
+// obstacles.py field: signed distance to the nearest wall, unit normal away from it
+layout(rgba32f, binding=4) uniform readonly image2D obstacleField;
+// attractors.py map: food sources, 1 = strongest pull
+layout(r8, binding=5) uniform readonly image2D attractorTex;
+// Blur ping-pong: each 1D pass reads one trail texture and writes the other
+layout(TRAIL_FORMAT, binding=2) uniform readonly  image2DArray blurSrc;
+layout(TRAIL_FORMAT, binding=3) uniform writeonly image2DArray blurDst;
+// The trail map again, through a sampler: filtered and mip-level sensing
+layout(binding=1) uniform sampler2DArray trailSampler;
 
 uniform int   passType;
 uniform float simWidth;
 uniform float simHeight;
 uniform bool  useObstacles;
+uniform bool  obstacleReflect; // false => turn around on contact
+uniform float obstacleAvoid;   // steer away from walls nearer than this, 0 => off
+uniform bool  useAttractor;
 uniform float evaporationFactor;
 uniform int   blurRadius;
+uniform int   trailLayers; // = number of species, the image format itself is filled in by Python
+uniform bool  useInteraction; // false => every species senses only its own layer
+uniform ivec2 blurDir; // (1,0) => horizontal pass, (0,1) => vertical pass
+uniform float blurDecay; // evaporationFactor on the last pass when evap is fused into the blur, else 1
 
 // For deposit scaling
 uniform float depositScaleFactor; // e.g., if totalAgents=300k, we might do 300k / actual => etc.
-
-// species arrays
-const int MAX_SPECIES=4;
+uniform bool  atomicDeposit;      // accumulate into DepositSSBO instead of imageLoad/imageStore
+uniform float depositFixedScale;  // deposit amount -> fixed-point integer units
+
+// species table (cpu_engine.species_table), any length, indexed by Agent.species
+struct Species {
+    float speed;
+    float turnSpeed;
+    float sensorAngle;    // radians
+    float sensorDistance;
+    float depositAmount;
+    uint  obstacleLayers; // bitmask of the obstacle layers that block this species
+    float attractorWeight; // times the attractor map, added to what the sensors read
+};
+layout(std430, binding=4) readonly buffer SpeciesSSBO {
+    Species species[];
+};
 uniform int   numSpecies;
-uniform float speeds[MAX_SPECIES];
-uniform float turnSpeeds[MAX_SPECIES];
-uniform float sensorAngles[MAX_SPECIES];
-uniform float sensorDistances[MAX_SPECIES];
-uniform float depositAmounts[MAX_SPECIES];
 
-uniform float randomTurnFactor;
+// HEADING_STEPS > 0: sensor/move offsets per (species, heading bin), 4 per bin:
+// left, forward, right sensor and one move step (cpu_engine.heading_table)
+layout(std430, binding=7) readonly buffer HeadingSSBO {
+    vec2 headingOffsets[];
+};
+uniform int   headingSteps;  // 0 => exact cos/sin
+uniform float headingScale;  // headingSteps / 2pi
+uniform bool  sensorSampled; // false => imageLoad at the truncated position (NEAREST, mip 0)
+uniform int   sensorSize;    // sensorSize x sensorSize reads per sensor, averaged
+uniform int   sensorMip;     // mip level the sampler reads
 
-float rand(inout float seed) {
-    seed = fract(seed*123.4567 + 0.98765);
-    return seed;
+uniform float randomTurnFactor;
+uniform uint  stepKey;      // rng.step_key(step), keys every random draw of this step
+
+// dynamic population (see population.py)
+uniform float deathRate;
+uniform float starvationThreshold;
+uniform float starvationRate;
+uniform int   agentCapacity;
+uniform uint  spawnKey;     // population.emitter_key(step, emitter)
+uniform int   spawnCount;
+uniform vec2  spawnCenter;  // pixels
+uniform float spawnRadius;  // pixels
+uniform int   spawnSpecies;
+
+shared uint groupAlive;
+shared uint groupBase;
+
+// same as rng.pcg_hash / hash_to_unit
+uint pcgHash(uint v) {
+    uint state=v*747796405u+2891336453u;
+    uint word=((state>>((state>>28u)+4u))^state)*277803737u;
+    return (word>>22u)^word;
+}
+float hashToUnit(uint h) {
+    return float(h>>8u)*(1.0/16777216.0);
 }
 
-bool isBlocked(float x, float y) {
+// off the map, or on one of the obstacle layers in the `layers` bitmask
+bool isBlocked(float x, float y, uint layers) {
     if(x<0.0||x>=simWidth||y<0.0||y>=simHeight) {
         return true;
     }
     ivec2 coord=ivec2(int(x),int(y));
-    vec4 opix=imageLoad(obstaclesTex, coord);
-    return (opix.r<0.1);
+    return (imageLoad(obstaclesTex, coord).r & layers)!=0u;
+}
+
+// obstacle field texel at (x, y), clamped to the map
+vec4 fieldAt(float x, float y) {
+    ivec2 coord=clamp(ivec2(int(x),int(y)), ivec2(0), imageSize(obstacleField)-1);
+    return imageLoad(obstacleField, coord);
+}
+
+// heading mirrored off the wall at (x, y), straight back when the normal doesn't face it
+float reflectAngle(float angle, float x, float y) {
+    vec2 n=fieldAt(x,y).gb;
+    vec2 dir=vec2(cos(angle),sin(angle));
+    float d=dot(dir,n);
+    if(d>=0.0) return angle+3.14159;
+    vec2 r=dir-2.0*d*n;
+    return atan(r.y,r.x);
+}
+
+// same as cpu_engine.heading_index; GLSL % is undefined for negative operands,
+// so the bin wraps in float (k is a whole number, exact below 2^24)
+int headingIndex(float angle) {
+    float k=floor(angle*headingScale);
+    return clamp(int(mod(k,float(headingSteps))),0,headingSteps-1);
 }
 
-float readChannel(vec4 pix, int s) {
-    if(s==0) return pix.r;
-    if(s==1) return pix.g;
-    if(s==2) return pix.b;
-    if(s==3) return pix.a;
-    return 0.0;
+// one read of what species s senses at pixel position p: its layer or the interaction sum
+float senseAt(vec2 p,int s) {
+    if(sensorSampled) {
+        // the sampler's zero border covers reads past the edge
+        vec3 uv=vec3(p/vec2(simWidth,simHeight),0.0);
+        if(!useInteraction) {
+            uv.z=float(s);
+            return textureLod(trailSampler,uv,float(sensorMip)).r;
+        }
+        float v=0.0;
+        for(int j=0; j<trailLayers; j++){
+            float w=interaction[s*trailLayers+j];
+            uv.z=float(j);
+            if(w!=0.0) v+=w*textureLod(trailSampler,uv,float(sensorMip)).r;
+        }
+        return v;
+    }
+    if(p.x<0.0||p.x>=simWidth||p.y<0.0||p.y>=simHeight) {
+        return 0.0;
+    }
+    ivec2 coord=ivec2(int(p.x),int(p.y));
+    if(!useInteraction) {
+        return imageLoad(trailMap,ivec3(coord,s)).r;
+    }
+    // attraction/repulsion: weighted sum over the layers this species reacts to
+    float v=0.0;
+    for(int j=0; j<trailLayers; j++){
+        float w=interaction[s*trailLayers+j];
+        if(w!=0.0) v+=w*imageLoad(trailMap,ivec3(coord,j)).r;
+    }
+    return v;
 }
-vec4 writeChannel(vec4 pix,int s,float amt){
-    if(s==0) pix.r += amt;
-    else if(s==1) pix.g += amt;
-    else if(s==2) pix.b += amt;
-    else if(s==3) pix.a += amt;
-    return pix;
+
+float trailKernel(float x,float y,int s) {
+    if(sensorSize<=1) {
+        return senseAt(vec2(x,y),s);
+    }
+    // kernel reads one texel of the sensed mip level apart, averaged
+    vec2 texel=vec2(simWidth,simHeight)/vec2(textureSize(trailSampler,sensorMip).xy);
+    float mid=0.5*float(sensorSize-1);
+    float v=0.0;
+    for(int j=0; j<sensorSize; j++){
+        for(int i=0; i<sensorSize; i++){
+            v+=senseAt(vec2(x,y)+(vec2(i,j)-mid)*texel,s);
+        }
+    }
+    return v/float(sensorSize*sensorSize);
 }
 
 float sampleTrail(float x,float y,int s) {
     if(x<0.0||x>=simWidth||y<0.0||y>=simHeight) {
         return 0.0;
     }
-    ivec2 coord=ivec2(int(x),int(y));
-    vec4 p=imageLoad(trailMap,coord);
-    return readChannel(p, s);
+    float v=trailKernel(x,y,s);
+    if(useAttractor) {
+        v+=species[s].attractorWeight*imageLoad(attractorTex, ivec2(int(x),int(y))).r;
+    }
+    return v;
 }
 
 void main(){
     if(passType==0) {
         // Update Agents
         uint idx=gl_GlobalInvocationID.x;
-        if(idx>=gl_NumWorkGroups.x*gl_WorkGroupSize.x) {
+        if(idx>=liveCount) {
             return;
         }
         Agent a=agents[idx];
@@ -107,26 +261,38 @@ void main(){
         int sI=a.species;
         if(sI<0||sI>=numSpecies) return;
 
-        float spd        = speeds[sI];
-        float tSpd       = turnSpeeds[sI];
-        float sAng       = sensorAngles[sI];
-        float sDist      = sensorDistances[sI];
-        float dep        = depositAmounts[sI];
+        Species sp      = species[sI];
+        float spd        = sp.speed;
+        float tSpd       = sp.turnSpeed;
+        float sAng       = sp.sensorAngle;
+        float sDist      = sp.sensorDistance;
+        float dep        = sp.depositAmount;
 
         // Scale deposit to avoid big single-agent blobs
         dep *= depositScaleFactor;  
 
         // sense
-        float leftA = a.angle - sAng;
-        float rightA= a.angle + sAng;
-        float fwdA  = a.angle;
-
-        float lx=a.x+cos(leftA)*sDist;
-        float ly=a.y+sin(leftA)*sDist;
-        float rx=a.x+cos(rightA)*sDist;
-        float ry=a.y+sin(rightA)*sDist;
-        float fx=a.x+cos(fwdA)*sDist;
-        float fy=a.y+sin(fwdA)*sDist;
+        float lx,ly,rx,ry,fx,fy;
+        if(headingSteps>0) {
+            int bin=(sI*headingSteps+headingIndex(a.angle))*4;
+            vec2 lo=headingOffsets[bin];
+            vec2 fo=headingOffsets[bin+1];
+            vec2 ro=headingOffsets[bin+2];
+            lx=a.x+lo.x; ly=a.y+lo.y;
+            fx=a.x+fo.x; fy=a.y+fo.y;
+            rx=a.x+ro.x; ry=a.y+ro.y;
+        } else {
+            float leftA = a.angle - sAng;
+            float rightA= a.angle + sAng;
+            float fwdA  = a.angle;
+
+            lx=a.x+cos(leftA)*sDist;
+            ly=a.y+sin(leftA)*sDist;
+            rx=a.x+cos(rightA)*sDist;
+            ry=a.y+sin(rightA)*sDist;
+            fx=a.x+cos(fwdA)*sDist;
+            fy=a.y+sin(fwdA)*sDist;
+        }
 
         float lv=sampleTrail(lx,ly,sI);
         float rv=sampleTrail(rx,ry,sI);
@@ -140,19 +306,45 @@ void main(){
             a.angle += tSpd;
         }
 
-        // random wiggle
-        float r=rand(a.seed);
-        a.angle += (r-0.5)*randomTurnFactor;
+        // random wiggle, rng.agent_draws
+        uint h=pcgHash(a.seed^stepKey);
+        a.angle += (hashToUnit(h)-0.5)*randomTurnFactor;
+
+        // death, a second draw only when the population is dynamic
+        if(deathRate>0.0 || starvationRate>0.0) {
+            bool starving=max(max(lv,rv),fv)<starvationThreshold;
+            if(hashToUnit(pcgHash(h)) < (starving ? starvationRate : deathRate)) {
+                a.species=-1;
+                agents[idx]=a;
+                return;
+            }
+        }
+
+        // steer away from walls nearer than obstacleAvoid, harder the nearer
+        if(useObstacles && obstacleAvoid>0.0) {
+            vec4 f=fieldAt(a.x,a.y);
+            vec2 dir=vec2(cos(a.angle),sin(a.angle));
+            if(f.r<obstacleAvoid && dot(dir,f.gb)<0.0) {
+                float side=sign(dir.x*f.b-dir.y*f.g);
+                a.angle += side*tSpd*clamp(1.0-f.r/obstacleAvoid,0.0,1.0);
+            }
+        }
 
         // move
-        float dx=cos(a.angle)*spd;
-        float dy=sin(a.angle)*spd;
+        float dx,dy;
+        if(headingSteps>0) {
+            vec2 mo=headingOffsets[(sI*headingSteps+headingIndex(a.angle))*4+3];
+            dx=mo.x; dy=mo.y;
+        } else {
+            dx=cos(a.angle)*spd;
+            dy=sin(a.angle)*spd;
+        }
         float nx=a.x+dx;
         float ny=a.y+dy;
 
         if(useObstacles) {
-            if(isBlocked(nx,ny)) {
-                a.angle += 3.14159;
+            if(isBlocked(nx,ny,sp.obstacleLayers)) {
+                a.angle = obstacleReflect ? reflectAngle(a.angle,nx,ny) : a.angle+3.14159;
             } else {
                 a.x=nx; a.y=ny;
             }
@@ -169,47 +361,119 @@ void main(){
 
         // deposit
         ivec2 coord=ivec2(int(a.x),int(a.y));
-        vec4 oldPix=imageLoad(trailMap,coord);
-        vec4 newPix=writeChannel(oldPix,sI,dep);
-        imageStore(trailMap,coord,newPix);
+        if(atomicDeposit) {
+            // integer adds never get lost, resolved into trailMap by pass 3
+            uint cell=(uint(coord.y)*uint(simWidth)+uint(coord.x))*uint(trailLayers)+uint(sI);
+            atomicAdd(deposits[cell], uint(dep*depositFixedScale+0.5));
+        } else {
+            // racy read-modify-write: concurrent deposits to one pixel can be lost
+            ivec3 cell=ivec3(coord,sI);
+            imageStore(trailMap,cell,imageLoad(trailMap,cell)+vec4(dep));
+        }
 
         agents[idx]=a;
     }
     else if(passType==1) {
-        // Evap
+        // Evap, gl_GlobalInvocationID.y = layer
         uint globalID=gl_GlobalInvocationID.x;
         uint total=uint(simWidth*simHeight);
         if(globalID>=total) return;
         uint y=globalID/uint(simWidth);
         uint x=globalID%uint(simWidth);
 
-        vec4 p=imageLoad(trailMap, ivec2(x,y));
-        p*=evaporationFactor;
-        imageStore(trailMap, ivec2(x,y), p);
+        ivec3 cell=ivec3(x,y,gl_GlobalInvocationID.y);
+        imageStore(trailMap, cell, imageLoad(trailMap, cell)*evaporationFactor);
     }
     else if(passType==2) {
-        // Blur
+        // Separable blur: one 1D box pass along blurDir, blurSrc -> blurDst.
+        // Running it horizontally then vertically gives the (2r+1)^2 box mean
+        // in O(r) per pixel, and never reads a texel written in the same pass.
+        // Blur is linear, so scaling by blurDecay here equals evaporating first.
+        // gl_GlobalInvocationID.y = layer.
         uint globalID=gl_GlobalInvocationID.x;
         uint total=uint(simWidth*simHeight);
         if(globalID>=total) return;
         uint y=globalID/uint(simWidth);
         uint x=globalID%uint(simWidth);
 
-        int rad=blurRadius;
-        vec4 sum=vec4(0.0);
+        ivec2 size=ivec2(int(simWidth),int(simHeight));
+        ivec2 coord=ivec2(x,y);
+        int layer=int(gl_GlobalInvocationID.y);
+        float sum=0.0;
         float count=0.0;
-        for(int dy=-rad; dy<=rad; dy++){
-            for(int dx=-rad; dx<=rad; dx++){
-                int nx=int(x)+dx;
-                int ny=int(y)+dy;
-                if(nx>=0 && nx<int(simWidth) && ny>=0 && ny<int(simHeight)){
-                    sum += imageLoad(trailMap, ivec2(nx,ny));
-                    count+=1.0;
-                }
+        for(int i=-blurRadius; i<=blurRadius; i++){
+            ivec2 p=coord+blurDir*i;
+            if(all(greaterThanEqual(p,ivec2(0))) && all(lessThan(p,size))){
+                sum += imageLoad(blurSrc, ivec3(p,layer)).r;
+                count+=1.0;
+            }
+        }
+        imageStore(blurDst, ivec3(coord,layer), vec4(sum*(blurDecay/count)));
+    }
+    else if(passType==3) {
+        // Resolve atomic deposits into the trail map and clear the accumulator
+        uint globalID=gl_GlobalInvocationID.x;
+        uint total=uint(simWidth*simHeight);
+        if(globalID>=total) return;
+        uint base=globalID*uint(trailLayers);
+        ivec2 coord=ivec2(globalID%uint(simWidth), globalID/uint(simWidth));
+        for(int c=0; c<trailLayers; c++){
+            uint d=deposits[base+uint(c)];
+            if(d!=0u){
+                deposits[base+uint(c)]=0u;
+                ivec3 cell=ivec3(coord,c);
+                imageStore(trailMap, cell, imageLoad(trailMap, cell)+vec4(float(d)/depositFixedScale));
             }
         }
-        vec4 outPix=sum/count;
-        imageStore(trailMap, ivec2(x,y), outPix);
+    }
+    else if(passType==4) {
+        // Stream compaction: live agents -> agentsOut, one global atomic per workgroup
+        uint idx=gl_GlobalInvocationID.x;
+        Agent a;
+        bool alive=false;
+        if(idx<liveCount) {
+            a=agents[idx];
+            alive=a.species>=0;
+        }
+        if(gl_LocalInvocationIndex==0u) groupAlive=0u;
+        barrier();
+        uint localSlot=0u;
+        if(alive) localSlot=atomicAdd(groupAlive,1u);
+        barrier();
+        if(gl_LocalInvocationIndex==0u) groupBase=atomicAdd(nextCount,groupAlive);
+        barrier();
+        if(alive) agentsOut[groupBase+localSlot]=a;
+    }
+    else if(passType==5) {
+        // Spawn spawnCount agents from one emitter, appended after the compacted ones
+        uint i=gl_GlobalInvocationID.x;
+        if(i>=uint(spawnCount)) return;
+        uint slot=atomicAdd(nextCount,1u);
+        if(slot>=uint(agentCapacity)) return;
+
+        uint h=pcgHash(spawnKey+i);
+        float u0=hashToUnit(h); h=pcgHash(h);
+        float u1=hashToUnit(h); h=pcgHash(h);
+        float u2=hashToUnit(h); h=pcgHash(h);
+        float r=spawnRadius*sqrt(u0);
+        float theta=u1*6.2831853;
+
+        Agent a;
+        a.x=clamp(spawnCenter.x+r*cos(theta), 0.0, simWidth-1.0);
+        a.y=clamp(spawnCenter.y+r*sin(theta), 0.0, simHeight-1.0);
+        a.angle=u2*6.2831853;
+        a.seed=h;
+        a.species=spawnSpecies;
+        agentsOut[slot]=a;
+    }
+    else if(passType==6) {
+        // New live count and indirect dispatch size for the next agent pass
+        if(gl_GlobalInvocationID.x!=0u) return;
+        liveCount=min(nextCount,uint(agentCapacity));
+        nextCount=0u;
+        groups[0]=(liveCount+255u)/256u;
+        groups[1]=1u;
+        groups[2]=1u;
     }
 }
 """;
@@ -229,24 +493,36 @@ FRAGMENT_SHADER_SOURCE = r"""
 in vec2 texCoord;
 out vec4 fragColor;
 
-uniform sampler2D slimeTexture;
+uniform sampler2DArray slimeTexture;
 uniform float colorMultiplier;
 uniform int   colorMode; // 0 => SUM, 1 => RGB, 2 => CUSTOM
 uniform vec4  backgroundColor;
+uniform int   trailLayers;
+
+// capture.species_palette, one color per trail layer
+layout(std430, binding=6) readonly buffer PaletteSSBO {
+    vec4 palette[];
+};
 
 void main(){
-    vec4 pix=texture(slimeTexture, texCoord);
+    float total=0.0;
+    vec3 color=vec3(0.0);
+    for(int i=0; i<trailLayers; i++){
+        float v=texture(slimeTexture, vec3(texCoord, float(i))).r;
+        total+=v;
+        color+=palette[i].rgb*v;
+    }
 
     if(colorMode==0){
-        float val=(pix.r+pix.g+pix.b+pix.a)*0.25*colorMultiplier;
+        float val=total*0.25*colorMultiplier;
         if(val>1.0) val=1.0;
         fragColor=mix(backgroundColor, vec4(1,1,1,1), val);
     } else if(colorMode==1){
-        vec3 c=(pix.rgb)*colorMultiplier;
+        vec3 c=color*colorMultiplier;
         c=clamp(c,0.0,1.0);
         fragColor=vec4(c,1.0);
     } else {
-        float val=(pix.r+pix.g+pix.b+pix.a)*0.25*colorMultiplier;
+        float val=total*0.25*colorMultiplier;
         if(val>1.0) val=1.0;
         // e.g. custom bluish
         fragColor=vec4(0.0, val, val*0.5,1.0);
@@ -254,6 +530,13 @@ void main(){
 }
 """;
 
+
+# trail format name (see cpu_engine.TRAIL_FORMATS) -> internal format of each layer, GLSL image format
+GL_TRAIL_FORMATS = {
+    "R32F": (GL_R32F, "r32f"),
+    "R16F": (GL_R16F, "r16f"),
+}
+
 def create_fullscreen_quad_vao():
     import numpy as np
     verts = np.array([
@@ -273,7 +556,8 @@ def create_fullscreen_quad_vao():
     glBindVertexArray(0)
     return vao
 
-def main():
+def create_window(width, height, visible=True):
+    """GLFW window with a current OpenGL 4.3 core context (hidden when visible=False)."""
     if not glfw.init():
         print("GLFW init failed")
         sys.exit(1)
@@ -281,238 +565,921 @@ def main():
     glfw.window_hint(glfw.CONTEXT_VERSION_MINOR,3)
     glfw.window_hint(glfw.OPENGL_PROFILE, glfw.OPENGL_CORE_PROFILE)
     glfw.window_hint(glfw.RESIZABLE,False)
+    glfw.window_hint(glfw.VISIBLE, glfw.TRUE if visible else glfw.FALSE)
 
-    window=glfw.create_window(config.WINDOW_WIDTH, config.WINDOW_HEIGHT,"Slime GPU Python",None,None)
+    window=glfw.create_window(width, height,"Slime GPU Python",None,None)
     if not window:
         print("create window fail")
         glfw.terminate()
         sys.exit(1)
 
     glfw.make_context_current(window)
+    return window
+
+class GpuSlimeSim:
+    """
+    GL programs, textures and agent buffer of one simulation, plus its passes.
+    Needs a current GL 4.3 context (see create_window). `cfg` is the config
+    module or anything with the same attribute names, e.g. config.load_preset(n).
+
+    The GL objects are grouped by the settings they depend on (programs, trail,
+    obstacles, attractor, agents) so reconfigure() can rebuild only what a changed
+    setting needs; everything else is plain uniforms (apply_uniforms()).
+    """
+
+    def __init__(self, cfg=config, agents=None):
+        self.cfg=cfg
+        self.profiler=None  # optional GpuPassProfiler
+        self.stepCount=0
+
+        self._create_programs()
+        self._create_trail()
+        self._create_obstacles()
+        self._create_attractor()
+        self._create_agents(agents)
+        self.speciesBuf=glGenBuffers(1)
+        self.interactionBuf=glGenBuffers(1)
+        self.paletteBuf=glGenBuffers(1)
+        self.headingBuf=glGenBuffers(1)
+        self.sensorSampler=glGenSamplers(1)
+        self.quadVAO=create_fullscreen_quad_vao()
+        self.apply_uniforms()
+
+    def _create_programs(self):
+        # trail storage picked from the preset: 32 or 16 bit float layers
+        self.trailFormat=trail_format(self.cfg)
+        self.glFormat, glslFormat=GL_TRAIL_FORMATS[self.trailFormat]
+
+        computeShader=compileShader(COMPUTE_SHADER_SOURCE.replace("TRAIL_FORMAT", glslFormat), GL_COMPUTE_SHADER)
+        self.computeProg = compileProgram(computeShader)
+
+        vs=compileShader(VERTEX_SHADER_SOURCE, GL_VERTEX_SHADER)
+        fs=compileShader(FRAGMENT_SHADER_SOURCE, GL_FRAGMENT_SHADER)
+        self.renderProg=compileProgram(vs, fs)
+
+        # compute uniforms
+        computeProg=self.computeProg
+        self.cPassType=glGetUniformLocation(computeProg,"passType")
+        self.cW=glGetUniformLocation(computeProg,"simWidth")
+        self.cH=glGetUniformLocation(computeProg,"simHeight")
+        self.cObs=glGetUniformLocation(computeProg,"useObstacles")
+        self.cReflect=glGetUniformLocation(computeProg,"obstacleReflect")
+        self.cAvoid=glGetUniformLocation(computeProg,"obstacleAvoid")
+        self.cAttract=glGetUniformLocation(computeProg,"useAttractor")
+        self.cEvap=glGetUniformLocation(computeProg,"evaporationFactor")
+        self.cBlur=glGetUniformLocation(computeProg,"blurRadius")
+        self.cLayers=glGetUniformLocation(computeProg,"trailLayers")
+        self.cInteract=glGetUniformLocation(computeProg,"useInteraction")
+        self.cBlurDir=glGetUniformLocation(computeProg,"blurDir")
+        self.cBlurDecay=glGetUniformLocation(computeProg,"blurDecay")
+
+        self.cNumSp=glGetUniformLocation(computeProg,"numSpecies")
+        self.cHeadSteps=glGetUniformLocation(computeProg,"headingSteps")
+        self.cHeadScale=glGetUniformLocation(computeProg,"headingScale")
+        self.cSensSampled=glGetUniformLocation(computeProg,"sensorSampled")
+        self.cSensSize=glGetUniformLocation(computeProg,"sensorSize")
+        self.cSensMip=glGetUniformLocation(computeProg,"sensorMip")
+        self.cRnd  =glGetUniformLocation(computeProg,"randomTurnFactor")
+
+        # new param
+        self.cDepScale=glGetUniformLocation(computeProg,"depositScaleFactor")
+        self.cAtomic=glGetUniformLocation(computeProg,"atomicDeposit")
+        self.cFixed=glGetUniformLocation(computeProg,"depositFixedScale")
+
+        self.cDeath=glGetUniformLocation(computeProg,"deathRate")
+        self.cStarveT=glGetUniformLocation(computeProg,"starvationThreshold")
+        self.cStarve=glGetUniformLocation(computeProg,"starvationRate")
+        self.cCap=glGetUniformLocation(computeProg,"agentCapacity")
+        self.cStepKey=glGetUniformLocation(computeProg,"stepKey")
+        self.cSpawnKey=glGetUniformLocation(computeProg,"spawnKey")
+        self.cSpawnCount=glGetUniformLocation(computeProg,"spawnCount")
+        self.cSpawnCenter=glGetUniformLocation(computeProg,"spawnCenter")
+        self.cSpawnRadius=glGetUniformLocation(computeProg,"spawnRadius")
+        self.cSpawnSpecies=glGetUniformLocation(computeProg,"spawnSpecies")
+
+        # render uniforms
+        self.rTex=glGetUniformLocation(self.renderProg,"slimeTexture")
+        self.rMul=glGetUniformLocation(self.renderProg,"colorMultiplier")
+        self.rMod=glGetUniformLocation(self.renderProg,"colorMode")
+        self.rBG =glGetUniformLocation(self.renderProg,"backgroundColor")
+        self.rLayers=glGetUniformLocation(self.renderProg,"trailLayers")
+
+    def _create_trail(self):
+        cfg=self.cfg
+        self.width=int(cfg.SIM_WIDTH)
+        self.height=int(cfg.SIM_HEIGHT)
+        self.layers=trail_layers(cfg)
+
+        # trail map, one texture array layer per species, with the mip chain the sensors read
+        self.sensorMip=sensor_settings(cfg)[2]
+        self.trailTex=self._trail_texture(self.sensorMip)
+
+        # second trail texture, holds the horizontal blur result before the vertical pass
+        self.blurTex=self._trail_texture()
+
+        self.clear_trail()
+
+        # Fixed-point deposit accumulator, only allocated when it is used
+        self.atomicDeposit=(cfg.DEPOSIT_MODE.upper()=="ATOMIC")
+        self.depositBuf=glGenBuffers(1)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.depositBuf)
+        depBytes=self.width*self.height*self.layers*4 if self.atomicDeposit else 4
+        glBufferData(GL_SHADER_STORAGE_BUFFER, depBytes, np.zeros(depBytes//4,dtype=np.uint32), GL_DYNAMIC_COPY)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER,0)
+
+        totalPix = self.width*self.height
+        self.groupCountPixels=(totalPix+255)//256
+
+    def _trail_texture(self, mipLevels=0):
+        tex=glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, tex)
+        for level in range(mipLevels+1):
+            w,h=mip_size(self.width, self.height, level)
+            glTexImage3D(GL_TEXTURE_2D_ARRAY,level,self.glFormat, w, h, self.layers,0,GL_RED,GL_FLOAT,None)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAX_LEVEL, mipLevels)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MIN_FILTER,GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAG_FILTER,GL_NEAREST)
+        glBindTexture(GL_TEXTURE_2D_ARRAY,0)
+        return tex
+
+    def _create_obstacles(self):
+        cfg=self.cfg
+        self.obstaclesTex=glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.obstaclesTex)
+        glPixelStorei(GL_UNPACK_ALIGNMENT,1)
+        if cfg.USE_OBSTACLES:
+            # layer bitmask per texel on the sim grid, unpacked and uploaded a strip at a time
+            mask=obstacle_mask(cfg,(0,0,self.width,self.height))
+            glTexImage2D(GL_TEXTURE_2D,0,GL_R8UI, self.width,self.height,0,GL_RED_INTEGER,GL_UNSIGNED_BYTE,None)
+            strip=max(1,(1<<24)//self.width)
+            for y0 in range(0,self.height,strip):
+                y1=min(y0+strip,self.height)
+                glTexSubImage2D(GL_TEXTURE_2D,0,0,y0,self.width,y1-y0,GL_RED_INTEGER,GL_UNSIGNED_BYTE,mask.rows(y0,y1))
+        else:
+            # never read, isBlocked() only runs with useObstacles
+            glTexImage2D(GL_TEXTURE_2D,0,GL_R8UI,1,1,0,GL_RED_INTEGER,GL_UNSIGNED_BYTE,np.zeros(1,dtype=np.uint8))
+        glPixelStorei(GL_UNPACK_ALIGNMENT,4)
+        glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MIN_FILTER,GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MAG_FILTER,GL_NEAREST)
+
+        # distance + normal field, only when the agents steer or reflect (1 texel otherwise)
+        field=world_field(cfg) if uses_obstacle_field(cfg) else np.zeros((1,1,4),dtype=np.float32)
+        self.obstacleFieldTex=glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.obstacleFieldTex)
+        glTexImage2D(GL_TEXTURE_2D,0,GL_RGBA32F,field.shape[1],field.shape[0],0,GL_RGBA,GL_FLOAT,field)
+        glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MIN_FILTER,GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MAG_FILTER,GL_NEAREST)
+        glBindTexture(GL_TEXTURE_2D,0)
+
+    def _create_attractor(self):
+        # 8 bit attractor map; ATTRACTOR_WEIGHT is only a species table column, so
+        # the texture exists whenever there is a source (1 texel otherwise)
+        cfg=self.cfg
+        self.attractor=AttractorField(cfg) if has_attractor_map(cfg) else None
+        self.attractorTex=glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.attractorTex)
+        glPixelStorei(GL_UNPACK_ALIGNMENT,1)
+        if self.attractor is not None:
+            glTexImage2D(GL_TEXTURE_2D,0,GL_R8,self.width,self.height,0,GL_RED,GL_UNSIGNED_BYTE,self.attractor.values)
+        else:
+            glTexImage2D(GL_TEXTURE_2D,0,GL_R8,1,1,0,GL_RED,GL_UNSIGNED_BYTE,np.zeros(1,dtype=np.uint8))
+        glPixelStorei(GL_UNPACK_ALIGNMENT,4)
+        glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MIN_FILTER,GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MAG_FILTER,GL_NEAREST)
+        glBindTexture(GL_TEXTURE_2D,0)
+
+    def _update_attractor(self):
+        # a time-varying map only re-sends the row bands that changed
+        rects=self.attractor.update(self.stepCount)
+        if not rects:
+            return
+        glBindTexture(GL_TEXTURE_2D, self.attractorTex)
+        glPixelStorei(GL_UNPACK_ALIGNMENT,1)
+        for x0,y0,x1,y1 in rects:
+            block=np.ascontiguousarray(self.attractor.values[y0:y1,x0:x1])
+            glTexSubImage2D(GL_TEXTURE_2D,0,x0,y0,x1-x0,y1-y0,GL_RED,GL_UNSIGNED_BYTE,block)
+        glPixelStorei(GL_UNPACK_ALIGNMENT,4)
+        glBindTexture(GL_TEXTURE_2D,0)
+
+    def _create_agents(self, agents=None):
+        # Agent SSBO, MAX_AGENTS slots; a second one to compact into when the population is dynamic
+        cfg=self.cfg
+        self.totalAgents=total_agent_count(cfg)
+        agentData=spawn_agents(cfg) if agents is None else agents
+        self.dynamic=is_dynamic(cfg)
+        self.capacity=max(agent_capacity(cfg), len(agentData))
+        self.schedule=EmitterSchedule(cfg)
+        agentBytes=max(self.capacity,1)*AGENT_DTYPE.itemsize
+
+        self.ssbo=glGenBuffers(1)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.ssbo)
+        glBufferData(GL_SHADER_STORAGE_BUFFER, agentBytes, None, GL_DYNAMIC_COPY)
+        glBindBufferBase(GL_SHADER_STORAGE_BUFFER,0, self.ssbo)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER,0)
+        self.ssboAlt=glGenBuffers(1)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.ssboAlt)
+        glBufferData(GL_SHADER_STORAGE_BUFFER, agentBytes if self.dynamic else 4, None, GL_DYNAMIC_COPY)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER,0)
+
+        # liveCount, nextCount, indirect dispatch groups
+        self.popBuf=glGenBuffers(1)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.popBuf)
+        glBufferData(GL_SHADER_STORAGE_BUFFER, 5*4, None, GL_DYNAMIC_COPY)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER,0)
+        self.write_agents(agentData)
+
+    def apply_uniforms(self):
+        """Upload every setting that is only a uniform; cheap enough to call on every config change."""
+        cfg=self.cfg
+        if cfg.AGENT_SORT_INTERVAL>0:
+            # a host-side sort would stall on a full agent readback + upload; only the CPU engines sort
+            warnings.warn("AGENT_SORT_INTERVAL is ignored by the GL sim, it only sorts in the CPU engines")
+        glUseProgram(self.computeProg)
+        glUniform1f(self.cW, float(self.width))
+        glUniform1f(self.cH, float(self.height))
+        glUniform1i(self.cObs, GL_TRUE if cfg.USE_OBSTACLES else GL_FALSE)
+        bounce,avoid=obstacle_response(cfg)
+        glUniform1i(self.cReflect, GL_TRUE if bounce=="REFLECT" else GL_FALSE)
+        glUniform1f(self.cAvoid, avoid)
+        glUniform1i(self.cAttract, GL_TRUE if self.attractor is not None and uses_attractor(cfg) else GL_FALSE)
+        glUniform1f(self.cEvap, cfg.EVAPORATION_FACTOR)
+        glUniform1i(self.cBlur, cfg.BLUR_RADIUS)
+        glUniform1i(self.cLayers, self.layers)
+        glUniform1f(self.cRnd, cfg.RANDOM_TURN_FACTOR)
+        glUniform1i(self.cAtomic, GL_TRUE if self.atomicDeposit else GL_FALSE)
+        glUniform1f(self.cFixed, float(cfg.DEPOSIT_FIXED_POINT_SCALE))
+        glUniform1f(self.cDeath, cfg.DEATH_RATE)
+        glUniform1f(self.cStarveT, cfg.STARVATION_THRESHOLD)
+        glUniform1f(self.cStarve, cfg.STARVATION_RATE)
+        glUniform1i(self.cCap, self.capacity)
+
+        # deposit scale factor
+        # If totalAgents=300k but user sets AGENT_DEPOSIT_SCALE=300k,
+        # depScaleFactor = (1.0 * base) => for 300k
+        # If user sets only 1 agent => deposit scale factor => base*(1/1) => too big?
+        # Actually let's do factor = (AGENT_DEPOSIT_SCALE / totalAgents).
+        # So if you have fewer agents, each deposit is smaller.
+        # A dynamic population keeps the per-agent deposit of its starting count.
+        depositScaleVal = (float(cfg.AGENT_DEPOSIT_SCALE)/float(max(self.totalAgents,1)))
+        glUniform1f(self.cDepScale, depositScaleVal)
+
+        # whole species table in one buffer write, however many species there are
+        table=species_table(cfg)
+        glUniform1i(self.cNumSp, len(table))
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.speciesBuf)
+        glBufferData(GL_SHADER_STORAGE_BUFFER, table.nbytes, table, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER,0)
+
+        # attraction/repulsion matrix (a dummy float when unused) and render palette
+        matrix=interaction_matrix(cfg)
+        glUniform1i(self.cInteract, GL_FALSE if matrix is None else GL_TRUE)
+        matrix=np.zeros(1,dtype=np.float32) if matrix is None else matrix
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.interactionBuf)
+        glBufferData(GL_SHADER_STORAGE_BUFFER, matrix.nbytes, matrix, GL_DYNAMIC_DRAW)
+        # quantized-heading offsets (a dummy vec2 when headings are exact)
+        headings=heading_table(cfg)
+        steps=0 if headings is None else headings.shape[1]
+        glUniform1i(self.cHeadSteps, steps)
+        glUniform1f(self.cHeadScale, steps/(2*np.pi))
+        headings=np.zeros(2,dtype=np.float32) if headings is None else headings
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.headingBuf)
+        glBufferData(GL_SHADER_STORAGE_BUFFER, headings.nbytes, headings, GL_DYNAMIC_DRAW)
+        # sensing: imageLoad for plain point reads, else the sampler (filter, zero border, mip level)
+        fltr,size,mip=sensor_settings(cfg)
+        linear=(fltr=="LINEAR")
+        glUniform1i(self.cSensSampled, GL_TRUE if (linear or mip>0) else GL_FALSE)
+        glUniform1i(self.cSensSize, size)
+        glUniform1i(self.cSensMip, mip)
+        glSamplerParameteri(self.sensorSampler, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_NEAREST if linear else GL_NEAREST_MIPMAP_NEAREST)
+        glSamplerParameteri(self.sensorSampler, GL_TEXTURE_MAG_FILTER, GL_LINEAR if linear else GL_NEAREST)
+        for wrap in (GL_TEXTURE_WRAP_S, GL_TEXTURE_WRAP_T):
+            glSamplerParameteri(self.sensorSampler, wrap, GL_CLAMP_TO_BORDER)
+        glSamplerParameterfv(self.sensorSampler, GL_TEXTURE_BORDER_COLOR, np.zeros(4,dtype=np.float32))
+        palette=species_palette(cfg, self.layers)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.paletteBuf)
+        glBufferData(GL_SHADER_STORAGE_BUFFER, palette.nbytes, palette, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER,0)
+        glUseProgram(0)
+
+        glUseProgram(self.renderProg)
+        glUniform1i(self.rLayers, self.layers)
+        glUseProgram(0)
+
+        # Evaporation can ride along with the last blur pass, unless there is no blur
+        self.blurActive=cfg.BLUR_RADIUS>0 and cfg.BLUR_PASSES>0
+        self.fuseDecay=cfg.FUSE_DIFFUSE_DECAY and self.blurActive
+
+    def reconfigure(self, cfg):
+        """
+        Switch to `cfg` without touching the GL context: settings that are
+        only uniforms apply immediately, the rest rebuild just the objects
+        that depend on them (see hot_reload.reallocations). Returns the set
+        of rebuilt groups.
+        """
+        rebuild=reallocations(changed_settings(self.cfg, cfg))
+        if is_dynamic(cfg)!=self.dynamic:
+            rebuild.add("agents")
+        self.cfg=cfg
+
+        if "trail" in rebuild:
+            glDeleteTextures([self.trailTex, self.blurTex])
+            glDeleteBuffers(1,[self.depositBuf])
+            if trail_format(cfg)!=self.trailFormat:
+                glDeleteProgram(self.computeProg)
+                glDeleteProgram(self.renderProg)
+                self._create_programs()
+                rebuild.add("programs")
+            self._create_trail()
+        if "obstacles" in rebuild:
+            glDeleteTextures([self.obstaclesTex, self.obstacleFieldTex])
+            self._create_obstacles()
+        if "attractor" in rebuild:
+            glDeleteTextures([self.attractorTex])
+            self._create_attractor()
+        if "agents" in rebuild:
+            glDeleteBuffers(3,[self.ssbo, self.ssboAlt, self.popBuf])
+            self._create_agents()
+        else:
+            self.schedule=EmitterSchedule(cfg)
+        self.apply_uniforms()
+        return rebuild
+
+    def _section(self, name):
+        return self.profiler.section(name) if self.profiler is not None else contextlib.nullcontext()
+
+    def clear_trail(self):
+        zeroArr=np.zeros((self.layers, self.height, self.width),dtype=np.float32)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, self.trailTex)
+        glTexSubImage3D(GL_TEXTURE_2D_ARRAY,0,0,0,0, self.width, self.height, self.layers, GL_RED, GL_FLOAT, zeroArr)
+        glBindTexture(GL_TEXTURE_2D_ARRAY,0)
+
+    def update_agents(self):
+        """Pass 0 (+ pass 3 resolving the deposits in ATOMIC mode)."""
+        glUseProgram(self.computeProg)
+        glUniform1i(self.cPassType, 0)
+        glUniform1ui(self.cStepKey, step_key(self.cfg, self.stepCount))
+        glBindImageTexture(0, self.trailTex,0, GL_TRUE,0,GL_READ_WRITE,self.glFormat)
+        glBindImageTexture(1, self.obstaclesTex,0,GL_FALSE,0,GL_READ_ONLY,GL_R8UI)
+        glBindImageTexture(4, self.obstacleFieldTex,0,GL_FALSE,0,GL_READ_ONLY,GL_RGBA32F)
+        if self.attractor is not None:
+            self._update_attractor()
+        glBindImageTexture(5, self.attractorTex,0,GL_FALSE,0,GL_READ_ONLY,GL_R8)
+        glBindBufferBase(GL_SHADER_STORAGE_BUFFER,0, self.ssbo)
+        glBindBufferBase(GL_SHADER_STORAGE_BUFFER,1, self.depositBuf)
+        glBindBufferBase(GL_SHADER_STORAGE_BUFFER,2, self.popBuf)
+        glBindBufferBase(GL_SHADER_STORAGE_BUFFER,4, self.speciesBuf)
+        glBindBufferBase(GL_SHADER_STORAGE_BUFFER,5, self.interactionBuf)
+        glBindBufferBase(GL_SHADER_STORAGE_BUFFER,7, self.headingBuf)
+        # the sensors' view of the trail: make the image writes visible to the sampler, rebuild the mips
+        glMemoryBarrier(GL_TEXTURE_FETCH_BARRIER_BIT|GL_TEXTURE_UPDATE_BARRIER_BIT)
+        glActiveTexture(GL_TEXTURE1)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, self.trailTex)
+        glBindSampler(1, self.sensorSampler)
+        if self.sensorMip>0:
+            with self._section("mips"):
+                glGenerateMipmap(GL_TEXTURE_2D_ARRAY)
+        glActiveTexture(GL_TEXTURE0)
 
-    computeShader=compileShader(COMPUTE_SHADER_SOURCE, GL_COMPUTE_SHADER)
-    computeProg = compileProgram(computeShader)
+        with self._section("agents"):
+            if self.dynamic:
+                # sized on the GPU from the live count, idle slots cost nothing
+                glBindBuffer(GL_DISPATCH_INDIRECT_BUFFER, self.popBuf)
+                glDispatchComputeIndirect(8)
+                glBindBuffer(GL_DISPATCH_INDIRECT_BUFFER,0)
+            else:
+                glDispatchCompute(self.groupCountAgents,1,1)
+            glMemoryBarrier(GL_SHADER_IMAGE_ACCESS_BARRIER_BIT|GL_SHADER_STORAGE_BARRIER_BIT)
+
+        if self.atomicDeposit:
+            glUniform1i(self.cPassType, 3)
+            with self._section("resolve"):
+                glDispatchCompute(self.groupCountPixels,1,1)
+                glMemoryBarrier(GL_SHADER_IMAGE_ACCESS_BARRIER_BIT|GL_SHADER_STORAGE_BARRIER_BIT)
+
+    def update_population(self):
+        """
+        Passes 4-6: compact the live agents into the spare buffer, append the
+        emitters' new agents, size the next indirect dispatch, swap buffers.
+        Nothing is read back, the host never needs the live count.
+        """
+        glUseProgram(self.computeProg)
+        glBindBufferBase(GL_SHADER_STORAGE_BUFFER,0, self.ssbo)
+        glBindBufferBase(GL_SHADER_STORAGE_BUFFER,2, self.popBuf)
+        glBindBufferBase(GL_SHADER_STORAGE_BUFFER,3, self.ssboAlt)
+
+        with self._section("population"):
+            glUniform1i(self.cPassType,4)
+            glBindBuffer(GL_DISPATCH_INDIRECT_BUFFER, self.popBuf)
+            glDispatchComputeIndirect(8)
+            glBindBuffer(GL_DISPATCH_INDIRECT_BUFFER,0)
+            glMemoryBarrier(GL_SHADER_STORAGE_BARRIER_BIT)
+
+            glUniform1i(self.cPassType,5)
+            for i,(e,n) in enumerate(zip(self.schedule.emitters, self.schedule.counts())):
+                if n==0:
+                    continue
+                glUniform1ui(self.cSpawnKey, emitter_key(self.cfg, self.stepCount, i))
+                glUniform1i(self.cSpawnCount, n)
+                glUniform2f(self.cSpawnCenter, e["x"], e["y"])
+                glUniform1f(self.cSpawnRadius, e["radius"])
+                glUniform1i(self.cSpawnSpecies, e["species"])
+                glDispatchCompute((n+255)//256,1,1)
+            glMemoryBarrier(GL_SHADER_STORAGE_BARRIER_BIT)
+
+            glUniform1i(self.cPassType,6)
+            glDispatchCompute(1,1,1)
+            glMemoryBarrier(GL_SHADER_STORAGE_BARRIER_BIT|GL_COMMAND_BARRIER_BIT)
+        self.ssbo,self.ssboAlt=self.ssboAlt,self.ssbo
+
+    def diffuse(self):
+        """Evaporation and blur passes."""
+        glUseProgram(self.computeProg)
+        glBindImageTexture(0, self.trailTex,0, GL_TRUE,0,GL_READ_WRITE,self.glFormat)
+
+        # Evap (folded into the last blur pass when fused)
+        if not self.fuseDecay:
+            glUniform1i(self.cPassType,1)
+            with self._section("evaporate"):
+                glDispatchCompute(self.groupCountPixels,self.layers,1)
+                glMemoryBarrier(GL_SHADER_IMAGE_ACCESS_BARRIER_BIT)
+
+        # Blur passes, trailTex -> blurTex (horizontal) -> trailTex (vertical)
+        if self.blurActive:
+            glUniform1i(self.cPassType,2)
+            with self._section("blur"):
+                self._blur_passes()
+
+    def _blur_passes(self):
+        """trailTex -> blurTex -> trailTex for each of BLUR_PASSES (program and passType already set)."""
+        for i in range(self.cfg.BLUR_PASSES):
+            glBindImageTexture(2, self.trailTex,0,GL_TRUE,0,GL_READ_ONLY,self.glFormat)
+            glBindImageTexture(3, self.blurTex,0,GL_TRUE,0,GL_WRITE_ONLY,self.glFormat)
+            glUniform2i(self.cBlurDir,1,0)
+            glUniform1f(self.cBlurDecay,1.0)
+            glDispatchCompute(self.groupCountPixels,self.layers,1)
+            glMemoryBarrier(GL_SHADER_IMAGE_ACCESS_BARRIER_BIT)
 
-    vs=compileShader(VERTEX_SHADER_SOURCE, GL_VERTEX_SHADER)
-    fs=compileShader(FRAGMENT_SHADER_SOURCE, GL_FRAGMENT_SHADER)
-    renderProg=compileProgram(vs, fs)
+            glBindImageTexture(2, self.blurTex,0,GL_TRUE,0,GL_READ_ONLY,self.glFormat)
+            glBindImageTexture(3, self.trailTex,0,GL_TRUE,0,GL_WRITE_ONLY,self.glFormat)
+            glUniform2i(self.cBlurDir,0,1)
+            lastPass=(i==self.cfg.BLUR_PASSES-1)
+            glUniform1f(self.cBlurDecay, self.cfg.EVAPORATION_FACTOR if (self.fuseDecay and lastPass) else 1.0)
+            glDispatchCompute(self.groupCountPixels,self.layers,1)
+            glMemoryBarrier(GL_SHADER_IMAGE_ACCESS_BARRIER_BIT)
 
-    # RGBA32F trail map
-    trailTex=glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D, trailTex)
-    glTexImage2D(GL_TEXTURE_2D,0,GL_RGBA32F, config.SIM_WIDTH, config.SIM_HEIGHT,0,GL_RGBA,GL_FLOAT,None)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER,GL_NEAREST)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER,GL_NEAREST)
-    glBindTexture(GL_TEXTURE_2D,0)
+    def step(self):
+        self.update_agents()
+        if self.dynamic:
+            self.update_population()
+        self.diffuse()
+        self.stepCount+=1
+
+    def live_agents(self):
+        """Current population (stalls the pipeline)."""
+        glMemoryBarrier(GL_BUFFER_UPDATE_BARRIER_BIT)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.popBuf)
+        data=glGetBufferSubData(GL_SHADER_STORAGE_BUFFER,0,4)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER,0)
+        return int(np.frombuffer(data,dtype=np.uint32)[0])
+
+    def read_agents(self):
+        """Copy of the live agents as a structured AGENT_DTYPE array (stalls the pipeline)."""
+        count=self.live_agents()
+        if count==0:
+            return np.empty(0,dtype=AGENT_DTYPE)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.ssbo)
+        data=glGetBufferSubData(GL_SHADER_STORAGE_BUFFER,0,count*AGENT_DTYPE.itemsize)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER,0)
+        return np.frombuffer(data,dtype=AGENT_DTYPE).copy()
+
+    def write_agents(self, agents):
+        """Replace the population with `agents` (at most the buffer capacity)."""
+        agents=agents[:self.capacity]
+        if len(agents):
+            glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.ssbo)
+            glBufferSubData(GL_SHADER_STORAGE_BUFFER,0,agents.nbytes,agents)
+            glBindBuffer(GL_SHADER_STORAGE_BUFFER,0)
+        count=len(agents)
+        self.groupCountAgents=(count+255)//256
+        counters=np.array([count,0,self.groupCountAgents,1,1],dtype=np.uint32)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.popBuf)
+        glBufferSubData(GL_SHADER_STORAGE_BUFFER,0,counters.nbytes,counters)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER,0)
+
+    def run(self, steps):
+        """Queue `steps` simulation steps back to back, nothing is presented in between."""
+        for _ in range(steps):
+            self.step()
+        return self
+
+    def render(self, width, height):
+        cfg=self.cfg
+        glViewport(0,0, width, height)
+        bg = cfg.BACKGROUND_COLOR
+        glClearColor(bg[0], bg[1], bg[2], bg[3])
+        glClear(GL_COLOR_BUFFER_BIT)
 
-    # obstacles
-    obstaclesTex=glGenTextures(1)
-    glBindTexture(GL_TEXTURE_2D, obstaclesTex)
-    if config.USE_OBSTACLES:
-        img=Image.open(config.OBSTACLE_IMAGE).convert('L')
-        arr=np.array(img,dtype=np.uint8)
-        glTexImage2D(GL_TEXTURE_2D,0,GL_R8,arr.shape[1],arr.shape[0],0,GL_RED,GL_UNSIGNED_BYTE,arr)
-    else:
-        arr=np.full((config.SIM_HEIGHT, config.SIM_WIDTH),255,dtype=np.uint8)
-        glTexImage2D(GL_TEXTURE_2D,0,GL_R8, config.SIM_WIDTH,config.SIM_HEIGHT,0,GL_RED,GL_UNSIGNED_BYTE,arr)
-    glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MIN_FILTER,GL_NEAREST)
-    glTexParameteri(GL_TEXTURE_2D,GL_TEXTURE_MAG_FILTER,GL_NEAREST)
-    glBindTexture(GL_TEXTURE_2D,0)
+        glUseProgram(self.renderProg)
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, self.trailTex)
+        glUniform1i(self.rTex,0)
+        glBindBufferBase(GL_SHADER_STORAGE_BUFFER,6, self.paletteBuf)
+
+        glUniform1f(self.rMul, cfg.COLOR_MULTIPLIER)
+        if cfg.COLOR_MODE=="SUM":
+            glUniform1i(self.rMod,0)
+        elif cfg.COLOR_MODE=="RGB":
+            glUniform1i(self.rMod,1)
+        else:
+            glUniform1i(self.rMod,2)
 
-    # Clear trail map
-    zeroArr=np.zeros((config.SIM_HEIGHT, config.SIM_WIDTH,4),dtype=np.float32)
-    glBindTexture(GL_TEXTURE_2D, trailTex)
-    glTexSubImage2D(GL_TEXTURE_2D,0,0,0, config.SIM_WIDTH, config.SIM_HEIGHT, GL_RGBA, GL_FLOAT, zeroArr)
-    glBindTexture(GL_TEXTURE_2D,0)
+        glUniform4f(self.rBG,bg[0],bg[1],bg[2],bg[3])
 
-    # Agent SSBO
-    if config.MULTI_SPECIES:
-        totalAgents=sum(config.SPECIES_AGENT_COUNTS)
-    else:
-        totalAgents=config.NUM_AGENTS
-
-    dtype=[('x','f4'),('y','f4'),('angle','f4'),('seed','f4'),('species','i4')]
-    agentData=np.zeros(totalAgents, dtype=dtype)
-
-    if config.MULTI_SPECIES:
-        idx=0
-        for sI,count in enumerate(config.SPECIES_AGENT_COUNTS):
-            for c in range(count):
-                agentData[idx]['x']=random.uniform(0, config.SIM_WIDTH)
-                agentData[idx]['y']=random.uniform(0, config.SIM_HEIGHT)
-                agentData[idx]['angle']=random.uniform(0, math.pi*2)
-                if config.USE_RANDOM_SEEDS:
-                    agentData[idx]['seed']=random.random()
-                else:
-                    agentData[idx]['seed']=0.5
-                agentData[idx]['species']=sI
-                idx+=1
-    else:
-        for i in range(totalAgents):
-            agentData[i]['x']=random.uniform(0, config.SIM_WIDTH)
-            agentData[i]['y']=random.uniform(0, config.SIM_HEIGHT)
-            agentData[i]['angle']=random.uniform(0,math.pi*2)
-            agentData[i]['seed']=random.random() if config.USE_RANDOM_SEEDS else 0.5
-            agentData[i]['species']=0
-
-    ssbo=glGenBuffers(1)
-    glBindBuffer(GL_SHADER_STORAGE_BUFFER, ssbo)
-    glBufferData(GL_SHADER_STORAGE_BUFFER, agentData.nbytes, agentData, GL_DYNAMIC_DRAW)
-    glBindBufferBase(GL_SHADER_STORAGE_BUFFER,0, ssbo)
-    glBindBuffer(GL_SHADER_STORAGE_BUFFER,0)
-
-    quadVAO=create_fullscreen_quad_vao()
-
-    # compute uniforms
-    cPassType=glGetUniformLocation(computeProg,"passType")
-    cW=glGetUniformLocation(computeProg,"simWidth")
-    cH=glGetUniformLocation(computeProg,"simHeight")
-    cObs=glGetUniformLocation(computeProg,"useObstacles")
-    cEvap=glGetUniformLocation(computeProg,"evaporationFactor")
-    cBlur=glGetUniformLocation(computeProg,"blurRadius")
-
-    cNumSp=glGetUniformLocation(computeProg,"numSpecies")
-    cSpds =glGetUniformLocation(computeProg,"speeds")
-    cTSpd =glGetUniformLocation(computeProg,"turnSpeeds")
-    cSAng =glGetUniformLocation(computeProg,"sensorAngles")
-    cSDst =glGetUniformLocation(computeProg,"sensorDistances")
-    cDep  =glGetUniformLocation(computeProg,"depositAmounts")
-    cRnd  =glGetUniformLocation(computeProg,"randomTurnFactor")
-
-    # new param
-    cDepScale=glGetUniformLocation(computeProg,"depositScaleFactor")
-
-    glUseProgram(computeProg)
-    glUniform1f(cW, float(config.SIM_WIDTH))
-    glUniform1f(cH, float(config.SIM_HEIGHT))
-    glUniform1i(cObs, GL_TRUE if config.USE_OBSTACLES else GL_FALSE)
-    glUniform1f(cEvap, config.EVAPORATION_FACTOR)
-    glUniform1i(cBlur, config.BLUR_RADIUS)
-    glUniform1f(cRnd, config.RANDOM_TURN_FACTOR)
-
-    # deposit scale factor
-    # If totalAgents=300k but user sets AGENT_DEPOSIT_SCALE=300k,
-    # depScaleFactor = (1.0 * base) => for 300k
-    # If user sets only 1 agent => deposit scale factor => base*(1/1) => too big?
-    # Actually let's do factor = (AGENT_DEPOSIT_SCALE / totalAgents).
-    # So if you have fewer agents, each deposit is smaller.
-    depositScaleVal = (float(config.AGENT_DEPOSIT_SCALE)/float(totalAgents))
-    glUniform1f(cDepScale, depositScaleVal)
-
-    if config.MULTI_SPECIES:
-        glUniform1i(cNumSp, config.NUM_SPECIES)
-        glUniform1fv(cSpds, config.NUM_SPECIES, np.array(config.SPECIES_SPEEDS, dtype=np.float32))
-        glUniform1fv(cTSpd, config.NUM_SPECIES, np.array(config.SPECIES_TURN_SPEEDS,dtype=np.float32))
-        anglesInRad = [math.radians(a) for a in config.SPECIES_SENSOR_ANGLES]
-        glUniform1fv(cSAng, config.NUM_SPECIES, np.array(anglesInRad, dtype=np.float32))
-        glUniform1fv(cSDst, config.NUM_SPECIES, np.array(config.SPECIES_SENSOR_DIST, dtype=np.float32))
-        glUniform1fv(cDep,  config.NUM_SPECIES, np.array(config.SPECIES_DEPOSIT_AMOUNTS, dtype=np.float32))
-    else:
-        glUniform1i(cNumSp, 1)
-        glUniform1fv(cSpds, 1, np.array([config.AGENT_SPEED], dtype=np.float32))
-        glUniform1fv(cTSpd, 1, np.array([config.TURN_SPEED],  dtype=np.float32))
-        glUniform1fv(cSAng, 1, np.array([math.radians(config.SENSOR_ANGLE_DEG)],dtype=np.float32))
-        glUniform1fv(cSDst, 1, np.array([config.SENSOR_DISTANCE], dtype=np.float32))
-        glUniform1fv(cDep,  1, np.array([config.DEPOSIT_AMOUNT], dtype=np.float32))
-
-    glUseProgram(0)
-
-    # render uniforms
-    rTex=glGetUniformLocation(renderProg,"slimeTexture")
-    rMul=glGetUniformLocation(renderProg,"colorMultiplier")
-    rMod=glGetUniformLocation(renderProg,"colorMode")
-    rBG =glGetUniformLocation(renderProg,"backgroundColor")
-
-    if config.MULTI_SPECIES:
-        totalAgents=sum(config.SPECIES_AGENT_COUNTS)
-    else:
-        totalAgents=config.NUM_AGENTS
+        glBindVertexArray(self.quadVAO)
+        with self._section("render"):
+            glDrawArrays(GL_TRIANGLE_STRIP,0,4)
+        glBindVertexArray(0)
 
-    groupCountAgents=(totalAgents+255)//256
-    totalPix = config.SIM_WIDTH*config.SIM_HEIGHT
-    groupCountPixels=(totalPix+255)//256
+    def read_trail(self):
+        """Copy of the trail map as an HxWxS float32 array, like CpuSlimeEngine.trail (stalls the pipeline)."""
+        glBindTexture(GL_TEXTURE_2D_ARRAY, self.trailTex)
+        data=glGetTexImage(GL_TEXTURE_2D_ARRAY,0,GL_RED,GL_FLOAT)
+        glBindTexture(GL_TEXTURE_2D_ARRAY,0)
+        layers=np.frombuffer(data,dtype=np.float32).reshape((self.layers,self.height,self.width))
+        return np.ascontiguousarray(layers.transpose(1,2,0))
+
+    def write_trail(self, trail):
+        """Replace the trail map with an HxWxS array (one upload)."""
+        layers=np.ascontiguousarray(np.asarray(trail).transpose(2,0,1),dtype=np.float32)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, self.trailTex)
+        glTexSubImage3D(GL_TEXTURE_2D_ARRAY,0,0,0,0, self.width, self.height, self.layers, GL_RED, GL_FLOAT, layers)
+        glBindTexture(GL_TEXTURE_2D_ARRAY,0)
+
+    def save_checkpoint(self, path):
+        """Write the complete state to directory `path`, see checkpoint.py (stalls the pipeline)."""
+        save_checkpoint(path, self.cfg, self.read_trail().astype(TRAIL_FORMATS[self.trailFormat]),
+                        self.read_agents(), self.stepCount, self.schedule.carry)
+
+    def load_checkpoint(self, path):
+        """Continue from the state saved in `path` (by either engine): one trail upload, one agent upload."""
+        state=load_checkpoint(path)
+        check_shape(state, (self.height, self.width, self.layers))
+        if len(state.agents)>self.capacity:
+            raise ValueError(f"Checkpoint has {len(state.agents)} agents, the agent buffer holds {self.capacity}")
+        self.write_trail(state.trail)
+        self.write_agents(np.ascontiguousarray(state.agents))
+        self.stepCount=state.step
+        if len(state.carry)==len(self.schedule.carry):
+            self.schedule.carry=list(state.carry)
+        return self
+
+    def release(self):
+        glDeleteProgram(self.computeProg)
+        glDeleteProgram(self.renderProg)
+        glDeleteBuffers(8,[self.ssbo, self.ssboAlt, self.popBuf, self.depositBuf, self.speciesBuf,
+                           self.interactionBuf, self.paletteBuf, self.headingBuf])
+        glDeleteTextures([self.trailTex, self.blurTex, self.obstaclesTex, self.obstacleFieldTex, self.attractorTex])
+        glDeleteSamplers(1,[self.sensorSampler])
+        glDeleteVertexArrays(1,[self.quadVAO])
+
+def create_framebuffer(width, height):
+    """Offscreen RGBA8 render target, returns (fbo, colorTex)."""
+    colorTex=glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, colorTex)
+    glTexImage2D(GL_TEXTURE_2D,0,GL_RGBA8, width, height,0,GL_RGBA,GL_UNSIGNED_BYTE,None)
+    glBindTexture(GL_TEXTURE_2D,0)
+    fbo=glGenFramebuffers(1)
+    glBindFramebuffer(GL_FRAMEBUFFER, fbo)
+    glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, colorTex, 0)
+    if glCheckFramebufferStatus(GL_FRAMEBUFFER)!=GL_FRAMEBUFFER_COMPLETE:
+        raise RuntimeError("offscreen framebuffer is incomplete")
+    glBindFramebuffer(GL_FRAMEBUFFER,0)
+    return fbo, colorTex
+
+class PboReadback:
+    """
+    Asynchronous glReadPixels through a ring of pixel-pack buffers.
+
+    read() queues a readback of the current framebuffer and returns whichever
+    earlier readbacks the GPU has finished, so mapping never stalls (only when
+    all `depth` buffers are in flight does it wait for the oldest). Frames are
+    bottom-up RGBA uint8 copies, oldest first; flush() waits for the rest.
+    """
+
+    def __init__(self, width, height, depth=3):
+        self.width,self.height=width,height
+        self.nbytes=width*height*4
+        self.pbos=[int(b) for b in np.atleast_1d(glGenBuffers(depth))]
+        for pbo in self.pbos:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.nbytes, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER,0)
+        self.fences=[None]*depth
+        self.inFlight=collections.deque()
+        self.next=0
+
+    def read(self):
+        frames=[]
+        if len(self.inFlight)==len(self.pbos):
+            frames.append(self._collect(self.inFlight.popleft()))
+        i=self.next
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.pbos[i])
+        glReadPixels(0,0,self.width,self.height,GL_RGBA,GL_UNSIGNED_BYTE,ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER,0)
+        self.fences[i]=glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE,0)
+        self.inFlight.append(i)
+        self.next=(i+1)%len(self.pbos)
+        return frames+self.poll()
+
+    def poll(self):
+        """Finished readbacks, without waiting."""
+        frames=[]
+        while self.inFlight:
+            status=glClientWaitSync(self.fences[self.inFlight[0]],0,0)
+            if status not in (GL_ALREADY_SIGNALED, GL_CONDITION_SATISFIED):
+                break
+            frames.append(self._collect(self.inFlight.popleft()))
+        return frames
+
+    def flush(self):
+        """All outstanding readbacks, waiting for them if needed."""
+        frames=[]
+        while self.inFlight:
+            frames.append(self._collect(self.inFlight.popleft()))
+        return frames
+
+    def _collect(self, i):
+        glClientWaitSync(self.fences[i], GL_SYNC_FLUSH_COMMANDS_BIT, 1_000_000_000)
+        glDeleteSync(self.fences[i])
+        self.fences[i]=None
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, self.pbos[i])
+        ptr=glMapBufferRange(GL_PIXEL_PACK_BUFFER,0,self.nbytes,GL_MAP_READ_BIT)
+        buf=ctypes.cast(ptr, ctypes.POINTER(ctypes.c_ubyte*self.nbytes)).contents
+        frame=np.frombuffer(buf,dtype=np.uint8).reshape((self.height,self.width,4)).copy()
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER,0)
+        return frame
+
+    def release(self):
+        self.flush()
+        glDeleteBuffers(len(self.pbos), self.pbos)
+
+class GpuPassProfiler(PassProfiler):
+    """
+    GL_TIME_ELAPSED queries around each section. Results are collected in
+    end_frame() only once the GPU reports them available, a few frames late,
+    so profiling never stalls the pipeline. Queries are recycled.
+    """
+
+    def __init__(self, window=300, print_interval=0.0):
+        super().__init__(window, print_interval)
+        self.freeQueries=[]
+        self.allQueries=[]
+        self.pending=collections.deque()  # (frame, name, query), in issue order
+
+    def _begin(self, name):
+        if self.freeQueries:
+            q=self.freeQueries.pop()
+        else:
+            q=int(np.atleast_1d(glGenQueries(1))[0])
+            self.allQueries.append(q)
+        glBeginQuery(GL_TIME_ELAPSED, q)
+        return q
+
+    def _end(self, name, q):
+        glEndQuery(GL_TIME_ELAPSED)
+        self.pending.append((self.frame, name, q))
+
+    def _poll(self):
+        while self.pending:
+            frame,name,q=self.pending[0]
+            if not glGetQueryObjectiv(q, GL_QUERY_RESULT_AVAILABLE):
+                break
+            ns=glGetQueryObjectui64v(q, GL_QUERY_RESULT)
+            self.pending.popleft()
+            self.freeQueries.append(q)
+            self.record(name, ns/1e6, frame)
+
+    def release(self):
+        if self.allQueries:
+            glDeleteQueries(len(self.allQueries), self.allQueries)
+
+def make_profiler(cfg, gpu=True):
+    """Profiler from the PROFILE_* settings, or None when profiling is off."""
+    if not cfg.PROFILE:
+        return None
+    cls=GpuPassProfiler if gpu else CpuPassProfiler
+    return cls(cfg.PROFILE_WINDOW, cfg.PROFILE_PRINT_INTERVAL)
+
+def finish_profiler(profiler, cfg):
+    if profiler is None:
+        return
+    print(profiler.summary_line())
+    if cfg.PROFILE_OUTPUT:
+        profiler.dump(cfg.PROFILE_OUTPUT)
+        print(f"Pass timings written to {cfg.PROFILE_OUTPUT}")
+    if isinstance(profiler, GpuPassProfiler):
+        profiler.release()
+
+def main(cfg=config, warmup=0, watcher=None, resume=None):
+    window=create_window(cfg.WINDOW_WIDTH, cfg.WINDOW_HEIGHT)
+    sim=GpuSlimeSim(cfg)
+    if resume:
+        sim.load_checkpoint(resume)
+    sim.run(warmup)
+    sim.profiler=make_profiler(cfg)
+
+    # screenshots and continuous capture share one async readback ring;
+    # pendingTargets says where each in-flight frame goes: (to capture?, screenshot path)
+    fbW,fbH=glfw.get_framebuffer_size(window)
+    readback=PboReadback(fbW, fbH, cfg.READBACK_BUFFERS)
+    pendingTargets=collections.deque()
+    screenshotWriter=FrameWriter()
+    captureWriter=None
+    keysDown=set()
+
+    def key_pressed(key):
+        # true once per press, not on every frame the key is held
+        down=glfw.get_key(window, key)==glfw.PRESS
+        wasDown=key in keysDown
+        if down: keysDown.add(key)
+        else: keysDown.discard(key)
+        return down and not wasDown
+
+    def deliver(frames):
+        for frame in frames:
+            toCapture,screenshotPath=pendingTargets.popleft()
+            if toCapture:
+                captureWriter.put(frame)
+            if screenshotPath:
+                screenshotWriter.put(frame, screenshotPath)
 
     lastTime=glfw.get_time()
 
     while not glfw.window_should_close(window):
         glfw.poll_events()
 
-        # screenshot
-        if glfw.get_key(window, config.SCREENSHOT_KEY)==glfw.PRESS:
-            take_screenshot(window, config.SCREENSHOT_FILE)
-
-        if config.TARGET_FPS>0:
+        # hot reload: uniforms apply right away, sizes/counts rebuild only what they affect
+        newCfg=watcher.poll() if watcher is not None else None
+        if newCfg is not None:
+            rebuilt=sim.reconfigure(newCfg)
+            cfg=newCfg
+            if "window" in rebuilt:
+                deliver(readback.flush())
+                readback.release()
+                glfw.set_window_size(window, cfg.WINDOW_WIDTH, cfg.WINDOW_HEIGHT)
+                fbW,fbH=glfw.get_framebuffer_size(window)
+                readback=PboReadback(fbW, fbH, cfg.READBACK_BUFFERS)
+            print("Config reloaded, "+("rebuilt "+", ".join(sorted(rebuilt)) if rebuilt else "uniforms only"))
+
+        # screenshot / toggle continuous capture
+        wantScreenshot=key_pressed(cfg.SCREENSHOT_KEY)
+        if key_pressed(cfg.CAPTURE_KEY):
+            if captureWriter is None:
+                captureWriter=FrameWriter(out_dir=cfg.CAPTURE_DIR, max_queue=2*cfg.READBACK_BUFFERS)
+                print(f"Capturing frames to {cfg.CAPTURE_DIR}/")
+            else:
+                deliver(readback.flush())
+                print(f"Capture stopped, {captureWriter.frames_written} frames queued: "
+                      f"{captureWriter.close():.1f} frames/sec written")
+                captureWriter=None
+
+        # checkpoint: full state to CHECKPOINT_DIR/step<N>/
+        if key_pressed(cfg.CHECKPOINT_KEY):
+            path=os.path.join(cfg.CHECKPOINT_DIR, f"step{sim.stepCount:09d}")
+            sim.save_checkpoint(path)
+            print(f"Checkpoint saved to {path}/")
+
+        # TARGET_FPS throttles presentation only, fast-forward skips it entirely
+        fastForward=glfw.get_key(window, cfg.FAST_FORWARD_KEY)==glfw.PRESS
+        if cfg.TARGET_FPS>0 and not fastForward:
             now=glfw.get_time()
             dt=now - lastTime
-            target=1.0/config.TARGET_FPS
+            target=1.0/cfg.TARGET_FPS
             if dt<target:
                 glfw.wait_events_timeout(target-dt)
-            lastTime=glfw.get_time()
-
-        # 1) Agent update
-        glUseProgram(computeProg)
-        glUniform1i(cPassType, 0)
-        glBindImageTexture(0, trailTex,0, GL_FALSE,0,GL_READ_WRITE,GL_RGBA32F)
-        glBindImageTexture(1, obstaclesTex,0,GL_FALSE,0,GL_READ_ONLY,GL_R8)
-        glBindBufferBase(GL_SHADER_STORAGE_BUFFER,0, ssbo)
-
-        glDispatchCompute(groupCountAgents,1,1)
-        glMemoryBarrier(GL_SHADER_IMAGE_ACCESS_BARRIER_BIT|GL_SHADER_STORAGE_BARRIER_BIT)
-
-        # 2) Evap
-        glUniform1i(cPassType,1)
-        glDispatchCompute(groupCountPixels,1,1)
-        glMemoryBarrier(GL_SHADER_IMAGE_ACCESS_BARRIER_BIT)
-
-        # 3) Blur pass
-        glUniform1i(cPassType,2)
-        for _ in range(config.BLUR_PASSES):
-            glDispatchCompute(groupCountPixels,1,1)
-            glMemoryBarrier(GL_SHADER_IMAGE_ACCESS_BARRIER_BIT)
+        lastTime=glfw.get_time()
 
-        # 4) render
-        glViewport(0,0, config.WINDOW_WIDTH, config.WINDOW_HEIGHT)
-        bg = config.BACKGROUND_COLOR
-        glClearColor(bg[0], bg[1], bg[2], bg[3])
-        glClear(GL_COLOR_BUFFER_BIT)
+        sim.run(cfg.FAST_FORWARD_STEPS if fastForward else cfg.SIM_STEPS_PER_FRAME)
+        sim.render(cfg.WINDOW_WIDTH, cfg.WINDOW_HEIGHT)
 
-        glUseProgram(renderProg)
-        glActiveTexture(GL_TEXTURE0)
-        glBindTexture(GL_TEXTURE_2D, trailTex)
-        glUniform1i(rTex,0)
-
-        glUniform1f(rMul, config.COLOR_MULTIPLIER)
-        if config.COLOR_MODE=="SUM":
-            glUniform1i(rMod,0)
-        elif config.COLOR_MODE=="RGB":
-            glUniform1i(rMod,1)
+        if captureWriter is not None or wantScreenshot:
+            pendingTargets.append((captureWriter is not None, cfg.SCREENSHOT_FILE if wantScreenshot else None))
+            deliver(readback.read())
         else:
-            glUniform1i(rMod,2)
-
-        glUniform4f(rBG,bg[0],bg[1],bg[2],bg[3])
-
-        glBindVertexArray(quadVAO)
-        glDrawArrays(GL_TRIANGLE_STRIP,0,4)
-        glBindVertexArray(0)
+            deliver(readback.poll())
 
         glfw.swap_buffers(window)
 
-    glDeleteProgram(computeProg)
-    glDeleteProgram(renderProg)
-    glDeleteBuffers(1,[ssbo])
-    glDeleteTextures([trailTex, obstaclesTex])
-    glDeleteVertexArrays(1,[quadVAO])
+        if sim.profiler is not None:
+            line=sim.profiler.end_frame()
+            if line:
+                print(line)
+                glfw.set_window_title(window, "Slime GPU Python - "+line)
+
+    deliver(readback.flush())
+    if captureWriter is not None:
+        captureWriter.close()
+    screenshotWriter.close()
+    readback.release()
+    finish_profiler(sim.profiler, cfg)
+    sim.release()
 
     glfw.destroy_window(window)
     glfw.terminate()
 
-def take_screenshot(window, outPath):
-    w,h=glfw.get_framebuffer_size(window)
-    data=glReadPixels(0,0,w,h,GL_RGBA,GL_UNSIGNED_BYTE)
-    arr=np.frombuffer(data,dtype=np.uint8).reshape((h,w,4))
-    arr=np.flip(arr,axis=0)
-    img=Image.fromarray(arr,'RGBA')
-    img.save(outPath)
-    print(f"Screenshot saved to {outPath}")
+def render_offline(cfg, frames, writer, useCpu=False, warmup=0, resume=None):
+    """
+    Simulate and render `frames` frames without showing a window, handing each
+    WINDOW_WIDTH x WINDOW_HEIGHT RGBA frame to `writer` (capture.FrameWriter).
+    Runs `warmup` steps first (after loading checkpoint `resume`, if given),
+    then SIM_STEPS_PER_FRAME steps per frame.
+    With useCpu=True no GL context is created at all (CPU engine + capture.colorize).
+    """
+    if useCpu:
+        engine=CpuSlimeEngine(cfg)
+        if resume:
+            engine.load_checkpoint(resume)
+        engine.run(warmup)
+        engine.profiler=make_profiler(cfg, gpu=False)
+        for _ in range(frames):
+            engine.run(cfg.SIM_STEPS_PER_FRAME)
+            writer.put(colorize(engine.trail, cfg))
+            if engine.profiler is not None and (line:=engine.profiler.end_frame()):
+                print(line)
+        finish_profiler(engine.profiler, cfg)
+        return
+
+    w,h=cfg.WINDOW_WIDTH, cfg.WINDOW_HEIGHT
+    window=create_window(w, h, visible=False)
+    sim=GpuSlimeSim(cfg)
+    if resume:
+        sim.load_checkpoint(resume)
+    sim.run(warmup)
+    sim.profiler=make_profiler(cfg)
+    fbo,colorTex=create_framebuffer(w, h)
+    readback=PboReadback(w, h, cfg.READBACK_BUFFERS)
+
+    glBindFramebuffer(GL_FRAMEBUFFER, fbo)
+    for _ in range(frames):
+        sim.run(cfg.SIM_STEPS_PER_FRAME)
+        sim.render(w, h)
+        for frame in readback.read():
+            writer.put(frame)
+        if sim.profiler is not None and (line:=sim.profiler.end_frame()):
+            print(line)
+    for frame in readback.flush():
+        writer.put(frame)
+    glBindFramebuffer(GL_FRAMEBUFFER,0)
+
+    readback.release()
+    finish_profiler(sim.profiler, cfg)
+    glDeleteFramebuffers(1,[fbo])
+    glDeleteTextures([colorTex])
+    sim.release()
+    glfw.destroy_window(window)
+    glfw.terminate()
 
-main()
\ No newline at end of file
+def parse_args(argv=None):
+    import argparse
+    parser=argparse.ArgumentParser(description="GPU slime simulation. Without --frames a window opens.")
+    parser.add_argument("--preset", type=int, help="run this preset instead of config.CURRENT_PRESET")
+    parser.add_argument("--frames", type=int, help="render N frames offscreen, write them out and exit")
+    parser.add_argument("--out", default="frames", help="directory for the PNG sequence (with --frames)")
+    parser.add_argument("--ffmpeg", metavar="VIDEO", help="pipe the frames into ffmpeg to encode VIDEO instead of PNGs")
+    parser.add_argument("--fps", type=int, default=60, help="frame rate of the encoded video")
+    parser.add_argument("--queue", type=int, default=8, help="max frames waiting for the writer thread")
+    parser.add_argument("--cpu", action="store_true", help="use the NumPy engine for --frames (no GPU needed)")
+    parser.add_argument("--warmup", type=int, default=0, help="simulate N steps before the first frame is shown")
+    parser.add_argument("--steps-per-frame", type=int, help="override SIM_STEPS_PER_FRAME")
+    parser.add_argument("--profile", nargs="?", const="", metavar="FILE",
+                        help="time every pass; optionally dump the percentiles to FILE (.csv/.json) on exit")
+    parser.add_argument("--watch", metavar="FILE", help="also hot-reload setting overrides from this .json/.toml file")
+    parser.add_argument("--no-reload", action="store_true", help="do not watch config.py for changes")
+    parser.add_argument("--resume", metavar="DIR", help="start from this checkpoint (its preset unless --preset is given)")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args=parse_args()
+    overrides={}
+    if args.steps_per_frame is not None:
+        overrides["SIM_STEPS_PER_FRAME"]=args.steps_per_frame
+    if args.profile is not None:
+        overrides["PROFILE"]=True
+        if args.profile:
+            overrides["PROFILE_OUTPUT"]=args.profile
+    preset=args.preset
+    if args.resume and preset is None:
+        preset=read_meta(args.resume)["preset"]
+    watcher=ConfigWatcher(preset, args.watch, overrides, config.HOT_RELOAD_INTERVAL)
+    cfg=watcher.load()
+    if args.frames is None:
+        main(cfg, args.warmup, None if (args.no_reload or not cfg.HOT_RELOAD) else watcher, args.resume)
+    else:
+        writer=FrameWriter(out_dir=None if args.ffmpeg else args.out, ffmpeg_path=args.ffmpeg,
+                           fps=args.fps, max_queue=args.queue, size=(cfg.WINDOW_WIDTH, cfg.WINDOW_HEIGHT))
+        start=time.perf_counter()
+        render_offline(cfg, args.frames, writer, useCpu=args.cpu, warmup=args.warmup, resume=args.resume)
+        framesPerSec=writer.close()
+        print(f"Wrote {writer.frames_written} frames to {args.ffmpeg or args.out} "
+              f"in {time.perf_counter()-start:.1f}s ({framesPerSec:.2f} frames/sec)")
@@ -0,0 +1,5 @@
+# The modules import each other as top-level names (they run as scripts from slime_Sim/).
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
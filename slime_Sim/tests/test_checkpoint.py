@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import config
+from checkpoint import load_checkpoint, read_meta
+from cpu_engine import CpuSlimeEngine
+
+
+def small_preset(number, **settings):
+    cfg = config.load_preset(number)
+    cfg.SIM_WIDTH, cfg.SIM_HEIGHT = 96, 64
+    cfg.NUM_AGENTS = 2000
+    cfg.SPECIES_AGENT_COUNTS = [1000, 1000] if cfg.MULTI_SPECIES else None
+    cfg.SPAWN_SEED = 3
+    for name, value in settings.items():
+        setattr(cfg, name, value)
+    return cfg
+
+
+@pytest.mark.parametrize("number, settings", [
+    (1, {}),
+    (7, {"DEPOSIT_MODE": "ATOMIC"}),
+    (1, {"EMITTERS": [dict(x=0.5, y=0.5, rate=7.3, radius=0.1)], "DEATH_RATE": 0.01, "MAX_AGENTS": 4000}),
+])
+def test_resume_matches_uninterrupted_run(tmp_path, number, settings):
+    cfg = small_preset(number, **settings)
+    straight = CpuSlimeEngine(cfg).run(12)
+
+    first = CpuSlimeEngine(cfg).run(5)
+    first.save_checkpoint(tmp_path / "ckpt")
+    assert read_meta(tmp_path / "ckpt")["step"] == 5
+    resumed = CpuSlimeEngine(cfg).load_checkpoint(tmp_path / "ckpt").run(7)
+
+    assert resumed.step_count == straight.step_count
+    assert np.array_equal(resumed.trail, straight.trail)
+    assert np.array_equal(resumed.agents, straight.agents)
+
+
+def test_round_trip_keeps_state(tmp_path):
+    engine = CpuSlimeEngine(small_preset(1)).run(3)
+    engine.save_checkpoint(tmp_path / "ckpt")
+    state = load_checkpoint(tmp_path / "ckpt")
+    assert state.step == 3
+    assert state.trail.dtype == engine.trail.dtype
+    assert np.array_equal(state.trail, engine.trail)
+    assert np.array_equal(state.agents, engine.agents)
@@ -0,0 +1,91 @@
+# GL checkpoint round trips on a headless EGL context (Mesa's llvmpipe is enough);
+# skipped where no OpenGL 4.3 context can be created.
+import ctypes
+import os
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+pytest.importorskip("OpenGL")
+pytest.importorskip("glfw")
+
+from cpu_engine import CpuSlimeEngine  # noqa: E402
+from test_checkpoint import small_preset  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def gl_context():
+    if os.environ["PYOPENGL_PLATFORM"] != "egl":
+        pytest.skip("the headless context needs PYOPENGL_PLATFORM=egl")
+    try:
+        from OpenGL import EGL
+        display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        if not EGL.eglInitialize(display, None, None):
+            pytest.skip("no EGL display")
+        attrs = (EGL.EGLint * 5)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                                 EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT, EGL.EGL_NONE)
+        config, count = EGL.EGLConfig(), EGL.EGLint()
+        EGL.eglChooseConfig(display, attrs, ctypes.pointer(config), 1, ctypes.pointer(count))
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        version = (EGL.EGLint * 5)(EGL.EGL_CONTEXT_MAJOR_VERSION, 4, EGL.EGL_CONTEXT_MINOR_VERSION, 3, EGL.EGL_NONE)
+        context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, version)
+        if count.value < 1 or not context or not EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE,
+                                                                    EGL.EGL_NO_SURFACE, context):
+            pytest.skip("no OpenGL 4.3 context")
+        from OpenGL.GL import GL_VERSION, glGetString
+        glGetString(GL_VERSION)
+    except Exception as exc:  # no libEGL, wrong PyOpenGL platform, ...
+        pytest.skip(f"no headless OpenGL: {exc}")
+    yield
+    EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+    EGL.eglDestroyContext(display, context)
+
+
+CASES = [
+    (1, {}),
+    (1, {"DEPOSIT_MODE": "ATOMIC"}),
+    (7, {"DEPOSIT_MODE": "ATOMIC"}),
+    (1, {"DEPOSIT_MODE": "ATOMIC", "EMITTERS": [dict(x=0.5, y=0.5, rate=7.3, radius=0.1)], "DEATH_RATE": 0.01,
+         "MAX_AGENTS": 4000}),
+]
+
+
+@pytest.mark.parametrize("number, settings", CASES)
+def test_gpu_resume_matches_uninterrupted_run(gl_context, tmp_path, number, settings):
+    from slime_sim import GpuSlimeSim
+    cfg = small_preset(number, **settings)
+    sims = [GpuSlimeSim(cfg).run(12), GpuSlimeSim(cfg).run(5)]
+    sims[1].save_checkpoint(tmp_path / "ckpt")
+    sims.append(GpuSlimeSim(cfg).load_checkpoint(tmp_path / "ckpt").run(7))
+    straight, _, resumed = sims
+    try:
+        assert resumed.stepCount == 12
+        assert np.array_equal(resumed.read_trail(), straight.read_trail())
+        assert np.array_equal(resumed.read_agents(), straight.read_agents())
+    finally:
+        for sim in sims:
+            sim.release()
+
+
+@pytest.mark.parametrize("number, settings", CASES[:2])
+def test_checkpoints_move_between_engines(gl_context, tmp_path, number, settings):
+    # the state moves exactly; later steps may differ in the last bit (GL cos/sin vs NumPy's)
+    from slime_sim import GpuSlimeSim
+    cfg = small_preset(number, **settings)
+    sim = GpuSlimeSim(cfg).run(5)
+    try:
+        sim.save_checkpoint(tmp_path / "gl")
+        engine = CpuSlimeEngine(cfg).load_checkpoint(tmp_path / "gl")
+        assert engine.step_count == 5
+        assert np.array_equal(engine.trail, sim.read_trail())
+        assert np.array_equal(engine.agents, sim.read_agents())
+
+        engine.run(3).save_checkpoint(tmp_path / "cpu")
+        sim.load_checkpoint(tmp_path / "cpu")
+        assert sim.stepCount == 8
+        assert np.array_equal(sim.read_trail(), engine.trail)
+        assert np.array_equal(sim.read_agents(), engine.agents)
+    finally:
+        sim.release()
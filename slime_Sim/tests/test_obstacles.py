@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from obstacles import distance_field, distance_transform
+
+
+def brute_force(sites):
+    ys, xs = np.nonzero(sites)
+    yy, xx = np.mgrid[:sites.shape[0], :sites.shape[1]]
+    return np.sqrt(((yy[..., None] - ys) ** 2 + (xx[..., None] - xs) ** 2).min(axis=-1))
+
+
+@pytest.mark.parametrize("seed, shape, density", [(0, (37, 53), 0.05), (1, (64, 1), 0.1), (2, (1, 40), 0.2),
+                                                  (3, (50, 50), 0.002)])
+def test_distance_transform_matches_brute_force(seed, shape, density):
+    sites = np.random.default_rng(seed).random(shape) < density
+    sites.flat[0] = True  # at least one site
+    assert np.array_equal(distance_transform(sites), brute_force(sites).astype(np.float32))
+
+
+def test_distance_transform_in_bands(monkeypatch):
+    # a band of a few rows at a time gives the same result as all rows at once
+    import obstacles
+    sites = np.random.default_rng(4).random((41, 29)) < 0.03
+    sites[20, 10] = True
+    whole = distance_transform(sites)
+    monkeypatch.setattr(obstacles, "_STRIP_PIXELS", 3 * 41)
+    assert np.array_equal(distance_transform(sites), whole)
+
+
+def test_distance_field_sign_and_normals():
+    mask = np.zeros((30, 40), dtype=bool)
+    mask[10:20, 15:25] = True
+    field = distance_field(mask)
+    assert field.shape == (30, 40, 4) and field.dtype == np.float32
+    assert (field[..., 0][mask] < 0).all() and (field[..., 0][~mask] > 0).all()
+    # left of the block the normal points away from it, to -x
+    assert field[15, 10, 1] < 0 and abs(field[15, 10, 2]) < 1e-6
+    assert field[15, 10, 0] == pytest.approx(15 - 10 - 0.5)
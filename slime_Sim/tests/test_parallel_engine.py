@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from cpu_engine import CpuSlimeEngine
+from parallel_engine import ParallelSlimeEngine
+from test_checkpoint import small_preset
+
+
+@pytest.mark.parametrize("number, settings", [
+    (1, {}),
+    (7, {"DEPOSIT_MODE": "ATOMIC"}),
+    (3, {"SENSOR_MIP": 2, "SENSOR_FILTER": "LINEAR"}),
+    (1, {"EMITTERS": [dict(x=0.5, y=0.5, rate=7.3, radius=0.1)], "DEATH_RATE": 0.01, "MAX_AGENTS": 4000,
+         "AGENT_SORT_INTERVAL": 4}),
+])
+def test_two_workers_match_single_process(number, settings):
+    cfg = small_preset(number, **settings)
+    single = CpuSlimeEngine(cfg).run(8)
+    with ParallelSlimeEngine(cfg, workers=2) as parallel:
+        parallel.run(8)
+        assert np.array_equal(parallel.trail, single.trail)
+        assert np.array_equal(parallel.agents, single.agents)
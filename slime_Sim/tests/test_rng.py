@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from population import emitter_key
+from rng import agent_draws, hash_to_unit, pcg_hash, step_key
+
+
+def pcg_reference(v):
+    """pcgHash() of the shader in plain Python ints, wrapping at 32 bits like GLSL uint."""
+    state = (v * 747796405 + 2891336453) & 0xFFFFFFFF
+    word = (((state >> ((state >> 28) + 4)) ^ state) * 277803737) & 0xFFFFFFFF
+    return (word >> 22) ^ word
+
+
+@pytest.mark.parametrize("v, expected", [(0, 129708002), (1, 2831084092), (12345, 4099845390),
+                                         (0xFFFFFFFF, 3861530882)])
+def test_pcg_hash_known_values(v, expected):
+    assert int(pcg_hash(v)) == expected
+    assert pcg_reference(v) == expected
+
+
+def test_pcg_hash_array_matches_scalar():
+    v = np.random.default_rng(0).integers(0, 2 ** 32, 1000, dtype=np.uint32)
+    h = pcg_hash(v)
+    assert h.dtype == np.uint32
+    assert h.tolist() == [pcg_reference(int(x)) for x in v]
+
+
+def test_step_key_known_values():
+    assert step_key(SimpleNamespace(RNG_SEED=0), 0) == 817759070
+    assert step_key(SimpleNamespace(RNG_SEED=42), 7) == 3595368522
+
+
+@pytest.mark.parametrize("seed, step, same_as", [(2 ** 32 + 42, 7, (42, 7)), (-1, 3, (0xFFFFFFFF, 3)),
+                                                 (42, 2 ** 32 + 7, (42, 7))])
+def test_step_key_wraps_out_of_range_seeds(seed, step, same_as):
+    key = step_key(SimpleNamespace(RNG_SEED=seed), step)
+    assert key == step_key(SimpleNamespace(RNG_SEED=same_as[0]), same_as[1])
+    assert 0 <= key < 2 ** 32
+
+
+@pytest.mark.parametrize("seed", [2 ** 33, -1, None])
+def test_emitter_key_out_of_range_seeds(seed):
+    key = emitter_key(SimpleNamespace(SPAWN_SEED=seed), 5, 0)
+    assert 0 <= key < 2 ** 32
+
+
+def test_draws_in_unit_interval():
+    seeds = np.arange(10000, dtype=np.uint32)
+    for draw in agent_draws(seeds, step_key(SimpleNamespace(RNG_SEED=1), 3), 3):
+        assert draw.dtype == np.float32
+        assert draw.min() >= 0 and draw.max() < 1
+    assert hash_to_unit(np.uint32(0xFFFFFFFF)) < 1
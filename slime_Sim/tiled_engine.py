@@ -0,0 +1,321 @@
+# tiled_engine.py
+"""
+Domain-decomposed CPU engine for worlds too big for a single trail map.
+
+The world is cut into TILES = (columns, rows) rectangles and every tile is
+simulated by its own process: a CpuSlimeEngine whose trail covers the tile
+plus a halo ring of tile_halo(cfg) pixels. One step of a tile:
+  1. move its agents, depositing into a separate buffer (halo included),
+  2. send the halo part of those deposits, and the agents that crossed into
+     a neighbour, to the tile that owns them; add what the neighbours sent,
+  3. send the edge of its trail map to the neighbours' halos,
+  4. evaporate and blur tile plus halo.
+The halo is wide enough that after blurring, the ring an agent can sense or
+deposit in is still exact, so one exchange per step is enough. Tiles talk to
+each other directly (one queue per tile); the parent process only hands out
+steps and gathers the results.
+
+In ATOMIC deposit mode the trail map is bit for bit the one CpuSlimeEngine
+computes; DIRECT deposits match it up to float rounding (several deposits
+to a pixel are summed before they are added). DEATH_RATE and starvation
+work per tile, EMITTERS and SENSOR_MIP are not supported.
+"""
+
+import math
+import multiprocessing
+import shutil
+import traceback
+from multiprocessing.connection import wait
+from types import SimpleNamespace
+
+import numpy as np
+
+import config
+from agent_sort import sort_agents
+from cpu_engine import TRAIL_FORMATS, CpuSlimeEngine, sensor_settings, species_table, trail_format, trail_layers
+from hot_reload import snapshot
+from obstacles import share_obstacles
+from spawn import spawn_agents
+
+
+def tile_halo(cfg=config):
+    """
+    Halo width in pixels: how far an agent can sense or move (plus one for
+    rounding), plus what BLUR_PASSES blurs eat from the edge of the halo.
+    """
+    table = species_table(cfg)
+    fltr, size, _ = sensor_settings(cfg)
+    # a sensor reads up to half a kernel further, and one more texel when filtering
+    sense = table['sensor_distance'].max() + (size - 1) / 2 + (fltr == "LINEAR")
+    reach = math.ceil(max(sense, table['speed'].max())) + 1
+    return reach + max(cfg.BLUR_RADIUS, 0) * cfg.BLUR_PASSES
+
+
+def tile_edges(width, height, tiles):
+    """Column and row boundaries of a (columns, rows) tiling, as pixel arrays."""
+    cols, rows = tiles
+    if not (0 < cols <= width and 0 < rows <= height):
+        raise ValueError(f"Cannot cut a {width}x{height} world into {cols}x{rows} tiles")
+    return (np.linspace(0, width, cols + 1).round().astype(int),
+            np.linspace(0, height, rows + 1).round().astype(int))
+
+
+def tile_rects(edges):
+    """(x0, y0, x1, y1) of every tile, row by row."""
+    xs, ys = edges
+    return [(int(xs[c]), int(ys[r]), int(xs[c + 1]), int(ys[r + 1]))
+            for r in range(len(ys) - 1) for c in range(len(xs) - 1)]
+
+
+def tile_owner(edges, agents):
+    """Index of the tile each agent is in."""
+    xs, ys = edges
+    col = np.searchsorted(xs, agents['x'].astype(np.int64), side='right') - 1
+    row = np.searchsorted(ys, agents['y'].astype(np.int64), side='right') - 1
+    return row * (len(xs) - 1) + col
+
+
+def _grow(rect, margin):
+    x0, y0, x1, y1 = rect
+    return x0 - margin, y0 - margin, x1 + margin, y1 + margin
+
+
+def _overlap(a, b):
+    """Intersection of two rectangles, None if they don't overlap."""
+    x0, y0 = max(a[0], b[0]), max(a[1], b[1])
+    x1, y1 = min(a[2], b[2]), min(a[3], b[3])
+    return (x0, y0, x1, y1) if x0 < x1 and y0 < y1 else None
+
+
+class _Tile(CpuSlimeEngine):
+    """One tile plus halo, living in a worker process."""
+
+    def __init__(self, cfg, index, edges, halo, agents, inboxes):
+        self.rects = tile_rects(edges)
+        self.interior = self.rects[index]
+        super().__init__(cfg, agents=agents, region=_grow(self.interior, halo))
+        self.index, self.edges, self.halo, self.inboxes = index, edges, halo, inboxes
+        self.neighbours = [n for n, rect in enumerate(self.rects)
+                           if n != index and _overlap(self.region, rect)]
+        # this step's deposits, kept apart from the trail until the halo part is sent off
+        self.deposits = np.zeros(self.trail.shape, dtype=np.uint32 if self.atomic_deposit else self.trail.dtype)
+        self.inbox = {}  # (step, phase) -> {sender: payload}, messages can run ahead
+
+    def _window(self, rect):
+        """Trail map slices of the world rectangle `rect`."""
+        x0, y0 = self.region[:2]
+        return slice(rect[1] - y0, rect[3] - y0), slice(rect[0] - x0, rect[2] - x0)
+
+    def _send(self, phase, payloads):
+        # Queue.put pickles in a background thread: payloads must be copies, not views
+        for n in self.neighbours:
+            self.inboxes[n].put((self.step_count, phase, self.index, payloads[n]))
+
+    def _receive(self, phase):
+        """This step's `phase` messages from all neighbours, in tile order (deterministic sums)."""
+        key = (self.step_count, phase)
+        while len(self.inbox.get(key, ())) < len(self.neighbours):
+            step, ph, sender, payload = self.inboxes[self.index].get()
+            self.inbox.setdefault((step, ph), {})[sender] = payload
+        got = self.inbox.pop(key, {})
+        return [got[n] for n in sorted(got)]
+
+    def deposit(self, x, y, s, amount):
+        if self.atomic_deposit:
+            amount = (amount * self.fixed_scale + np.float32(0.5)).astype(np.uint32)
+        np.add.at(self.deposits.reshape(-1), self._flat_index(x, y, s), amount.astype(self.deposits.dtype))
+
+    def exchange_deposits(self):
+        """Hand halo deposits and departing agents to their tiles, take in ours."""
+        owner = tile_owner(self.edges, self.agents)
+        payloads = {}
+        for n in self.neighbours:
+            rect = _overlap(self.region, self.rects[n])
+            payloads[n] = (rect, self.deposits[self._window(rect)].copy(), self.agents[owner == n])
+        self._send("deposits", payloads)
+
+        arrived = [self.agents[owner == self.index]]
+        for rect, deposits, agents in self._receive("deposits"):
+            self.deposits[self._window(rect)] += deposits
+            arrived.append(agents)
+        self.agents = np.concatenate(arrived)
+
+        mine = self._window(self.interior)
+        if self.atomic_deposit:
+            self.trail[mine] += (self.deposits[mine].astype(np.float32) / self.fixed_scale).astype(self.trail.dtype)
+        else:
+            self.trail[mine] += self.deposits[mine]
+        self.deposits.fill(0)
+
+    def exchange_halo(self):
+        """Copy the edge of this tile into the neighbours' halos and theirs into ours."""
+        payloads = {}
+        for n in self.neighbours:
+            rect = _overlap(self.interior, _grow(self.rects[n], self.halo))
+            payloads[n] = (rect, self.trail[self._window(rect)].copy())
+        self._send("halo", payloads)
+        for rect, trail in self._receive("halo"):
+            self.trail[self._window(rect)] = trail
+
+    def step(self):
+        self.update_agents()
+        self.exchange_deposits()
+        if self.dynamic:
+            self.update_population()
+        self.exchange_halo()
+        self.diffuse()
+        self.step_count += 1
+
+        interval = self.cfg.AGENT_SORT_INTERVAL
+        if interval > 0 and self.step_count % interval == 0:
+            self.agents = sort_agents(self.agents, self.cfg.AGENT_SORT_TILE)
+
+
+def _tile_main(cfg, index, edges, halo, agents, inboxes, conn):
+    """Worker process: build the tile, then serve commands from the parent."""
+    try:
+        tile = _Tile(cfg, index, edges, halo, agents, inboxes)
+        while True:
+            command, arg = conn.recv()
+            if command == "close":
+                break
+            if command == "run":
+                for _ in range(arg):
+                    tile.step()
+                reply = len(tile.agents)
+            elif command == "trail":
+                reply = tile.trail[tile._window(tile.interior)]
+            elif command == "agents":
+                reply = tile.agents
+            else:
+                raise ValueError(f"Unknown command {command!r}")
+            conn.send(("ok", reply))
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+class TiledSlimeEngine:
+    """
+    Same interface as CpuSlimeEngine (step, run, trail, agents), but the world
+    is split over a process per tile. `tiles` = (columns, rows), default
+    cfg.TILES. Gathering `trail` or `agents` copies every tile back into this
+    process, so for huge worlds do it only when you need the result.
+    Use it as a context manager, or call close(), to stop the workers.
+    """
+
+    def __init__(self, cfg=config, seed=None, agents=None, tiles=None):
+        if cfg.EMITTERS:
+            raise ValueError("The tiled engine does not support EMITTERS")
+        if sensor_settings(cfg)[2]:
+            raise ValueError("The tiled engine does not support SENSOR_MIP, a mip level needs the whole map")
+        cfg = SimpleNamespace(**snapshot(cfg))  # the config module itself can't be sent to a process
+        self.cfg = cfg
+        self.width = int(cfg.SIM_WIDTH)
+        self.height = int(cfg.SIM_HEIGHT)
+        self.layers = trail_layers(cfg)
+        self.dtype = TRAIL_FORMATS[trail_format(cfg)]
+        self.tiles = tuple(tiles or cfg.TILES)
+        self.edges = tile_edges(self.width, self.height, self.tiles)
+        self.rects = tile_rects(self.edges)
+        self.halo = tile_halo(cfg)
+        self.step_count = 0
+        # every tile memory-maps its part of the obstacle data, built once here
+        tile_cfg, self.scratch = share_obstacles(cfg)
+
+        agents = spawn_agents(cfg, seed) if agents is None else agents
+        owner = tile_owner(self.edges, agents)
+        ctx = multiprocessing.get_context()
+        inboxes = [ctx.Queue() for _ in self.rects]
+        self.conns, self.processes = [], []
+        for i in range(len(self.rects)):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=_tile_main, daemon=True,
+                                  args=(tile_cfg, i, self.edges, self.halo, agents[owner == i], inboxes, child))
+            process.start()
+            child.close()
+            self.conns.append(parent)
+            self.processes.append(process)
+
+    def _command(self, command, arg=None):
+        """Send `command` to every tile, return the replies in tile order."""
+        for conn in self.conns:
+            conn.send((command, arg))
+        replies = {}
+        while len(replies) < len(self.conns):
+            for conn in wait([c for c in self.conns if id(c) not in replies]):
+                try:
+                    status, reply = conn.recv()
+                except EOFError:
+                    status, reply = "error", "worker exited unexpectedly"
+                if status == "error":
+                    self.close()
+                    raise RuntimeError(f"Tile worker failed:\n{reply}")
+                replies[id(conn)] = reply
+        return [replies[id(c)] for c in self.conns]
+
+    def step(self):
+        return self.run(1)
+
+    def run(self, steps):
+        self._command("run", steps)
+        self.step_count += steps
+        return self
+
+    @property
+    def trail(self):
+        """The whole HxWxS trail map, assembled from the tiles."""
+        trail = np.empty((self.height, self.width, self.layers), dtype=self.dtype)
+        for (x0, y0, x1, y1), part in zip(self.rects, self._command("trail")):
+            trail[y0:y1, x0:x1] = part
+        return trail
+
+    @property
+    def agents(self):
+        """All agents, tile by tile."""
+        return np.concatenate(self._command("agents"))
+
+    def close(self):
+        for conn, process in zip(self.conns, self.processes):
+            if process.is_alive():
+                try:
+                    conn.send(("close", None))
+                except OSError:
+                    pass
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self.conns, self.processes = [], []
+        if self.scratch is not None:
+            shutil.rmtree(self.scratch, ignore_errors=True)
+            self.scratch = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a slime preset headlessly on the CPU, a process per tile.")
+    parser.add_argument("--preset", type=int, default=config.CURRENT_PRESET)
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tiles", type=int, nargs=2, metavar=("COLUMNS", "ROWS"), help="default: TILES")
+    parser.add_argument("--size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), help="override SIM_WIDTH/HEIGHT")
+    parser.add_argument("--out", default="trail.npy", help="where to save the final trail map (.npy)")
+    args = parser.parse_args()
+
+    cfg = config.load_preset(args.preset)
+    if args.size:
+        cfg.SIM_WIDTH, cfg.SIM_HEIGHT = args.size
+    with TiledSlimeEngine(cfg, seed=args.seed, tiles=args.tiles) as engine:
+        engine.run(args.steps)
+        np.save(args.out, engine.trail)
+    print(f"Preset {args.preset}: {args.steps} steps on {engine.tiles[0]}x{engine.tiles[1]} tiles, "
+          f"trail map saved to {args.out}")